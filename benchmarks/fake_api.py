@@ -0,0 +1,264 @@
+"""
+fake_api.py:
+    A local HTTP server which imitates the parts of the Twitter API used by twerpy,
+    serving synthetic tweets, users and trends with configurable latency and
+    rate limits. Point twitter_settings.api_url at FakeTwitterAPI.url to use it
+"""
+import itertools
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+_words = ["fun", "winning", "boring", "sad", "happy", "coffee", "monday", "python",
+          "data", "music", "game", "news", "weather", "food", "travel", "love"]
+
+_slugs = ["sports", "music", "funny", "technology", "news", "entertainment"]
+
+_trends = ["#FollowFriday", "#python", "Monday", "#coffee", "World Cup", "#TBT",
+           "#MusicMonday", "Breaking News", "#weather", "#travel"]
+
+
+def _created_at(timestamp):
+    return time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(timestamp))
+
+
+def make_user(user_id, rand):
+    """ returns a synthetic user object
+    """
+    screen_name = "user_{0}".format(user_id)
+    return {"id": user_id,
+            "id_str": str(user_id),
+            "name": "User {0}".format(user_id),
+            "screen_name": screen_name,
+            "location": "",
+            "description": " ".join(rand.choice(_words) for _ in range(12)),
+            "url": None,
+            "protected": False,
+            "followers_count": rand.randint(0, 100000),
+            "friends_count": rand.randint(0, 2000),
+            "listed_count": rand.randint(0, 100),
+            "created_at": _created_at(1200000000 + user_id % 100000000),
+            "favourites_count": rand.randint(0, 5000),
+            "utc_offset": None,
+            "time_zone": None,
+            "geo_enabled": False,
+            "verified": False,
+            "statuses_count": rand.randint(1, 50000),
+            "lang": "en",
+            "profile_image_url": "http://example.com/{0}.png".format(screen_name),
+            "entities": {"description": {"urls": []}}}
+
+
+def make_tweet(tweet_id, term, rand):
+    """ returns a synthetic tweet object containing the term
+    """
+    user = make_user(rand.randint(1, 100000), rand)
+    mentioned = rand.randint(1, 100000)
+    text = "{0} {1} @user_{2}".format(term, " ".join(rand.choice(_words) for _ in range(10)), mentioned)
+    return {"id": tweet_id,
+            "id_str": str(tweet_id),
+            "created_at": _created_at(1348457721 + tweet_id % 10000000),
+            "text": text,
+            "source": "web",
+            "truncated": False,
+            "in_reply_to_status_id_str": None,
+            "in_reply_to_user_id_str": None,
+            "in_reply_to_screen_name": None,
+            "user": user,
+            "geo": None,
+            "coordinates": None,
+            "place": None,
+            "retweet_count": rand.randint(0, 100),
+            "favorite_count": rand.randint(0, 100),
+            "entities": {"hashtags": [],
+                         "symbols": [],
+                         "urls": [],
+                         "user_mentions": [{"screen_name": "user_{0}".format(mentioned),
+                                            "name": "User {0}".format(mentioned),
+                                            "id": mentioned,
+                                            "id_str": str(mentioned),
+                                            "indices": [text.rindex("@"), len(text)]}]},
+            "favorited": False,
+            "retweeted": False,
+            "lang": "en",
+            "metadata": {"iso_language_code": "en", "result_type": "recent"}}
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients which time out close the connection before the response is sent
+        if isinstance(sys.exc_info()[1], socket.error):
+            return
+        HTTPServer.handle_error(self, request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        # keep the benchmark output quiet
+        pass
+
+    def do_GET(self):
+        self.server.api.handle(self)
+
+    def do_POST(self):
+        self.server.api.handle(self)
+
+
+class FakeTwitterAPI(object):
+    """ serves synthetic API responses on a local port
+
+        latency is the number of seconds each response is delayed by,
+        rate_limit is the number of requests per endpoint allowed in each
+        window of window seconds for each consumer key, or None for no limit
+    """
+    def __init__(self, latency=0.0, rate_limit=None, window=900, seed=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.rand = random.Random(seed)
+        self.requests = []
+
+        self._lock = threading.Lock()
+        self._tweet_ids = itertools.count(250075927172759552)
+        # maps (consumer key, endpoint) to (window reset time, requests remaining)
+        self._rate_limits = {}
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{0}/1.1".format(self._server.server_address[1])
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.api = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _take_rate_limit(self, consumer_key, endpoint):
+        """ returns (limit, remaining, reset) for the endpoint after counting this request
+        """
+        now = time.time()
+        key = (consumer_key, endpoint)
+        # windows end on a whole second, as given in the x-rate-limit-reset header
+        reset, remaining = self._rate_limits.get(key, (int(math.ceil(now + self.window)), self.rate_limit))
+        if now >= reset:
+            reset, remaining = int(math.ceil(now + self.window)), self.rate_limit
+        remaining -= 1
+        self._rate_limits[key] = (reset, remaining)
+        return self.rate_limit, remaining, reset
+
+    def _tweets(self, term, count):
+        return [make_tweet(next(self._tweet_ids), term, self.rand) for _ in range(count)]
+
+    def _users(self, count):
+        return [make_user(self.rand.randint(1, 100000), self.rand) for _ in range(count)]
+
+    def response(self, endpoint, params):
+        """ returns (status, payload) for a request
+        """
+        count = int(params.get("count", ["20"])[0])
+
+        if endpoint == "search/tweets":
+            term = params.get("q", [""])[0]
+            statuses = self._tweets(term, count)
+            return 200, {"statuses": statuses,
+                         "search_metadata": {"max_id_str": statuses[-1]["id_str"] if statuses else "0",
+                                             "count": count,
+                                             "query": term}}
+        if endpoint in ("statuses/user_timeline", "statuses/home_timeline"):
+            return 200, self._tweets(params.get("screen_name", ["home"])[0], count)
+        if endpoint == "users/search":
+            return 200, self._users(count)
+        if endpoint == "users/lookup":
+            user_ids = [int(user_id) for user_id in params.get("user_id", [""])[0].split(",")
+                        if user_id.isdigit()]
+            if not user_ids:
+                return 404, {"errors": [{"code": 17, "message": "No user matches for specified terms."}]}
+            return 200, [make_user(user_id, self.rand) for user_id in user_ids[:100]]
+        if endpoint == "trends/place":
+            woeid = params.get("id", ["1"])[0]
+            return 200, [{"trends": [{"name": name, "query": name, "url": ""} for name in _trends],
+                          "locations": [{"name": "Somewhere", "woeid": int(woeid)}]}]
+        if endpoint == "users/suggestions":
+            return 200, [{"slug": slug, "name": slug.title(), "size": 20} for slug in _slugs]
+        if endpoint.startswith("users/suggestions/"):
+            slug = endpoint[len("users/suggestions/"):]
+            return 200, {"slug": slug, "name": slug.title(), "size": 20, "users": self._users(20)}
+
+        return 404, {"errors": [{"code": 34, "message": "Sorry, that page does not exist"}]}
+
+    def handle(self, request):
+        url = urlparse(request.path)
+        params = parse_qs(url.query)
+        if request.command == "POST":
+            length = int(request.headers.get("Content-Length", 0))
+            params.update(parse_qs(request.rfile.read(length).decode("utf-8")))
+
+        # requests signed in the query string or the Authorization header are
+        # rate limited by their consumer key
+        consumer_key = params.get("oauth_consumer_key", [None])[0]
+        authorization = request.headers.get("Authorization", "")
+        for param in authorization[len("OAuth "):].split(","):
+            if param.strip().startswith("oauth_consumer_key="):
+                consumer_key = param.split("=", 1)[1].strip('" ')
+
+        endpoint = url.path.split("/1.1/", 1)[-1]
+        if endpoint.endswith(".json"):
+            endpoint = endpoint[:-len(".json")]
+
+        with self._lock:
+            self.requests.append(request.path)
+            headers = []
+            if self.rate_limit is None:
+                status, payload = self.response(endpoint, params)
+            else:
+                limit_endpoint = "users/suggestions/:slug" if endpoint.startswith("users/suggestions/") else endpoint
+                limit, remaining, reset = self._take_rate_limit(consumer_key, limit_endpoint)
+                headers = [("x-rate-limit-limit", limit),
+                           ("x-rate-limit-remaining", max(remaining, 0)),
+                           ("x-rate-limit-reset", reset)]
+                if remaining < 0:
+                    status, payload = 429, {"errors": [{"code": 88, "message": "Rate limit exceeded"}]}
+                else:
+                    status, payload = self.response(endpoint, params)
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = json.dumps(payload).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json;charset=utf-8")
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            request.send_header(name, str(value))
+        request.end_headers()
+        request.wfile.write(body)
@@ -0,0 +1,459 @@
+"""
+run.py:
+    Repeatable benchmarks for twerpy, using the local fake API in fake_api.py
+    instead of the real Twitter API. Results are appended to reports/benchmarks.jsonl
+    along with the git commit, and compared with the previous run
+
+    usage: python -m benchmarks.run [benchmark ...] [--quick] [--latency SECONDS] [--no-save]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from benchmarks import fake_api
+from data import twitter_settings
+from lib import database as db
+from lib import decoder
+from lib import dump
+from lib import near_dup
+from lib import oauth_signer
+
+_root_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+results_filename = os.path.join(_root_dir_path, "reports", "benchmarks.jsonl")
+
+# number of rows or terms used by each benchmark, and the smaller sizes used with --quick
+_sizes = {"ingest": 20000, "term-file": 50, "dump": 20000, "json": 200, "startup": 10, "credentials": 40,
+          "signing": 20000, "timeseries": 20000, "cluster": 5000}
+_quick_sizes = {"ingest": 2000, "term-file": 5, "dump": 2000, "json": 20, "startup": 3, "credentials": 20,
+                "signing": 2000, "timeseries": 2000, "cluster": 500}
+
+
+def _measure(func, *args):
+    """ calls func, returning its result, the elapsed time and the peak memory used in bytes
+    """
+    if tracemalloc is not None:
+        tracemalloc.start()
+    start_time = time.time()
+    result = func(*args)
+    elapsed = time.time() - start_time
+
+    if tracemalloc is not None:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        # fall back to the peak resident size of the whole process, in kB on linux
+        import resource
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return result, elapsed, peak_memory
+
+
+def _new_db(tmp_dir_path):
+    db_filename = os.path.join(tmp_dir_path, "benchmark.db")
+    db.reset(db_filename, lambda x: "yes")
+    return db_filename
+
+
+def _synthetic_tweets(n_tweets):
+    rand = random.Random(0)
+    return [fake_api.make_tweet(250075927172759552 + i, "#benchmark", rand) for i in range(n_tweets)]
+
+
+def _import_tweet_handler():
+    """ imports tweet_handler, providing placeholder credentials if setup hasn't been run,
+        since the fake API doesn't check signatures
+    """
+    try:
+        from data import user_settings
+    except ImportError:
+        import data
+        user_settings = types.ModuleType("data.user_settings")
+        user_settings.access_token_key = "benchmark"
+        user_settings.access_token_secret = "benchmark"
+        user_settings.consumer_key = "benchmark"
+        user_settings.consumer_secret = "benchmark"
+        user_settings.default_db_filename = "benchmark.db"
+        sys.modules["data.user_settings"] = user_settings
+        data.user_settings = user_settings
+
+    from lib import tweet_handler
+    return tweet_handler
+
+
+def bench_ingest(n_tweets, tmp_dir_path, latency=0.0):
+    """ inserts synthetic tweets in batches of the search page size
+    """
+    tweets = _synthetic_tweets(n_tweets)
+    db_con = db.open_db_connection(_new_db(tmp_dir_path))
+    batch_size = twitter_settings.max_search_tweets_count
+
+    def _ingest():
+        for i in range(0, len(tweets), batch_size):
+            db.insert_tweets(db_con, tweets[i:i + batch_size], "benchmark")
+
+    _, elapsed, peak_memory = _measure(_ingest)
+    db.close_db_connection(db_con)
+    return {"rows": n_tweets,
+            "seconds": elapsed,
+            "rows_per_sec": n_tweets / elapsed,
+            "peak_memory_bytes": peak_memory}
+
+
+def bench_term_file(n_terms, tmp_dir_path, latency=0.0):
+    """ runs search-tweets on a terms file against the fake API
+    """
+    tweet_handler = _import_tweet_handler()
+    terms_filename = os.path.join(tmp_dir_path, "terms.txt")
+    with open(terms_filename, "w") as f:
+        for i in range(n_terms):
+            f.write("#term{0}:group{1}\n".format(i, i % 5))
+
+    db_con = db.open_db_connection(_new_db(tmp_dir_path))
+    with fake_api.FakeTwitterAPI(latency=latency) as api:
+        api_url = twitter_settings.api_url
+        twitter_settings.api_url = api.url
+        try:
+            _, elapsed, peak_memory = _measure(tweet_handler.search_multiple_terms, terms_filename, db_con)
+        finally:
+            twitter_settings.api_url = api_url
+
+    n_rows = db_con.execute("SELECT COUNT(*) FROM tweets").fetchone()[0]
+    db.close_db_connection(db_con)
+    return {"terms": n_terms,
+            "rows": n_rows,
+            "seconds": elapsed,
+            "terms_per_sec": n_terms / elapsed,
+            "rows_per_sec": n_rows / elapsed,
+            "peak_memory_bytes": peak_memory}
+
+
+def bench_credentials(n_terms, tmp_dir_path, latency=0.0):
+    """ runs search-tweets on a terms file against a fake API allowing 5 searches
+        a second for each consumer key, with pools of 1 and 4 credentials
+    """
+    from lib import credentials
+
+    tweet_handler = _import_tweet_handler()
+    terms_filename = os.path.join(tmp_dir_path, "terms.txt")
+    with open(terms_filename, "w") as f:
+        for i in range(n_terms):
+            f.write("#term{0}:group{1}\n".format(i, i % 5))
+
+    result = {"terms": n_terms}
+    rate_limits = twitter_settings.rate_limits
+    twitter_settings.rate_limits = dict(rate_limits, **{"search/tweets": 5})
+    try:
+        for n_credentials in [1, 4]:
+            pool = credentials.CredentialPool(
+                [{"access_token_key": "benchmark", "access_token_secret": "benchmark",
+                  "consumer_key": "benchmark_{0}".format(i), "consumer_secret": "benchmark"}
+                 for i in range(n_credentials)], window=1)
+            tweet_handler._oauth.clear()
+            tweet_handler._oauth["pool"] = pool
+
+            db_con = db.open_db_connection(_new_db(tmp_dir_path))
+            with fake_api.FakeTwitterAPI(latency=latency, rate_limit=5, window=1) as api:
+                api_url = twitter_settings.api_url
+                twitter_settings.api_url = api.url
+                try:
+                    _, elapsed, _ = _measure(tweet_handler.search_multiple_terms, terms_filename, db_con)
+                finally:
+                    twitter_settings.api_url = api_url
+            db.close_db_connection(db_con)
+            result["{0}_keys_terms_per_sec".format(n_credentials)] = n_terms / elapsed
+    finally:
+        twitter_settings.rate_limits = rate_limits
+        tweet_handler._oauth.clear()
+    return result
+
+
+def bench_signing(n_signatures, tmp_dir_path, latency=0.0):
+    """ signs search requests with oauth_signer, and with the oauth2 library if it's installed
+    """
+    url = "https://api.twitter.com/1.1/search/tweets.json?q=%23benchmark&count=100"
+    signer = oauth_signer.Signer("consumer_key", "consumer_secret", "token_key", "token_secret")
+
+    start_time = time.time()
+    for _ in range(n_signatures):
+        signer.authorization_header("GET", url)
+    result = {"signatures": n_signatures,
+              "signer_signatures_per_sec": n_signatures / (time.time() - start_time)}
+
+    try:
+        import oauth2
+    except ImportError:
+        return result
+
+    consumer = oauth2.Consumer(key="consumer_key", secret="consumer_secret")
+    token = oauth2.Token(key="token_key", secret="token_secret")
+    start_time = time.time()
+    for _ in range(n_signatures):
+        request = oauth2.Request.from_consumer_and_token(consumer, token=token, http_method="GET", http_url=url)
+        request.sign_request(oauth2.SignatureMethod_HMAC_SHA1(), consumer, token)
+        request.to_url()
+    result["oauth2_signatures_per_sec"] = n_signatures / (time.time() - start_time)
+    return result
+
+
+def bench_dump(n_tweets, tmp_dir_path, latency=0.0):
+    """ dumps a database of synthetic tweets to csv
+    """
+    db_con = db.open_db_connection(_new_db(tmp_dir_path))
+    db.insert_tweets(db_con, _synthetic_tweets(n_tweets), "benchmark")
+
+    output_filename = os.path.join(tmp_dir_path, "tweets.csv")
+    _, elapsed, peak_memory = _measure(dump.dump_tweets, db_con, None, output_filename, "csv")
+    db.close_db_connection(db_con)
+    return {"rows": n_tweets,
+            "seconds": elapsed,
+            "rows_per_sec": n_tweets / elapsed,
+            "peak_memory_bytes": peak_memory}
+
+
+def bench_json(n_payloads, tmp_dir_path, latency=0.0):
+    """ decodes full search responses with each installed JSON library, both in full
+        and keeping only the stored fields
+    """
+    rand = random.Random(0)
+    payloads = []
+    for i in range(10):
+        statuses = [fake_api.make_tweet(250075927172759552 + i * 100 + j, "#benchmark", rand)
+                    for j in range(twitter_settings.max_search_tweets_count)]
+        payloads.append(json.dumps({"statuses": statuses}).encode("utf-8"))
+
+    decoder_name = decoder.decoder_name()
+    result = {"payloads": n_payloads,
+              "payload_bytes": sum(len(payload) for payload in payloads) // len(payloads)}
+    try:
+        for name in decoder.available_decoders():
+            decoder.set_decoder(name)
+            for label, loads in [(name, decoder.loads), (name + "_fields", decoder.loads_statuses)]:
+                start_time = time.time()
+                for i in range(n_payloads):
+                    loads(payloads[i % len(payloads)])
+                result[label + "_payloads_per_sec"] = n_payloads / (time.time() - start_time)
+    finally:
+        decoder.set_decoder(decoder_name)
+    return result
+
+
+def import_times(argv):
+    """ runs twerpy.py with python -X importtime, returning a dict mapping each imported
+        module to its cumulative import time in microseconds, and the total import time.
+        Requires python 3.7 or later
+    """
+    process = subprocess.Popen([sys.executable, "-X", "importtime", os.path.join(_root_dir_path, "twerpy.py")] + argv,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=_root_dir_path)
+    _, stderr = process.communicate()
+
+    # lines look like "import time:       120 |        345 |   lib.database", where
+    # modules imported by another module are indented
+    times = {}
+    total = 0
+    for line in stderr.decode("utf-8").splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        times[module.strip()] = int(cumulative)
+        if not module[1:].startswith(" "):
+            total += int(cumulative)
+    return times, total
+
+
+def bench_startup(n_runs, tmp_dir_path, latency=0.0):
+    """ times running the dump-tweets command on an empty database, which should
+        only import what is needed to read the database
+    """
+    db_filename = _new_db(tmp_dir_path)
+    argv = ["dump-tweets", "-d", db_filename, "-o", os.path.join(tmp_dir_path, "tweets.json"), "--json"]
+
+    start_time = time.time()
+    for _ in range(n_runs):
+        subprocess.check_call([sys.executable, os.path.join(_root_dir_path, "twerpy.py")] + argv,
+                              cwd=_root_dir_path)
+    elapsed = time.time() - start_time
+    result = {"runs": n_runs,
+              "seconds": elapsed,
+              "runs_per_sec": n_runs / elapsed}
+
+    if sys.version_info >= (3, 7):
+        times, total = import_times(argv)
+        result["import_microseconds"] = total
+        result["modules_imported"] = len(times)
+    return result
+
+
+def bench_timeseries(n_tweets, tmp_dir_path, latency=0.0):
+    """ compares hourly tweet counts read from the rollups with counts calculated
+        by reading every tweet and parsing its timestamp
+    """
+    db_con = db.open_db_connection(_new_db(tmp_dir_path))
+    db.insert_tweets(db_con, _synthetic_tweets(n_tweets), "benchmark")
+
+    n_queries = 100
+    start_time = time.time()
+    for _ in range(n_queries):
+        rollups = db.get_rollups(db_con, "hour", 0, 2 ** 40, "benchmark")
+    rollup_seconds = (time.time() - start_time) / n_queries
+
+    start_time = time.time()
+    counts = {}
+    for tweet in db.get_tweets(db_con)[0]:
+        bucket = db.parse_created_at(tweet["created_at"]) // 3600 * 3600
+        counts[bucket] = counts.get(bucket, 0) + 1
+    scan_seconds = time.time() - start_time
+    db.close_db_connection(db_con)
+
+    if len(counts) != len(rollups):
+        raise Exception("The rollups have {0} buckets, expected {1}".format(len(rollups), len(counts)))
+    return {"rows": n_tweets,
+            "buckets": len(rollups),
+            "rollup_query_seconds": rollup_seconds,
+            "scan_query_seconds": scan_seconds,
+            "rollup_queries_per_sec": 1 / rollup_seconds}
+
+
+def bench_cluster(n_tweets, tmp_dir_path, latency=0.0):
+    """ clusters synthetic tweets where every tenth tweet is a manual retweet of an earlier one
+    """
+    tweets = _synthetic_tweets(n_tweets)
+    for i in range(10, n_tweets, 10):
+        tweets[i]["text"] = "RT @user_{0}: {1}".format(i, tweets[i - 5]["text"])
+    db_con = db.open_db_connection(_new_db(tmp_dir_path))
+    db.insert_tweets(db_con, tweets, "benchmark")
+
+    (n_clustered, n_duplicates), elapsed, peak_memory = _measure(near_dup.cluster_new_tweets, db_con)
+    db.close_db_connection(db_con)
+    return {"rows": n_clustered,
+            "near_duplicates": n_duplicates,
+            "seconds": elapsed,
+            "rows_per_sec": n_clustered / elapsed,
+            "peak_memory_bytes": peak_memory}
+
+
+benchmarks = {"ingest": bench_ingest,
+              "term-file": bench_term_file,
+              "dump": bench_dump,
+              "json": bench_json,
+              "startup": bench_startup,
+              "credentials": bench_credentials,
+              "signing": bench_signing,
+              "timeseries": bench_timeseries,
+              "cluster": bench_cluster}
+
+
+def run_benchmarks(names, sizes, latency=0.0):
+    """ runs each benchmark in a temporary directory, returning a dict of results.
+        A benchmark which fails records the error rather than stopping the others
+    """
+    results = {}
+    for name in names:
+        logging.info("Running benchmark {0}".format(name))
+        tmp_dir_path = tempfile.mkdtemp(prefix="twerpy_benchmark_")
+        try:
+            results[name] = benchmarks[name](sizes[name], tmp_dir_path, latency)
+        except Exception as e:
+            logging.error("Benchmark {0} failed: {1!r}".format(name, e))
+            results[name] = {"error": repr(e)}
+        finally:
+            shutil.rmtree(tmp_dir_path)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=_root_dir_path).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous_run(quick, latency, filename=results_filename):
+    """ returns the last saved run with the same settings, or None if there isn't one
+    """
+    if not os.path.exists(filename):
+        return None
+    previous_run = None
+    with open(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            run = json.loads(line)
+            if run["quick"] == quick and run["latency"] == latency:
+                previous_run = run
+    return previous_run
+
+
+def save_run(run, filename=results_filename):
+    with open(filename, "a") as f:
+        f.write(json.dumps(run, sort_keys=True) + "\n")
+
+
+def compare(run, previous_run):
+    """ returns lines describing the change in each throughput metric since the previous run
+    """
+    lines = []
+    for name, result in sorted(run["results"].items()):
+        previous = previous_run["results"].get(name, {}) if previous_run else {}
+        for metric, value in sorted(result.items()):
+            if not metric.endswith("_per_sec"):
+                continue
+            line = "{0:<10} {1:<30} {2:>12.1f}".format(name, metric, value)
+            if metric in previous:
+                change = 100.0 * (value - previous[metric]) / previous[metric]
+                line += " ({0:+.1f}% vs {1})".format(change, previous_run["commit"])
+            lines.append(line)
+        if "error" in result:
+            lines.append("{0:<10} failed: {1}".format(name, result["error"]))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the twerpy benchmarks")
+    parser.add_argument("benchmarks", nargs="*",
+                        help="benchmarks to run, from {0}. All of them are run by default".format(
+                            ", ".join(sorted(benchmarks))))
+    parser.add_argument("--quick", action="store_true", help="use smaller inputs")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the fake API waits before each response")
+    parser.add_argument("--no-save", action="store_true",
+                        help="don't append the results to {0}".format(results_filename))
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in benchmarks:
+            parser.error("unknown benchmark {0}".format(name))
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+    names = args.benchmarks or sorted(benchmarks)
+    run = {"commit": _git_commit(),
+           "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+           "python": sys.version.split()[0],
+           "quick": args.quick,
+           "latency": args.latency,
+           "results": run_benchmarks(names, _quick_sizes if args.quick else _sizes, args.latency)}
+
+    for line in compare(run, load_previous_run(args.quick, args.latency)):
+        print(line)
+    if not args.no_save:
+        save_run(run)
+
+
+if __name__ == "__main__":
+    main()
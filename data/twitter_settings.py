@@ -1,8 +1,58 @@
+# base url for API requests
+api_url = "https://api.twitter.com/1.1"
+
+# JSON library used to decode responses, one of auto, orjson, simdjson, ujson or json.
+# auto uses the fastest one installed
+json_decoder = "auto"
+
+# only decode the tweet and user fields which are stored in the database
+decode_stored_fields_only = False
+
 max_search_tweets_count = 100
 max_users_search_count = 20
 max_user_timeline_count = 200
 max_home_timeline_count = 200
+max_users_lookup_count = 100
+
+# seconds before the profile of a user found by enrich-users is looked up again
+user_refresh_ttl = 7 * 24 * 60 * 60
+
+# requests allowed to each endpoint in a rate limit window, for each set of credentials
+rate_limit_window = 900
+rate_limits = {"search/tweets": 180,
+               "statuses/user_timeline": 180,
+               "statuses/home_timeline": 15,
+               "users/search": 180,
+               "users/suggestions": 15,
+               "users/suggestions/:slug": 15,
+               "users/lookup": 900,
+               "trends/place": 15}
+default_rate_limit = 15
+
+# scheduled searches: the initial seconds between searches of a term, and the range
+# the interval is adapted within
+search_interval = 300
+min_search_interval = 60
+max_search_interval = 86400
+# the interval is set so each search is expected to fill this fraction of a page
+search_target_yield = 0.5
+# weight of the latest search in the estimated rate of new tweets
+search_rate_smoothing = 0.5
+
+# trend-monitor defaults: seconds between polls of each WOEID, how long a trend stays
+# scheduled after it was last seen, and the priority of its searches
+trend_poll_interval = 300
+trend_expiry = 3600
+trend_search_priority = 10
 
-multiple_search_limit = 180
+# async client: the most requests open at once, and seconds before a request times out
+async_max_connections = 20
+async_request_timeout = 30
 
-multiple_user_sugg_limit = 15
+# retain: days the tweets in each group are kept, e.g. {"good_times": 30}, and for groups
+# which aren't listed, None to keep them forever
+retention_days = {}
+default_retention_days = None
+# tweets deleted in each transaction, and pages freed in each step of vacuuming
+retention_chunk_size = 1000
+incremental_vacuum_pages = 1000
@@ -0,0 +1,401 @@
+"""
+async_client.py:
+    An asyncio client for embedding tweet collection in other programs. Requests are
+    signed and spread over the pool of credentials as in tweet_handler, but many
+    searches can run at once in a single thread. Results are returned as async
+    iterators of tweets or users, which can be written to a sink: the database in
+    batches, an asyncio queue or a callback
+
+    This module needs python 3.7 or later. The command line tool still uses the
+    blocking functions in tweet_handler
+"""
+import asyncio
+import logging
+import ssl
+import time
+from urllib.parse import urlencode, urlsplit
+
+from lib import credentials
+from lib import database as db
+from lib import decoder
+from lib import filters
+from lib import metrics
+from lib import oauth_signer
+from data import twitter_settings
+
+# the number of tweets or users passed to a sink at a time by collect
+_chunk_size = 100
+
+# the error code users/lookup returns when none of the users were found
+_no_user_matches_code = 17
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0], 16)
+        if size == 0:
+            # skip any trailers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
+
+
+async def http_request(method, url, headers=(), body=None):
+    """ makes an HTTP/1.1 request on a new connection
+
+        returns the status code, a dict of the response headers with lower case
+        names, and the body as bytes
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                   ssl=ssl.create_default_context() if secure else None)
+    try:
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        lines = ["{0} {1} HTTP/1.1".format(method, path),
+                 "Host: {0}".format(parts.netloc),
+                 "Connection: close"]
+        lines += ["{0}: {1}".format(name, value) for name, value in headers]
+        if body is not None:
+            lines.append("Content-Length: {0}".format(len(body)))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            response_body = await _read_chunked(reader)
+        elif "content-length" in response_headers:
+            response_body = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            response_body = await reader.read()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return status, response_headers, response_body
+
+
+def _endpoint(path):
+    """ returns the API endpoint of a path for rate limits and metrics labels
+    """
+    if path.startswith("users/suggestions/"):
+        return "users/suggestions/:slug"
+    return path
+
+
+def _no_user_matches(json_data):
+    """ returns True if the response is the error returned when none of the users were found
+    """
+    return isinstance(json_data, dict) and \
+        any(error.get("code") == _no_user_matches_code for error in json_data.get("errors", []))
+
+
+def _oldest_id(tweets):
+    return min((int(tweet["id_str"]) for tweet in tweets if "id_str" in tweet), default=None)
+
+
+class AsyncClient(object):
+    """ makes API requests with a pool of credentials. If credential_list isn't given,
+        the credentials are loaded from the user settings
+
+        At most max_connections requests are open at once. When every credential has
+        used up its requests for an endpoint, requests to it wait for the rate limit
+        without blocking requests to other endpoints
+    """
+    def __init__(self, credential_list=None, api_url=None, max_connections=None, timeout=None):
+        if credential_list is None:
+            from data import user_settings
+            credential_list = credentials.load_credentials(user_settings)
+        self.pool = credentials.CredentialPool(credential_list)
+        self.signers = [oauth_signer.Signer(credential["consumer_key"], credential["consumer_secret"],
+                                            credential["access_token_key"], credential["access_token_secret"])
+                        for credential in self.pool.credentials]
+        self.api_url = api_url or twitter_settings.api_url
+        self.max_connections = max_connections or twitter_settings.async_max_connections
+        self.timeout = timeout or twitter_settings.async_request_timeout
+        # the semaphore is made in the event loop it is used in
+        self._connections = None
+
+    async def _acquire_credential(self, endpoint):
+        while True:
+            index = self.pool.acquire(endpoint)
+            if index is not None:
+                return index
+            seconds = self.pool.wait_time(endpoint)
+            logging.info("Waiting {0:.0f} seconds for the {1} rate limit".format(seconds, endpoint))
+            await asyncio.sleep(seconds)
+            metrics.increment("rate_limit_sleep_seconds_total", seconds)
+
+    def _update_rate_limit(self, index, endpoint, status, headers):
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        reset = int(reset) if reset else None
+
+        if status == 429:
+            self.pool.exhausted(index, endpoint, reset)
+        elif remaining:
+            # requests which were still in flight when the server counted this one
+            # aren't included in its count, so the lower count is kept
+            remaining = min(int(remaining), self.pool.remaining(index, endpoint))
+            self.pool.update(index, endpoint, remaining, reset)
+
+    async def request(self, path, http_method="GET", parameters=(), statuses=False):
+        """ signs and makes a request to the API path, e.g. search/tweets, using
+            whichever credential has requests remaining for the endpoint
+
+            returns the decoded response, as for tweet_handler.twitterreq
+        """
+        if self._connections is None:
+            self._connections = asyncio.Semaphore(self.max_connections)
+        endpoint = _endpoint(path)
+        url = "{0}/{1}.json".format(self.api_url, path)
+
+        if hasattr(parameters, "items"):
+            parameters = list(parameters.items())
+        else:
+            parameters = list(parameters)
+        if http_method == "POST":
+            body = urlencode(parameters).encode("ascii")
+            signed_parameters = parameters
+            headers = [("Content-Type", "application/x-www-form-urlencoded")]
+        else:
+            body = None
+            signed_parameters = ()
+            headers = []
+            if parameters:
+                url += "?" + urlencode(parameters)
+
+        while True:
+            index = await self._acquire_credential(endpoint)
+            authorization = self.signers[index].authorization_header(http_method, url, signed_parameters)
+
+            metrics.increment("api_requests_total", endpoint=endpoint)
+            async with self._connections:
+                start_time = time.time()
+                try:
+                    status, response_headers, response_data = await asyncio.wait_for(
+                        http_request(http_method, url, headers + [("Authorization", authorization)], body),
+                        self.timeout)
+                except asyncio.TimeoutError:
+                    metrics.increment("api_errors_total", endpoint=endpoint)
+                    logging.error("Request to {0} timed out after {1} seconds".format(endpoint, self.timeout))
+                    raise
+                metrics.observe("api_request_seconds", time.time() - start_time, endpoint=endpoint)
+            self._update_rate_limit(index, endpoint, status, response_headers)
+
+            # try again with another credential, or wait, if this one was rate limited
+            if status != 429:
+                break
+            metrics.increment("api_rate_limited_total", endpoint=endpoint)
+            logging.info("Credential {0} is rate limited for {1}".format(index, endpoint))
+
+        try:
+            with metrics.timer("json_parse_seconds", endpoint=endpoint):
+                if statuses and twitter_settings.decode_stored_fields_only:
+                    return decoder.loads_statuses(response_data)
+                return decoder.loads(response_data)
+        except ValueError:
+            metrics.increment("api_errors_total", endpoint=endpoint)
+            logging.error("Received invalid twitter API response: {0}".format(response_data))
+            raise
+
+    async def _pages(self, path, parameters, count, pages, since_id, key=None):
+        # pages back through the results with max_id, newest first
+        parameters = dict(parameters, count=count)
+        if since_id:
+            parameters["since_id"] = since_id
+        for _ in range(pages):
+            json_data = await self.request(path, "GET", parameters, statuses=True)
+            if key is not None:
+                if key not in json_data:
+                    raise Exception("Error {0}".format(json_data))
+                json_data = json_data[key]
+            for tweet in json_data:
+                yield tweet
+
+            oldest_id = _oldest_id(json_data)
+            if len(json_data) < count or oldest_id is None:
+                break
+            parameters["max_id"] = oldest_id - 1
+
+    def search_tweets(self, term, no_RT=False, since_id=None,
+                      count=twitter_settings.max_search_tweets_count, pages=1):
+        """ returns an async iterator of the tweets containing the term, newest first.
+            Up to pages requests are made, each for count tweets. If since_id is given,
+            only tweets newer than that id are returned
+        """
+        query = term
+        if no_RT:
+            query += " exclude:retweets"
+        return self._pages("search/tweets", {"q": query}, count, pages, since_id, "statuses")
+
+    def search_user_tweets(self, screen_name, since_id=None,
+                           count=twitter_settings.max_user_timeline_count, pages=1):
+        """ returns an async iterator of the tweets posted by a user, newest first
+        """
+        return self._pages("statuses/user_timeline", {"screen_name": screen_name}, count, pages, since_id)
+
+    async def search_users(self, term, count=twitter_settings.max_search_tweets_count):
+        """ returns an async iterator of the users who have recently tweeted about the term
+        """
+        async for tweet in self.search_tweets(term, no_RT=True, count=count):
+            yield tweet["user"]
+
+    async def search_top_users(self, term, count=twitter_settings.max_users_search_count):
+        """ returns an async iterator of the top users matching the term
+        """
+        for user in await self.request("users/search", "GET", {"q": term, "count": count}):
+            yield user
+
+    async def lookup_users(self, user_ids):
+        """ returns an async iterator of the profiles of the users with the given ids,
+            looked up max_users_lookup_count at a time. Suspended and deleted users are left out.
+            Raises an exception if the API returns an error other than finding none of the users
+        """
+        user_ids = list(user_ids)
+        batch_size = twitter_settings.max_users_lookup_count
+        for start in range(0, len(user_ids), batch_size):
+            json_data = await self.request("users/lookup", "POST",
+                                           {"user_id": ",".join(user_ids[start:start + batch_size])})
+            if _no_user_matches(json_data):
+                continue
+            if not isinstance(json_data, list):
+                metrics.increment("api_errors_total", endpoint="users/lookup")
+                raise Exception("Error looking up users: {0}".format(json_data))
+            for user in json_data:
+                yield user
+
+    async def get_trends(self, WOEID):
+        """ returns the names of the current trends for the given WOEID
+        """
+        json_data = await self.request("trends/place", "GET", {"id": WOEID})
+        return [trend["name"] for trend in json_data[0]["trends"]
+                if "name" in trend and trend["name"]]
+
+
+class DatabaseSink(object):
+    """ writes tweets or users to the database. Items are kept until there are
+        batch_size in a group, so results from many concurrent searches are written
+        in a few transactions. Call flush when finished to write the rest
+    """
+    def __init__(self, db_con, kind="tweets", batch_size=1000):
+        if kind not in ("tweets", "users"):
+            raise ValueError("kind must be tweets or users")
+        self.db_con = db_con
+        self.kind = kind
+        self.batch_size = batch_size
+        self._batches = {}
+
+    def _write_batch(self, group):
+        items = self._batches.pop(group)
+        if self.kind == "tweets":
+            db.insert_tweets(self.db_con, items, group)
+        else:
+            db.insert_users(self.db_con, items, group)
+
+    async def write(self, group, items):
+        self._batches.setdefault(group, []).extend(items)
+        if len(self._batches[group]) >= self.batch_size:
+            self._write_batch(group)
+
+    async def flush(self):
+        for group in list(self._batches):
+            self._write_batch(group)
+
+
+class QueueSink(object):
+    """ puts (group, item) pairs on an asyncio queue, waiting if the queue is full
+    """
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def write(self, group, items):
+        for item in items:
+            await self.queue.put((group, item))
+
+    async def flush(self):
+        pass
+
+
+class CallbackSink(object):
+    """ calls callback(group, items) with each chunk of results. The callback can
+        be a function or a coroutine function
+    """
+    def __init__(self, callback):
+        self.callback = callback
+
+    async def write(self, group, items):
+        result = self.callback(group, items)
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def flush(self):
+        pass
+
+
+async def collect(items, sink, group, tweet_filters=None):
+    """ writes the results from an async iterator to the sink in chunks, as they arrive.
+        If tweet_filters are given, only the tweets which pass them are written
+
+        returns the number of results written
+    """
+    n_items = 0
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= _chunk_size:
+            n_items += await _write_chunk(sink, group, chunk, tweet_filters)
+            chunk = []
+    if chunk:
+        n_items += await _write_chunk(sink, group, chunk, tweet_filters)
+    return n_items
+
+
+async def _write_chunk(sink, group, chunk, tweet_filters):
+    chunk = filters.filter_tweets(chunk, tweet_filters)
+    if chunk:
+        await sink.write(group, chunk)
+    return len(chunk)
+
+
+async def search_terms(client, searches, sink, no_RT=False, pages=1, concurrency=None):
+    """ searches for each (term, group) or (term, group, filters) tuple, e.g. from
+        search_file.read_search_file, writing the tweets which pass the filters to the
+        sink. Up to concurrency searches run at once, by default the client's
+        max_connections. Searches with a request which times out are logged and skipped.
+        The sink is flushed at the end
+
+        returns the number of tweets written
+    """
+    searches = iter(searches)
+    n_tweets = 0
+
+    async def worker():
+        nonlocal n_tweets
+        for search in searches:
+            term, group = search[:2]
+            tweet_filters = search[2] if len(search) > 2 else None
+            try:
+                found = await collect(client.search_tweets(term, no_RT, pages=pages), sink, group, tweet_filters)
+            except asyncio.TimeoutError:
+                # tweets already passed to the sink are kept, but aren't counted
+                logging.error("Search for {0} timed out, skipping it".format(term))
+                continue
+            logging.info("Stored {0} tweets about {1}".format(found, term))
+            n_tweets += found
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency or client.max_connections)])
+    finally:
+        await sink.flush()
+    return n_tweets
@@ -0,0 +1,101 @@
+"""
+credentials.py:
+    Tracks the rate limit of each API endpoint for a pool of credentials, so
+    requests can be spread over several apps and only wait when all of them
+    have used up their budget
+"""
+import time
+
+from data import twitter_settings
+
+# the keys each set of credentials must have
+credential_keys = ["access_token_key", "access_token_secret", "consumer_key", "consumer_secret"]
+
+
+def load_credentials(user_settings):
+    """ returns the list of credentials in the user settings. These are either given as
+        a list of dicts called credentials, or as the single set of keys written by setup
+    """
+    if hasattr(user_settings, "credentials") and user_settings.credentials:
+        credentials = list(user_settings.credentials)
+    else:
+        credentials = [dict((key, getattr(user_settings, key)) for key in credential_keys)]
+
+    for credential in credentials:
+        missing = [key for key in credential_keys if key not in credential]
+        if missing:
+            raise Exception("Credentials are missing {0}".format(", ".join(missing)))
+    return credentials
+
+
+def endpoint_rate_limit(endpoint):
+    """ returns the number of requests allowed to the endpoint in each rate limit window
+    """
+    return twitter_settings.rate_limits.get(endpoint, twitter_settings.default_rate_limit)
+
+
+class CredentialPool(object):
+    """ a pool of credentials, with the remaining requests and reset time of
+        each endpoint tracked separately for each credential
+    """
+    def __init__(self, credentials, window=None, clock=time.time):
+        if not credentials:
+            raise Exception("The credential pool needs at least one set of credentials")
+        self.credentials = list(credentials)
+        if window is None:
+            window = twitter_settings.rate_limit_window
+        self.window = window
+        self.clock = clock
+        # for each credential, maps endpoint to [requests remaining, window reset time]
+        self._limits = [{} for _ in self.credentials]
+
+    def _limit(self, index, endpoint):
+        now = self.clock()
+        limits = self._limits[index]
+        if endpoint not in limits or limits[endpoint][1] <= now:
+            # a new window starts with the first request made in it
+            limits[endpoint] = [endpoint_rate_limit(endpoint), now + self.window]
+        return limits[endpoint]
+
+    def remaining(self, index, endpoint):
+        """ returns the number of requests the credential has left for the endpoint
+        """
+        return self._limit(index, endpoint)[0]
+
+    def acquire(self, endpoint):
+        """ returns the index of the credential with the most requests remaining for the
+            endpoint, counting a request against it. Returns None if every credential
+            has used up its budget, in which case wait_time gives the time to wait
+        """
+        index = max(range(len(self.credentials)), key=lambda i: self.remaining(i, endpoint))
+        limit = self._limit(index, endpoint)
+        if limit[0] <= 0:
+            return None
+        limit[0] -= 1
+        return index
+
+    def wait_time(self, endpoint):
+        """ returns the number of seconds until a credential has budget for the endpoint
+        """
+        now = self.clock()
+        waits = []
+        for index in range(len(self.credentials)):
+            remaining, reset = self._limit(index, endpoint)
+            if remaining > 0:
+                return 0
+            waits.append(reset - now)
+        return max(0, min(waits))
+
+    def update(self, index, endpoint, remaining, reset=None):
+        """ sets the rate limit state of a credential from the x-rate-limit-remaining and
+            x-rate-limit-reset headers of a response
+        """
+        limit = self._limit(index, endpoint)
+        limit[0] = remaining
+        if reset is not None:
+            limit[1] = reset
+
+    def exhausted(self, index, endpoint, reset=None):
+        """ marks the credential as having no requests left, after a rate limit error
+        """
+        self.update(index, endpoint, 0, reset)
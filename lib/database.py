@@ -2,13 +2,16 @@
 database.py:
     File for connecting to an sqlite database to store the data
 """
+import calendar
 import os
 import sys
 import sqlite3
 
+from lib import metrics
+
 # can't call tweet.text text, as TEXT is a keyword
 _create_tables_sql = ["""
-CREATE TABLE tweets (
+CREATE TABLE IF NOT EXISTS tweets (
     id_str TEXT,
     tweet_text TEXT,
     created_at TEXT,
@@ -16,11 +19,16 @@ CREATE TABLE tweets (
     retweet_count INTEGER,
     user_id_str TEXT,
     tweet_group TEXT,
+    created_ts INTEGER,
+    lang TEXT,
+    longitude REAL,
+    latitude REAL,
+    place_country TEXT,
     PRIMARY KEY (id_str, tweet_group)
 );
 """,
                       """
-CREATE TABLE users (
+CREATE TABLE IF NOT EXISTS users (
     id_str TEXT,
     name TEXT,
     screen_name TEXT,
@@ -32,11 +40,125 @@ CREATE TABLE users (
     user_group TEXT,
     PRIMARY KEY (id_str, user_group)
 );
+""",
+                      """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT,
+    term TEXT,
+    job_group TEXT,
+    completed_at TEXT,
+    PRIMARY KEY (job_id, term, job_group)
+);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS search_queue (
+    term TEXT,
+    job_group TEXT,
+    endpoint TEXT,
+    priority INTEGER,
+    next_due INTEGER,
+    expires_at INTEGER,
+    since_id TEXT,
+    revisit_interval INTEGER,
+    last_run INTEGER,
+    tweet_rate REAL,
+    filters TEXT,
+    PRIMARY KEY (term, job_group, endpoint)
+);
+""",
+                      """
+CREATE INDEX IF NOT EXISTS search_queue_due ON search_queue (next_due);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS trends (
+    woeid TEXT,
+    name TEXT,
+    first_seen INTEGER,
+    last_seen INTEGER,
+    PRIMARY KEY (woeid, name)
+);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS user_lookups (
+    id_str TEXT PRIMARY KEY,
+    looked_up_at INTEGER
+);
+""",
+                      """
+CREATE INDEX IF NOT EXISTS tweets_user ON tweets (user_id_str);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS tweet_rollups (
+    resolution TEXT,
+    tweet_group TEXT,
+    bucket INTEGER,
+    tweet_count INTEGER,
+    retweet_count INTEGER,
+    favourite_count INTEGER,
+    PRIMARY KEY (resolution, tweet_group, bucket)
+);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS tweet_clusters (
+    id_str TEXT PRIMARY KEY,
+    cluster_id TEXT,
+    signature BLOB
+);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band_key INTEGER,
+    cluster_id TEXT,
+    PRIMARY KEY (band_key, cluster_id)
+);
+""",
+                      # the rowid of the last tweet clustered, in a single row
+                      """
+CREATE TABLE IF NOT EXISTS cluster_progress (
+    id INTEGER PRIMARY KEY,
+    last_rowid INTEGER
+);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS tweet_edges (
+    tweet_id TEXT,
+    source_id TEXT,
+    target_id TEXT,
+    edge_type TEXT,
+    PRIMARY KEY (tweet_id, target_id, edge_type)
+);
+""",
+                      """
+CREATE TABLE IF NOT EXISTS graph_nodes (
+    node_index INTEGER PRIMARY KEY,
+    id_str TEXT UNIQUE
+);
+"""]
+
+# the resolutions tweets are rolled up at, as (name, seconds in each bucket), from
+# the finest. Each resolution is a multiple of the first
+rollup_resolutions = [("minute", 60), ("hour", 3600), ("day", 86400)]
+
+# indexes on added columns are created after any missing columns have been
+# added to older databases
+_create_indexes_sql = ["""
+CREATE INDEX IF NOT EXISTS tweets_lang ON tweets (lang);
+""",
+                       """
+CREATE INDEX IF NOT EXISTS tweets_location ON tweets (latitude, longitude);
 """]
 
-# 7 fields
+# columns added to existing tables since they were first released, as
+# (table, column, type). Databases made by older versions get them when opened
+_added_columns = [("tweets", "created_ts", "INTEGER"),
+                  ("tweets", "lang", "TEXT"),
+                  ("tweets", "longitude", "REAL"),
+                  ("tweets", "latitude", "REAL"),
+                  ("tweets", "place_country", "TEXT")]
+
+# 12 fields
 _insert_tweet_sql = """
-INSERT INTO tweets VALUES (?,?,?,?,?,?,?);
+INSERT INTO tweets VALUES (?,?,?,?,?,?,?,?,?,?,?,?);
 """
 
 # 9 fields
@@ -44,6 +166,299 @@ _insert_user_sql = """
 INSERT INTO users VALUES (?,?,?,?,?,?,?,?,?);
 """
 
+# batch inserts skip duplicates rather than raising an IntegrityError
+_insert_tweets_sql = """
+INSERT OR IGNORE INTO tweets VALUES (?,?,?,?,?,?,?,?,?,?,?,?);
+"""
+
+_insert_users_sql = """
+INSERT OR IGNORE INTO users VALUES (?,?,?,?,?,?,?,?,?);
+"""
+
+_complete_job_unit_sql = """
+INSERT OR REPLACE INTO jobs VALUES (?,?,?,datetime('now'));
+"""
+
+_get_completed_job_units_sql = """
+SELECT term, job_group FROM jobs
+WHERE job_id=?;
+"""
+
+_reset_job_sql = """
+DELETE FROM jobs
+WHERE job_id=?;
+"""
+
+_insert_search_sql = """
+INSERT OR IGNORE INTO search_queue (term, job_group, endpoint, priority, next_due, expires_at, revisit_interval,
+                                     filters)
+VALUES (?,?,?,?,?,?,?,?);
+"""
+
+# a search which is already queued keeps the highest priority and latest expiry,
+# and takes the new filters
+_requeue_search_sql = """
+UPDATE search_queue
+SET priority=MAX(priority, ?),
+    expires_at=CASE WHEN expires_at IS NULL OR ? IS NULL THEN NULL ELSE MAX(expires_at, ?) END,
+    filters=?
+WHERE term=? AND job_group=? AND endpoint=?;
+"""
+
+_get_due_searches_sql = """
+SELECT * FROM search_queue
+WHERE next_due<=? AND (expires_at IS NULL OR expires_at>?)
+ORDER BY priority DESC, last_run IS NULL DESC, tweet_rate * (? - last_run) DESC, next_due
+LIMIT ?;
+"""
+
+_update_search_sql = """
+UPDATE search_queue
+SET next_due=?, since_id=?, revisit_interval=?, last_run=?, tweet_rate=?
+WHERE term=? AND job_group=? AND endpoint=?;
+"""
+
+_get_next_due_sql = """
+SELECT MIN(next_due) FROM search_queue
+WHERE expires_at IS NULL OR expires_at>?;
+"""
+
+_delete_expired_searches_sql = """
+DELETE FROM search_queue
+WHERE expires_at<=?;
+"""
+
+_get_active_trends_sql = """
+SELECT name FROM trends
+WHERE woeid=? AND last_seen>?;
+"""
+
+_insert_trend_sql = """
+INSERT OR REPLACE INTO trends VALUES (?,?,?,?);
+"""
+
+_update_trend_sql = """
+UPDATE trends
+SET last_seen=?
+WHERE woeid=? AND name=?;
+"""
+
+# tweet authors who aren't in the users table and haven't been looked up,
+# and users whose last lookup was before the given time
+_get_users_to_look_up_sql = """
+SELECT DISTINCT user_id_str FROM tweets
+WHERE user_id_str IS NOT NULL
+    AND user_id_str NOT IN (SELECT id_str FROM users)
+    AND user_id_str NOT IN (SELECT id_str FROM user_lookups)
+UNION
+SELECT id_str FROM user_lookups
+WHERE looked_up_at<=?;
+"""
+
+_update_user_profile_sql = """
+UPDATE users
+SET name=?, screen_name=?, created_at=?, description=?,
+    followers_count=?, friends_count=?, statuses_count=?
+WHERE id_str=?;
+"""
+
+_record_user_lookup_sql = """
+INSERT OR REPLACE INTO user_lookups VALUES (?,?);
+"""
+
+_get_screen_names_sql = """
+SELECT id_str, screen_name FROM users
+WHERE screen_name IS NOT NULL;
+"""
+
+_backfill_created_ts_sql = """
+UPDATE tweets
+SET created_ts=parse_created_at(created_at)
+WHERE created_ts IS NULL AND created_at IS NOT NULL;
+"""
+
+_delete_rollups_sql = """
+DELETE FROM tweet_rollups;
+"""
+
+_get_last_tweet_rowid_sql = """
+SELECT COALESCE(MAX(rowid), 0) FROM tweets;
+"""
+
+# tweets get rowids above any already in the table, so the tweets inserted by a
+# batch are the ones after the last rowid before it
+_get_new_rollups_sql = """
+SELECT tweet_group, created_ts / ? * ?, COUNT(*),
+       COALESCE(SUM(retweet_count), 0), COALESCE(SUM(favourite_count), 0)
+FROM tweets
+WHERE rowid>? AND created_ts IS NOT NULL
+GROUP BY tweet_group, created_ts / ?;
+"""
+
+_create_rollup_sql = """
+INSERT OR IGNORE INTO tweet_rollups VALUES (?,?,?,0,0,0);
+"""
+
+_add_to_rollup_sql = """
+UPDATE tweet_rollups
+SET tweet_count=tweet_count + ?, retweet_count=retweet_count + ?, favourite_count=favourite_count + ?
+WHERE resolution=? AND tweet_group=? AND bucket=?;
+"""
+
+_rebuild_rollups_sql = """
+INSERT INTO tweet_rollups
+SELECT ?, tweet_group, created_ts / ? * ?, COUNT(*),
+       COALESCE(SUM(retweet_count), 0), COALESCE(SUM(favourite_count), 0)
+FROM tweets
+WHERE created_ts IS NOT NULL
+GROUP BY tweet_group, created_ts / ?;
+"""
+
+_get_rollups_sql = """
+SELECT tweet_group, bucket, tweet_count, retweet_count, favourite_count FROM tweet_rollups
+WHERE resolution=? AND bucket>=? AND bucket<?
+ORDER BY tweet_group, bucket;
+"""
+
+_get_group_rollups_sql = """
+SELECT tweet_group, bucket, tweet_count, retweet_count, favourite_count FROM tweet_rollups
+WHERE resolution=? AND tweet_group=? AND bucket>=? AND bucket<?
+ORDER BY bucket;
+"""
+
+# edges are stored once for each tweet, even if it is in several groups
+_insert_edges_sql = """
+INSERT OR IGNORE INTO tweet_edges VALUES (?,?,?,?);
+"""
+
+# users are numbered in the order they first appear in an edge
+_add_graph_nodes_sql = """
+INSERT OR IGNORE INTO graph_nodes (id_str)
+SELECT source_id FROM tweet_edges
+UNION
+SELECT target_id FROM tweet_edges;
+"""
+
+_get_node_count_sql = """
+SELECT COALESCE(MAX(node_index), 0) FROM graph_nodes;
+"""
+
+# the number of edges between each pair of users, ordered by source for the CSR arrays
+_get_graph_edges_sql = """
+SELECT s.node_index - 1, t.node_index - 1, COUNT(*) FROM tweet_edges e
+JOIN graph_nodes s ON s.id_str=e.source_id
+JOIN graph_nodes t ON t.id_str=e.target_id
+WHERE e.source_id!=e.target_id AND e.edge_type IN ({0})
+GROUP BY s.node_index, t.node_index
+ORDER BY s.node_index, t.node_index;
+"""
+
+_get_graph_node_ids_sql = """
+SELECT node_index - 1, id_str FROM graph_nodes;
+"""
+
+# the time before which each group's tweets are deleted by retain
+_create_retention_cutoffs_sql = """
+CREATE TEMP TABLE IF NOT EXISTS retention_cutoffs (
+    tweet_group TEXT PRIMARY KEY,
+    cutoff INTEGER
+);
+"""
+
+_clear_retention_cutoffs_sql = """
+DELETE FROM temp.retention_cutoffs;
+"""
+
+_insert_retention_cutoff_sql = """
+INSERT INTO temp.retention_cutoffs VALUES (?,?);
+"""
+
+# scanning on from the last rowid found means the table is only read once for all the groups
+_get_expired_tweets_sql = """
+SELECT t.rowid, t.* FROM tweets t
+JOIN temp.retention_cutoffs r ON r.tweet_group=t.tweet_group
+WHERE t.rowid>? AND t.created_ts<r.cutoff
+ORDER BY t.rowid
+LIMIT ?;
+"""
+
+_delete_tweet_sql = """
+DELETE FROM tweets
+WHERE rowid=?;
+"""
+
+# edges and clusters are stored once for each tweet, so they are only deleted when the
+# tweet isn't left in any group. The first tweet of a cluster is kept, as new tweets are
+# compared with its signature
+_delete_orphan_edges_sql = """
+DELETE FROM tweet_edges
+WHERE tweet_id=? AND NOT EXISTS (SELECT 1 FROM tweets WHERE id_str=?);
+"""
+
+_delete_orphan_cluster_sql = """
+DELETE FROM tweet_clusters
+WHERE id_str=? AND cluster_id!=id_str AND NOT EXISTS (SELECT 1 FROM tweets WHERE id_str=?);
+"""
+
+_get_tweets_to_cluster_sql = """
+SELECT rowid, id_str, tweet_text FROM tweets
+WHERE rowid>?
+ORDER BY rowid
+LIMIT ?;
+"""
+
+_get_last_clustered_rowid_sql = """
+SELECT COALESCE(MAX(last_rowid), 0) FROM cluster_progress;
+"""
+
+_set_last_clustered_rowid_sql = """
+INSERT OR REPLACE INTO cluster_progress VALUES (1,?);
+"""
+
+# new tweets reuse the rowids of the newest tweets if they are deleted, so the last
+# rowid clustered is moved back to the newest tweet left
+_lower_last_clustered_rowid_sql = """
+UPDATE cluster_progress
+SET last_rowid=?
+WHERE last_rowid>?;
+"""
+
+_is_clustered_sql = """
+SELECT 1 FROM tweet_clusters
+WHERE id_str=?;
+"""
+
+_insert_tweet_cluster_sql = """
+INSERT OR IGNORE INTO tweet_clusters VALUES (?,?,?);
+"""
+
+_insert_lsh_bucket_sql = """
+INSERT OR IGNORE INTO lsh_buckets VALUES (?,?);
+"""
+
+# the clusters which share a band with the tweet, with the signature of their first tweet
+_get_cluster_candidates_sql = """
+SELECT DISTINCT c.id_str, c.signature FROM lsh_buckets b
+JOIN tweet_clusters c ON c.id_str=b.cluster_id
+WHERE b.band_key IN ({0});
+"""
+
+# the first tweet stored from each cluster, with tweets which haven't been clustered kept
+_get_all_deduped_tweets_sql = """
+SELECT * FROM tweets
+WHERE rowid IN (SELECT MIN(t.rowid) FROM tweets t
+                LEFT JOIN tweet_clusters c ON c.id_str=t.id_str
+                GROUP BY t.tweet_group, COALESCE(c.cluster_id, t.id_str));
+"""
+
+_get_group_deduped_tweets_sql = """
+SELECT * FROM tweets
+WHERE rowid IN (SELECT MIN(t.rowid) FROM tweets t
+                LEFT JOIN tweet_clusters c ON c.id_str=t.id_str
+                WHERE t.tweet_group=?
+                GROUP BY COALESCE(c.cluster_id, t.id_str));
+"""
+
 _get_all_tweets_sql = """
 SELECT * FROM tweets;
 """
@@ -59,7 +474,7 @@ SELECT * FROM users;
 
 _get_group_users_sql = """
 SELECT * FROM users
-WHERE tweet_group=?;
+WHERE user_group=?;
 """
 
 _get_all_tweet_groups_sql = """
@@ -109,18 +524,45 @@ def reset(db_filename, warning_input=_warning_prompt):
     except OSError:
         pass
 
-     # create the database tables
-    db_con = open_db_connection(db_filename)
+    db_con = sqlite3.connect(db_filename)
+    # auto_vacuum has to be set before any tables are created, and lets retain
+    # give the space of deleted rows back in small steps
+    db_con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    # create the database tables
+    create_tables(db_con)
+    db_con.close()
+
+
+def create_tables(db_con):
+    """ creates any tables which don't exist yet, so databases made by older
+        versions pick up new tables when they are opened
+    """
     for _create_table_sql in _create_tables_sql:
         db_con.execute(_create_table_sql)
+    _add_missing_columns(db_con)
+    for _create_index_sql in _create_indexes_sql:
+        db_con.execute(_create_index_sql)
     db_con.commit()
-    db_con.close()
+
+
+def _add_missing_columns(db_con):
+    """ adds the columns in _added_columns which an existing table doesn't have
+    """
+    columns = {}
+    for table, column, column_type in _added_columns:
+        if table not in columns:
+            columns[table] = [row[1] for row in db_con.execute("PRAGMA table_info({0})".format(table))]
+        if column not in columns[table]:
+            db_con.execute("ALTER TABLE {0} ADD COLUMN {1} {2}".format(table, column, column_type))
 
 
 def open_db_connection(db_filename):
     """ remember to close this at the end
     """
-    return sqlite3.connect(db_filename)
+    db_con = sqlite3.connect(db_filename)
+    create_tables(db_con)
+    return db_con
 
 
 def close_db_connection(db_con):
@@ -130,22 +572,130 @@ def close_db_connection(db_con):
     db_con.close()
 
 
-def insert_tweet(db_con, tweet, tweet_group):
-    """ Inserts the tweet data (passed as a json object) into the database, adding
-        "tweet_group" field. Returns True if the insertion was successful.
+_months = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+           "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
 
-        If another tweet with the same id and tweet_group is given, it will not be
-        inserted.
+
+# the start of each month seen, as seconds since the epoch, keyed by e.g. "2012Sep"
+_month_starts = {}
+
+
+def parse_created_at(created_at):
+    """ converts a Twitter timestamp, e.g. "Mon Sep 24 03:35:21 +0000 2012", to seconds
+        since the epoch. Returns None if it can't be parsed
+    """
+    # the fields are at fixed positions, which is much faster than time.strptime
+    try:
+        if len(created_at) != 30 or created_at[19] != " " or created_at[25] != " ":
+            return None
+        month_key = created_at[26:] + created_at[4:7]
+        if month_key not in _month_starts:
+            _month_starts[month_key] = calendar.timegm((int(created_at[26:]), _months[created_at[4:7]],
+                                                        1, 0, 0, 0))
+        timestamp = (_month_starts[month_key] + (int(created_at[8:10]) - 1) * 86400 +
+                     int(created_at[11:13]) * 3600 + int(created_at[14:16]) * 60 + int(created_at[17:19]))
+
+        # Twitter always gives times in UTC, but handle other offsets anyway
+        offset = int(created_at[21:23]) * 3600 + int(created_at[23:25]) * 60
+        return timestamp - offset if created_at[20] == "+" else timestamp + offset
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+def tweet_location(tweet):
+    """ returns the (longitude, latitude) of a tweet, from its exact coordinates if it
+        has them, or the centre of its place. Returns None if it has neither
+    """
+    try:
+        coordinates = tweet.get("coordinates")
+        if coordinates:
+            longitude, latitude = coordinates["coordinates"]
+            return float(longitude), float(latitude)
+
+        corners = ((tweet.get("place") or {}).get("bounding_box") or {}).get("coordinates")
+        if corners:
+            longitudes = [corner[0] for corner in corners[0]]
+            latitudes = [corner[1] for corner in corners[0]]
+            return ((min(longitudes) + max(longitudes)) / 2.0,
+                    (min(latitudes) + max(latitudes)) / 2.0)
+    except (KeyError, IndexError, TypeError, ValueError):
+        pass
+    return None
+
+
+def tweet_country(tweet):
+    """ returns the country code of the tweet's place, or None if it has no place
+    """
+    return (tweet.get("place") or {}).get("country_code")
+
+
+def _tweet_row(tweet, tweet_group):
+    """ returns the values for a row in the tweets table
     """
     # get the fields out of the JSON object, inserting None, if the key doesn't exist
-    index_names = ["id_str", "text", "created_at", "favourite_count", "retweet_count"]
+    index_names = ["id_str", "text", "created_at"]
     tweet_data = [tweet[i] if i in tweet else None for i in index_names]
 
+    # the API calls it favorite_count
+    tweet_data += [tweet.get("favorite_count", tweet.get("favourite_count")),
+                   tweet.get("retweet_count")]
+
     # add the user id (since it needs deep indexing) and tweet_group separately,
     tweet_data += [tweet["user"]["id_str"] if "user" in tweet and "id_str" in tweet["user"] else None,
-                   tweet_group]
+                   tweet_group,
+                   parse_created_at(tweet.get("created_at"))]
+
+    location = tweet_location(tweet)
+    tweet_data += [tweet.get("lang"),
+                   location[0] if location else None,
+                   location[1] if location else None,
+                   tweet_country(tweet)]
+    return tweet_data
+
+
+def _user_row(user, user_group):
+    """ returns the values for a row in the users table
+    """
+    # get the fields out of the JSON object, inserting None, if the key doesn't exist
+    index_names = ["id_str", "name", "screen_name", "created_at", "description",
+                   "followers_count", "friends_count", "statuses_count"]
+    user_data = [user[i] if i in user else None for i in index_names]
+
+    # add the user_group separately,
+    user_data += [user_group]
+    return user_data
+
+
+def _edge_rows(tweet):
+    """ returns the rows for the tweet_edges table, linking the author to each user
+        the tweet mentions, replies to or retweets
+    """
+    user = tweet.get("user") or {}
+    source_id = user.get("id_str")
+    if source_id is None or "id_str" not in tweet:
+        return []
+
+    targets = [(mention.get("id_str"), "mention")
+               for mention in (tweet.get("entities") or {}).get("user_mentions") or []]
+    targets.append((tweet.get("in_reply_to_user_id_str"), "reply"))
+    if tweet.get("retweeted_status"):
+        targets.append(((tweet["retweeted_status"].get("user") or {}).get("id_str"), "retweet"))
+    return [(tweet["id_str"], source_id, target_id, edge_type)
+            for target_id, edge_type in targets if target_id is not None]
+
+
+def insert_tweet(db_con, tweet, tweet_group):
+    """ Inserts the tweet data (passed as a json object) into the database, adding
+        "tweet_group" field. Returns True if the insertion was successful.
+
+        If another tweet with the same id and tweet_group is given, it will not be
+        inserted.
+    """
     try:
-        db_con.execute(_insert_tweet_sql, tweet_data)
+        last_rowid = _get_last_tweet_rowid(db_con)
+        db_con.execute(_insert_tweet_sql, _tweet_row(tweet, tweet_group))
+        db_con.executemany(_insert_edges_sql, _edge_rows(tweet))
+        _add_to_rollups(db_con, last_rowid)
         db_con.commit()
         return True
     except sqlite3.IntegrityError:
@@ -159,28 +709,68 @@ def insert_user(db_con, user, user_group):
         If another tweet with the same id and tweet_group is given, it will not be
         inserted.
     """
-    # get the fields out of the JSON object, inserting None, if the key doesn't exist
-    index_names = ["id_str", "name", "screen_name", "created_at", "description",
-                   "followers_count", "friends_count", "statuses_count"]
-    user_data = [user[i] if i in user else None for i in index_names]
-
-    # add the user_group separately,
-    user_data += [user_group]
     try:
-        db_con.execute(_insert_user_sql, user_data)
+        db_con.execute(_insert_user_sql, _user_row(user, user_group))
         db_con.commit()
         return True
     except sqlite3.IntegrityError:
         return False
 
 
-def get_tweets(db_con, group=None):
-    """ returns a dict of all the tweets, filtering for the tweet_group if given
+def insert_tweets(db_con, tweets, tweet_group, commit=True):
+    """ Inserts a batch of tweets in a single transaction. Tweets which already
+        exist for the tweet_group are skipped. If commit is False the transaction
+        is left open, so the caller can commit it with other changes
+
+        returns the number of tweets inserted
+    """
+    with metrics.timer("insert_batch_seconds", table="tweets"):
+        last_rowid = _get_last_tweet_rowid(db_con)
+        cursor = db_con.executemany(_insert_tweets_sql, [_tweet_row(tweet, tweet_group) for tweet in tweets])
+        db_con.executemany(_insert_edges_sql, [row for tweet in tweets for row in _edge_rows(tweet)])
+        _add_to_rollups(db_con, last_rowid)
+        if commit:
+            db_con.commit()
+    n_inserted = max(cursor.rowcount, 0)
+
+    metrics.increment("rows_inserted_total", n_inserted, table="tweets")
+    metrics.increment("rows_deduped_total", len(tweets) - n_inserted, table="tweets")
+    return n_inserted
+
+
+def insert_users(db_con, users, user_group, commit=True):
+    """ Inserts a batch of users in a single transaction. Users which already
+        exist for the user_group are skipped. If commit is False the transaction
+        is left open, so the caller can commit it with other changes
+
+        returns the number of users inserted
     """
+    changes_before = db_con.total_changes
+    with metrics.timer("insert_batch_seconds", table="users"):
+        db_con.executemany(_insert_users_sql, [_user_row(user, user_group) for user in users])
+        if commit:
+            db_con.commit()
+    n_inserted = db_con.total_changes - changes_before
+
+    metrics.increment("rows_inserted_total", n_inserted, table="users")
+    metrics.increment("rows_deduped_total", len(users) - n_inserted, table="users")
+    return n_inserted
+
+
+def get_tweets(db_con, group=None, dedupe=False):
+    """ returns a dict of all the tweets, filtering for the tweet_group if given.
+        If dedupe is True, only one tweet from each cluster of near duplicates found
+        by cluster-tweets is returned for each group
+    """
+    if dedupe:
+        all_tweets_sql, group_tweets_sql = _get_all_deduped_tweets_sql, _get_group_deduped_tweets_sql
+    else:
+        all_tweets_sql, group_tweets_sql = _get_all_tweets_sql, _get_group_tweets_sql
+
     if group is None:
-        cursor = db_con.execute(_get_all_tweets_sql)
+        cursor = db_con.execute(all_tweets_sql)
     else:
-        cursor = db_con.execute(_get_group_tweets_sql, group)
+        cursor = db_con.execute(group_tweets_sql, (group,))
     tweets = cursor.fetchall()
 
     return [dict((cursor.description[i][0], value) for i, value in enumerate(row))
@@ -193,7 +783,7 @@ def get_users(db_con, group=None):
     if group is None:
         cursor = db_con.execute(_get_all_users_sql)
     else:
-        cursor = db_con.execute(_get_group_users_sql, group)
+        cursor = db_con.execute(_get_group_users_sql, (group,))
     users = cursor.fetchall()
 
     return [dict((cursor.description[i][0], value) for i, value in enumerate(row))
@@ -214,3 +804,330 @@ def get_user_groups(db_con):
     cursor = db_con.execute(_get_all_user_groups_sql)
     groups = cursor.fetchall()
     return [g[0] for g in groups]
+
+
+def get_completed_job_units(db_con, job_id):
+    """ returns the set of (term, group) units of work completed for the job
+    """
+    cursor = db_con.execute(_get_completed_job_units_sql, (job_id,))
+    return set(cursor.fetchall())
+
+
+def complete_job_unit(db_con, job_id, term, group):
+    """ records that the search for term and group has finished, so it can be
+        skipped if the job is resumed. Any pending changes are committed with it.
+    """
+    db_con.execute(_complete_job_unit_sql, (job_id, term, group))
+    db_con.commit()
+
+
+def reset_job(db_con, job_id):
+    """ clears the progress recorded for a job, so it will start from the beginning
+    """
+    db_con.execute(_reset_job_sql, (job_id,))
+    db_con.commit()
+
+
+def _rows_to_dicts(cursor):
+    return [dict((cursor.description[i][0], value) for i, value in enumerate(row))
+            for row in cursor.fetchall()]
+
+
+def enqueue_search(db_con, term, group, endpoint="search/tweets", priority=0,
+                   next_due=0, expires_at=None, revisit_interval=None, filters=None):
+    """ adds a search to the queue. expires_at is the time when the search is removed,
+        or None to keep it. If the search is already queued, it keeps the higher
+        priority and later expiry. revisit_interval is the initial time between
+        searches, which the scheduler adapts to the number of tweets found. filters
+        is the text of the filters for the tweets stored, see filters.parse_filters
+
+        returns True if the search wasn't already queued
+    """
+    changes_before = db_con.total_changes
+    db_con.execute(_insert_search_sql, (term, group, endpoint, priority, next_due,
+                                        expires_at, revisit_interval, filters))
+    added = db_con.total_changes > changes_before
+    if not added:
+        db_con.execute(_requeue_search_sql, (priority, expires_at, expires_at, filters, term, group, endpoint))
+    db_con.commit()
+    return added
+
+
+def get_due_searches(db_con, now, limit):
+    """ returns up to limit searches which are due, as dicts, highest priority first.
+        Searches with the same priority are ordered by the number of new tweets they
+        are expected to find, with searches which haven't run yet first
+    """
+    cursor = db_con.execute(_get_due_searches_sql, (now, now, now, limit))
+    return _rows_to_dicts(cursor)
+
+
+def update_search(db_con, search, next_due, since_id, revisit_interval=None,
+                  last_run=None, tweet_rate=None):
+    """ sets when the search is next due, and the id of the newest tweet found so far.
+        tweet_rate is the estimated number of new tweets per second for the search
+    """
+    db_con.execute(_update_search_sql, (next_due, since_id, revisit_interval, last_run, tweet_rate,
+                                        search["term"], search["job_group"], search["endpoint"]))
+    db_con.commit()
+
+
+def get_next_due(db_con, now):
+    """ returns the time the next search is due, or None if the queue is empty
+    """
+    return db_con.execute(_get_next_due_sql, (now,)).fetchone()[0]
+
+
+def delete_expired_searches(db_con, now):
+    """ removes expired searches from the queue, returning the number removed
+    """
+    cursor = db_con.execute(_delete_expired_searches_sql, (now,))
+    db_con.commit()
+    return cursor.rowcount
+
+
+def update_trends(db_con, woeid, names, now, expiry):
+    """ records the trends currently seen for the woeid. A trend is active if it has
+        been seen in the last expiry seconds
+
+        returns the names which weren't active
+    """
+    cursor = db_con.execute(_get_active_trends_sql, (woeid, now - expiry))
+    active = set(row[0] for row in cursor.fetchall())
+
+    new_names = []
+    for name in names:
+        if name in active:
+            db_con.execute(_update_trend_sql, (now, woeid, name))
+        elif name not in new_names:
+            db_con.execute(_insert_trend_sql, (woeid, name, now, now))
+            new_names.append(name)
+    db_con.commit()
+    return new_names
+
+
+def get_users_to_look_up(db_con, looked_up_before):
+    """ returns the ids of tweet authors missing from the users table, and of users
+        last looked up before the given time
+    """
+    cursor = db_con.execute(_get_users_to_look_up_sql, (looked_up_before,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def store_user_lookups(db_con, user_ids, users, user_group, now):
+    """ stores the profiles returned by a lookup of the user_ids. Users already in the
+        users table have every row updated, and new users are added to the user_group.
+        Every id is recorded as looked up, including ones with no profile returned
+
+        returns the number of users added
+    """
+    new_users = []
+    with metrics.timer("insert_batch_seconds", table="users"):
+        for user in users:
+            row = _user_row(user, user_group)
+            cursor = db_con.execute(_update_user_profile_sql, row[1:8] + [row[0]])
+            if cursor.rowcount == 0:
+                new_users.append(row)
+        db_con.executemany(_insert_users_sql, new_users)
+        db_con.executemany(_record_user_lookup_sql, [(user_id, now) for user_id in user_ids])
+        db_con.commit()
+
+    metrics.increment("rows_inserted_total", len(new_users), table="users")
+    return len(new_users)
+
+
+def get_screen_names(db_con):
+    """ returns a dict mapping user ids to screen names
+    """
+    cursor = db_con.execute(_get_screen_names_sql)
+    return dict(cursor.fetchall())
+
+
+def _get_last_tweet_rowid(db_con):
+    return db_con.execute(_get_last_tweet_rowid_sql).fetchone()[0]
+
+
+def _add_to_rollups(db_con, last_rowid):
+    """ adds the tweets inserted after last_rowid to the rollups, as part of the
+        transaction which inserted them. Only tweets which were actually inserted
+        are counted, and the rollups are updated once for each batch
+    """
+    # the new tweets are counted once at the finest resolution, and those buckets
+    # are added up for the coarser resolutions, which are multiples of it
+    finest = rollup_resolutions[0][1]
+    new_buckets = db_con.execute(_get_new_rollups_sql, (finest, finest, last_rowid, finest)).fetchall()
+    for name, seconds in rollup_resolutions:
+        buckets = {}
+        for group, bucket, n_tweets, n_retweets, n_favourites in new_buckets:
+            totals = buckets.setdefault((group, bucket // seconds * seconds), [0, 0, 0])
+            totals[0] += n_tweets
+            totals[1] += n_retweets
+            totals[2] += n_favourites
+        db_con.executemany(_create_rollup_sql, [(name, group, bucket) for group, bucket in buckets])
+        db_con.executemany(_add_to_rollup_sql, [(n_tweets, n_retweets, n_favourites, name, group, bucket)
+                                                for (group, bucket), (n_tweets, n_retweets, n_favourites)
+                                                in buckets.items()])
+
+
+def rebuild_rollups(db_con):
+    """ sets created_ts for tweets stored before it was added, and recalculates the
+        rollups from every tweet. Rollups are kept up to date as tweets are inserted,
+        so this is only needed for databases made by older versions
+
+        returns the number of tweets given a created_ts
+    """
+    db_con.create_function("parse_created_at", 1, parse_created_at)
+    cursor = db_con.execute(_backfill_created_ts_sql)
+    n_updated = cursor.rowcount
+
+    db_con.execute(_delete_rollups_sql)
+    for name, seconds in rollup_resolutions:
+        db_con.execute(_rebuild_rollups_sql, (name, seconds, seconds, seconds))
+    db_con.commit()
+    return n_updated
+
+
+def get_rollups(db_con, resolution, start, end, group=None):
+    """ returns the rollups at the resolution with buckets from start up to end, given
+        in seconds since the epoch, as a list of dicts ordered by group and bucket
+    """
+    if resolution not in dict(rollup_resolutions):
+        raise ValueError("Resolution must be one of {0}".format(
+            ", ".join(name for name, _ in rollup_resolutions)))
+    if group is None:
+        cursor = db_con.execute(_get_rollups_sql, (resolution, start, end))
+    else:
+        cursor = db_con.execute(_get_group_rollups_sql, (resolution, group, start, end))
+    return _rows_to_dicts(cursor)
+
+
+def get_last_clustered_rowid(db_con):
+    """ returns the rowid of the last tweet clustered, or 0 if none have been
+    """
+    return db_con.execute(_get_last_clustered_rowid_sql).fetchone()[0]
+
+
+def get_tweets_to_cluster(db_con, after_rowid, limit):
+    """ returns up to limit tweets after after_rowid, as (rowid, id_str, tweet_text) tuples
+    """
+    return db_con.execute(_get_tweets_to_cluster_sql, (after_rowid, limit)).fetchall()
+
+
+def complete_clustering(db_con, last_rowid):
+    """ records that the tweets up to last_rowid have been clustered, and commits
+        the clusters stored since the last call
+    """
+    db_con.execute(_set_last_clustered_rowid_sql, (last_rowid,))
+    db_con.commit()
+
+
+def is_clustered(db_con, id_str):
+    return db_con.execute(_is_clustered_sql, (id_str,)).fetchone() is not None
+
+
+def get_cluster_candidates(db_con, band_keys):
+    """ returns (cluster_id, signature) for each cluster with a tweet in one of the bands
+    """
+    cursor = db_con.execute(_get_cluster_candidates_sql.format(",".join("?" * len(band_keys))), band_keys)
+    return cursor.fetchall()
+
+
+def store_tweet_cluster(db_con, id_str, cluster_id, signature, band_keys):
+    """ records the tweet's cluster, and adds the cluster to the LSH bucket of each of
+        its bands. The changes are committed by complete_clustering
+    """
+    if signature is not None:
+        signature = sqlite3.Binary(signature)
+    db_con.execute(_insert_tweet_cluster_sql, (id_str, cluster_id, signature))
+    db_con.executemany(_insert_lsh_bucket_sql, [(key, cluster_id) for key in band_keys])
+
+
+def update_graph_nodes(db_con):
+    """ numbers the users in new edges, so they can be stored in integer arrays
+
+        returns the number of users in the graph
+    """
+    db_con.execute(_add_graph_nodes_sql)
+    db_con.commit()
+    return db_con.execute(_get_node_count_sql).fetchone()[0]
+
+
+def get_graph_edges(db_con, edge_types):
+    """ returns a cursor over (source index, target index, number of edges) for the
+        edges of the given types, ordered by source then target
+    """
+    return db_con.execute(_get_graph_edges_sql.format(",".join("?" * len(edge_types))), edge_types)
+
+
+def get_graph_node_ids(db_con):
+    """ returns a dict mapping each node index in the graph arrays to a user id
+    """
+    return dict(db_con.execute(_get_graph_node_ids_sql).fetchall())
+
+
+def set_retention_cutoffs(db_con, cutoffs):
+    """ sets the time before which the tweets in each group expire, given as a dict
+        mapping group to cutoff. The cutoffs are kept in a temporary table for this
+        connection
+    """
+    db_con.execute(_create_retention_cutoffs_sql)
+    db_con.execute(_clear_retention_cutoffs_sql)
+    db_con.executemany(_insert_retention_cutoff_sql, list(cutoffs.items()))
+    db_con.commit()
+
+
+def get_expired_tweets(db_con, after_rowid, limit):
+    """ returns up to limit tweets older than their group's retention cutoff with a
+        rowid after after_rowid, as dicts in rowid order, including the rowid
+    """
+    return _rows_to_dicts(db_con.execute(_get_expired_tweets_sql, (after_rowid, limit)))
+
+
+def delete_tweets(db_con, tweets):
+    """ deletes tweets returned by get_expired_tweets in a single transaction, along with
+        their edges and clusters if the tweet isn't stored in another group. The
+        rollups aren't changed, so they still count the deleted tweets. If the newest
+        tweets are deleted, the last rowid clustered is moved back to the newest tweet left
+    """
+    db_con.executemany(_delete_tweet_sql, [(tweet["rowid"],) for tweet in tweets])
+    id_strs = set(tweet["id_str"] for tweet in tweets)
+    db_con.executemany(_delete_orphan_edges_sql, [(id_str, id_str) for id_str in id_strs])
+    db_con.executemany(_delete_orphan_cluster_sql, [(id_str, id_str) for id_str in id_strs])
+    last_rowid = _get_last_tweet_rowid(db_con)
+    db_con.execute(_lower_last_clustered_rowid_sql, (last_rowid, last_rowid))
+    db_con.commit()
+
+
+def incremental_vacuum(db_con, pages):
+    """ frees up to pages unused pages at the end of the database file, if the database
+        was made with auto_vacuum=INCREMENTAL
+
+        returns the number of pages still free
+    """
+    # every page freed is a step of the pragma, so its results must be read
+    db_con.execute("PRAGMA incremental_vacuum({0:d})".format(pages)).fetchall()
+    db_con.commit()
+    return db_con.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def get_auto_vacuum(db_con):
+    """ returns the auto_vacuum mode of the database, 0 for none, 1 for full and 2 for incremental
+    """
+    return db_con.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def vacuum(db_con, incremental=True):
+    """ rebuilds the database file, removing all the unused space. If incremental is True
+        the database is switched to auto_vacuum=INCREMENTAL
+    """
+    db_con.commit()
+    if incremental:
+        db_con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    db_con.execute("VACUUM")
+
+
+def analyze(db_con):
+    """ updates the statistics the query planner uses to choose indexes
+    """
+    db_con.execute("ANALYZE")
+    db_con.commit()
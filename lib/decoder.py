@@ -0,0 +1,144 @@
+"""
+decoder.py:
+    Decodes JSON responses from the Twitter API with the fastest JSON library
+    installed (orjson, simdjson or ujson), falling back to the standard library
+"""
+import json
+
+from data import twitter_settings
+
+# libraries tried in order when the decoder is "auto"
+_preferred_decoders = ["orjson", "simdjson", "ujson", "json"]
+
+# the fields of tweet and user objects which are stored in the database
+tweet_fields = ["id_str", "text", "created_at", "favorite_count", "retweet_count", "user",
+                "in_reply_to_user_id_str", "entities", "retweeted_status",
+                "lang", "coordinates", "place"]
+place_fields = ["country_code", "bounding_box"]
+user_fields = ["id_str", "name", "screen_name", "created_at", "description",
+               "followers_count", "friends_count", "statuses_count"]
+
+# the decoder in use, set by set_decoder
+_decoder = {"name": None, "loads": None, "parser": None}
+
+
+def _import_decoder(name):
+    """ returns the loads function for the named library, or None if it isn't installed
+    """
+    if name == "json":
+        return json.loads
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+    return module.loads
+
+
+def set_decoder(name="auto"):
+    """ selects the JSON library used to decode responses. "auto" uses the fastest one installed
+    """
+    if name == "auto":
+        names = _preferred_decoders
+    elif name in _preferred_decoders:
+        names = [name]
+    else:
+        raise ValueError("Unknown JSON decoder {0}, must be auto or one of {1}".format(
+            name, ", ".join(_preferred_decoders)))
+
+    for decoder_name in names:
+        loads = _import_decoder(decoder_name)
+        if loads is not None:
+            _decoder["name"] = decoder_name
+            _decoder["loads"] = loads
+            _decoder["parser"] = None
+            return decoder_name
+
+    raise ImportError("JSON decoder {0} is not installed".format(name))
+
+
+def decoder_name():
+    """ returns the name of the JSON library in use
+    """
+    return _decoder["name"]
+
+
+def available_decoders():
+    """ returns the names of the JSON libraries which are installed
+    """
+    return [name for name in _preferred_decoders if _import_decoder(name) is not None]
+
+
+def loads(data):
+    """ decodes a JSON response, given as bytes or a string
+    """
+    return _decoder["loads"](data)
+
+
+def _project(obj, fields):
+    # values which are missing or null are left out, as insert_tweet and insert_user
+    # treat them the same way
+    projected = {}
+    for field in fields:
+        value = obj.get(field)
+        if value is not None:
+            projected[field] = value
+    return projected
+
+
+def _copy(value):
+    # simdjson objects and arrays are only valid until the parser is used again
+    if hasattr(value, "as_dict"):
+        return value.as_dict()
+    if hasattr(value, "as_list"):
+        return value.as_list()
+    return value
+
+
+def _user_id(obj):
+    # keeps only the id of the user, for the mention, reply and retweet graph
+    return {"id_str": obj.get("id_str")}
+
+
+def _project_tweet(tweet):
+    projected = _project(tweet, tweet_fields)
+    if "user" in projected:
+        projected["user"] = _project(projected["user"], user_fields)
+    if "entities" in projected:
+        projected["entities"] = {"user_mentions": [_user_id(mention) for mention
+                                                   in projected["entities"].get("user_mentions") or []]}
+    if "retweeted_status" in projected:
+        projected["retweeted_status"] = {"user": _user_id(projected["retweeted_status"].get("user") or {})}
+    if "coordinates" in projected:
+        projected["coordinates"] = _copy(projected["coordinates"])
+    if "place" in projected:
+        projected["place"] = dict((field, _copy(value)) for field, value
+                                  in _project(projected["place"], place_fields).items())
+    return projected
+
+
+def loads_statuses(data):
+    """ decodes a response containing tweets, either a list of tweets or a search
+        result with a "statuses" list, keeping only the fields which are stored.
+
+        With simdjson the response is parsed lazily, so the other fields are never
+        converted to Python objects. Other libraries decode the whole response first.
+    """
+    if _decoder["name"] == "simdjson":
+        if _decoder["parser"] is None:
+            import simdjson
+            _decoder["parser"] = simdjson.Parser()
+        # the parsed document is only valid until the parser is used again,
+        # so everything needed is copied out here
+        document = _decoder["parser"].parse(data)
+    else:
+        document = loads(data)
+
+    if isinstance(document, list) or not hasattr(document, "get"):
+        return [_project_tweet(tweet) for tweet in document]
+    if document.get("statuses") is None:
+        # probably an error response, which is returned in full
+        return document if isinstance(document, dict) else document.as_dict()
+    return {"statuses": [_project_tweet(tweet) for tweet in document["statuses"]]}
+
+
+set_decoder(twitter_settings.json_decoder)
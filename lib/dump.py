@@ -0,0 +1,122 @@
+"""
+dump.py:
+    Writes tweets and users from the database to CSV or JSON files
+"""
+import calendar
+import csv
+import json
+import os
+import time
+
+from lib import database as db
+
+
+def _csv_value(value):
+    # the csv module writes byte strings, so unicode text is encoded
+    if value is None:
+        return ""
+    if hasattr(value, "encode") and not isinstance(value, str):
+        return value.encode("utf-8")
+    return value
+
+
+def dump_tweets(db_con, group=None, filename=None, report_format="csv", dedupe=False):
+    """ writes the tweets to the reports folder, with the screen name of each author
+        if their profile is in the users table (see enrich-users). If dedupe is True,
+        only one tweet from each cluster of near duplicates is written.
+        format must be one of csv or json
+    """
+    tweets, header = db.get_tweets(db_con, group, dedupe)
+    screen_names = db.get_screen_names(db_con)
+    for tweet in tweets:
+        tweet["screen_name"] = screen_names.get(tweet["user_id_str"])
+
+    # set a default filename in the reports directory if none is provided
+    if filename is None:
+        filename = os.path.join("reports", "tweets.{0}".format(report_format))
+
+    if report_format == "json":
+        with open(filename, "w") as f:
+            f.write(json.dumps(tweets))
+
+    elif report_format == "csv":
+        with open(filename, "wb") as f:
+            writer = csv.writer(f, delimiter=",")
+
+            writer.writerow(["screen_name"] + header)
+            for tweet in tweets:
+                writer.writerow([_csv_value(tweet[k]) for k in ["screen_name"] + header])
+    else:
+        raise Exception("Format must be csv or json")
+
+
+def dump_users(db_con, group=None, filename=None, report_format="csv"):
+    """ writes the users to the reports folder.
+        format must be one of csv or json
+    """
+    users, header = db.get_users(db_con, group)
+
+    # set a default filename in the reports directory if none is provided
+    if filename is None:
+        filename = os.path.join("reports", "users.{0}".format(report_format))
+
+    if report_format == "json":
+        with open(filename, "w") as f:
+            f.write(json.dumps(users))
+
+    elif report_format == "csv":
+        with open(filename, "wb") as f:
+            writer = csv.writer(f, delimiter=",")
+
+            writer.writerow(header)
+            for user in users:
+                writer.writerow([_csv_value(user[k]) for k in header])
+    else:
+        raise Exception("Format must be csv or json")
+
+
+def parse_time(value):
+    """ converts a UTC time given as YYYY-MM-DD, YYYY-MM-DD HH:MM or YYYY-MM-DD HH:MM:SS
+        to seconds since the epoch
+    """
+    for time_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+        try:
+            return calendar.timegm(time.strptime(value, time_format))
+        except ValueError:
+            pass
+    raise ValueError("Time must be formatted as YYYY-MM-DD, YYYY-MM-DD HH:MM or YYYY-MM-DD HH:MM:SS")
+
+
+def dump_timeseries(db_con, resolution="hour", start=0, end=2 ** 40, group=None, filename=None,
+                    report_format="csv"):
+    """ writes the number of tweets, retweets and favourites in each bucket of the
+        resolution from start up to end, in seconds since the epoch, for each group.
+        format must be one of csv or json. If filename is "-" the rows are printed
+    """
+    rollups = db.get_rollups(db_con, resolution, start, end, group)
+    header = ["tweet_group", "time", "tweet_count", "retweet_count", "favourite_count"]
+    for rollup in rollups:
+        rollup["time"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(rollup["bucket"]))
+
+    if filename == "-":
+        for rollup in rollups:
+            print(",".join(str(rollup[k]) for k in header))
+        return
+
+    # set a default filename in the reports directory if none is provided
+    if filename is None:
+        filename = os.path.join("reports", "timeseries_{0}.{1}".format(resolution, report_format))
+
+    if report_format == "json":
+        with open(filename, "w") as f:
+            f.write(json.dumps([dict((k, rollup[k]) for k in header) for rollup in rollups]))
+
+    elif report_format == "csv":
+        with open(filename, "wb") as f:
+            writer = csv.writer(f, delimiter=",")
+
+            writer.writerow(header)
+            for rollup in rollups:
+                writer.writerow([_csv_value(rollup[k]) for k in header])
+    else:
+        raise Exception("Format must be csv or json")
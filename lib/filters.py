@@ -0,0 +1,106 @@
+"""
+filters.py:
+    Filters for the tweets stored by a search, given as the optional third field of
+    a line in a search file, e.g.
+
+        #fun:good_times:lang=en,fr;min_followers=100;bbox=-10.5,49.8,1.8,60.9
+
+    Tweets which don't pass every filter are dropped before they are written to the
+    database. The filters are
+        lang           the tweet's language is one of the comma separated codes
+        country        the tweet's place is in one of the comma separated country codes
+        bbox           the tweet's location is in the box west,south,east,north, in degrees
+        min_followers  the author has at least this many followers
+        min_retweets   the tweet has been retweeted at least this many times
+"""
+from lib import database as db
+from lib import metrics
+
+filter_names = ["lang", "country", "bbox", "min_followers", "min_retweets"]
+
+
+def _codes(value):
+    return [code.strip() for code in value.split(",") if code.strip()]
+
+
+def _bbox(value):
+    bbox = [float(x) for x in value.split(",")]
+    if len(bbox) != 4:
+        raise ValueError("bbox must be given as west,south,east,north")
+    return bbox
+
+
+_parsers = {"lang": _codes,
+            "country": lambda value: [code.upper() for code in _codes(value)],
+            "bbox": _bbox,
+            "min_followers": int,
+            "min_retweets": int}
+
+
+def parse_filters(text):
+    """ parses filters written as name=value pairs separated by semicolons
+
+        returns a dict mapping each filter name to its value
+    """
+    filters = {}
+    for item in (text or "").split(";"):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in _parsers:
+            raise ValueError("Unknown filter {0}, filters must be one of {1}".format(
+                name, ", ".join(filter_names)))
+        try:
+            filters[name] = _parsers[name](value.strip())
+        except ValueError:
+            raise ValueError("Invalid value for the {0} filter: {1}".format(name, value))
+    return filters
+
+
+def format_filters(filters):
+    """ returns the text parse_filters reads the filters from, or None if there are none
+    """
+    items = []
+    for name in filter_names:
+        if name in filters:
+            value = filters[name]
+            if isinstance(value, list):
+                value = ",".join(str(x) for x in value)
+            items.append("{0}={1}".format(name, value))
+    return ";".join(items) or None
+
+
+def matches(tweet, filters):
+    """ returns True if the tweet passes every filter. Tweets without the field a
+        filter needs don't pass it
+    """
+    if "lang" in filters and tweet.get("lang") not in filters["lang"]:
+        return False
+    if "country" in filters and db.tweet_country(tweet) not in filters["country"]:
+        return False
+    if "bbox" in filters:
+        location = db.tweet_location(tweet)
+        if location is None:
+            return False
+        west, south, east, north = filters["bbox"]
+        if not (west <= location[0] <= east and south <= location[1] <= north):
+            return False
+    if "min_followers" in filters:
+        followers_count = (tweet.get("user") or {}).get("followers_count")
+        if followers_count is None or followers_count < filters["min_followers"]:
+            return False
+    if "min_retweets" in filters and (tweet.get("retweet_count") or 0) < filters["min_retweets"]:
+        return False
+    return True
+
+
+def filter_tweets(tweets, filters):
+    """ returns the tweets which pass the filters, counting the rest in the
+        tweets_filtered_total metric
+    """
+    if not filters:
+        return tweets
+    kept = [tweet for tweet in tweets if matches(tweet, filters)]
+    metrics.increment("tweets_filtered_total", len(tweets) - len(kept))
+    return kept
@@ -0,0 +1,128 @@
+"""
+graph.py:
+    Builds the graph of users mentioning, replying to and retweeting each other from
+    the edges stored with each tweet, and calculates the degree and PageRank of each
+    user. The graph is stored in compressed sparse row (CSR) form as .npy files,
+    which can be memory mapped, with users numbered by the graph_nodes table.
+
+    numpy is needed for the graph commands, but not for storing the edges
+"""
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lib import database as db
+
+edge_types = ["mention", "reply", "retweet"]
+
+_array_names = ["indptr", "indices", "weights"]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The graph commands need numpy, install it with: pip install numpy")
+
+
+class Graph(object):
+    """ a weighted directed graph in CSR form. The edges from node i are
+        indices[indptr[i]:indptr[i + 1]], with weights giving the number of
+        tweets linking the two users
+    """
+    def __init__(self, indptr, indices, weights):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.n_nodes = len(indptr) - 1
+
+    def sources(self):
+        """ returns the source node of each edge
+        """
+        return np.repeat(np.arange(self.n_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def save(self, dir_path):
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        for name in _array_names:
+            np.save(os.path.join(dir_path, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, dir_path, mmap=True):
+        """ loads a graph saved by build. The arrays are memory mapped unless mmap is False
+        """
+        _require_numpy()
+        mmap_mode = "r" if mmap else None
+        return cls(*[np.load(os.path.join(dir_path, name + ".npy"), mmap_mode=mmap_mode)
+                     for name in _array_names])
+
+
+def build(db_con, dir_path=None, types=None):
+    """ builds the graph from the edges of the given types, saving it to dir_path if given
+
+        returns the graph
+    """
+    _require_numpy()
+    if types is None:
+        types = edge_types
+    for edge_type in types:
+        if edge_type not in edge_types:
+            raise ValueError("Edge type must be one of {0}".format(", ".join(edge_types)))
+
+    n_nodes = db.update_graph_nodes(db_con)
+    edges = np.array(db.get_graph_edges(db_con, types).fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(edges[:, 0], minlength=n_nodes))
+    graph = Graph(indptr, edges[:, 1].astype(np.int32), edges[:, 2].astype(np.float32))
+
+    if dir_path is not None:
+        graph.save(dir_path)
+    return graph
+
+
+def degree(graph):
+    """ returns the weighted in and out degree of each node
+    """
+    _require_numpy()
+    in_degree = np.bincount(graph.indices, weights=graph.weights, minlength=graph.n_nodes)
+    out_degree = np.bincount(graph.sources(), weights=graph.weights, minlength=graph.n_nodes)
+    return in_degree, out_degree
+
+
+def pagerank(graph, damping=0.85, tolerance=1e-8, max_iterations=100):
+    """ returns the PageRank of each node, weighting each edge by the number of tweets.
+        Nodes with no edges out spread their rank evenly over every node
+    """
+    _require_numpy()
+    n_nodes = graph.n_nodes
+    if n_nodes == 0:
+        return np.zeros(0)
+
+    sources = graph.sources()
+    out_weight = np.bincount(sources, weights=graph.weights, minlength=n_nodes)
+    dangling = out_weight == 0
+    # the fraction of each node's rank passed along each of its edges
+    edge_share = graph.weights / np.where(dangling, 1, out_weight)[sources]
+
+    rank = np.full(n_nodes, 1.0 / n_nodes)
+    for _ in range(max_iterations):
+        spread = (1 - damping + damping * rank[dangling].sum()) / n_nodes
+        new_rank = spread + damping * np.bincount(graph.indices, weights=rank[sources] * edge_share,
+                                                  minlength=n_nodes)
+        converged = np.abs(new_rank - rank).sum() < tolerance
+        rank = new_rank
+        if converged:
+            break
+    return rank
+
+
+def top_users(db_con, scores, n):
+    """ returns (id_str, screen_name, score) for the n users with the highest scores.
+        Screen names are None for users who aren't in the users table
+    """
+    node_ids = db.get_graph_node_ids(db_con)
+    screen_names = db.get_screen_names(db_con)
+    top = np.argsort(-scores, kind="stable")[:n]
+    return [(node_ids[i], screen_names.get(node_ids[i]), float(scores[i])) for i in top]
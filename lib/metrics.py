@@ -0,0 +1,167 @@
+"""
+metrics.py:
+    Counters and timing histograms for measuring where time is spent while
+    collecting tweets. Metrics can be written as a Prometheus text file or
+    logged as a single line of JSON
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+# upper bounds of the histogram buckets, in seconds
+histogram_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# prefix added to all metric names in the Prometheus output
+_prefix = "twerpy_"
+
+# counters and histograms are keyed by (name, ((label, value), ...))
+_counters = {}
+_histograms = {}
+
+# settings for periodic output, set by configure
+_settings = {"prometheus_filename": None,
+             "log_json": False,
+             "interval": 60,
+             "last_flush_time": time.time()}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def configure(prometheus_filename=None, log_json=False, interval=60):
+    """ sets up the output written by flush. If prometheus_filename is given the
+        Prometheus text file is rewritten, and if log_json is True the metrics are
+        logged as a line of JSON, at most once every interval seconds
+    """
+    _settings["prometheus_filename"] = prometheus_filename
+    _settings["log_json"] = log_json
+    _settings["interval"] = interval
+    _settings["last_flush_time"] = time.time()
+
+
+def reset():
+    """ clears all the metrics
+    """
+    _counters.clear()
+    _histograms.clear()
+
+
+def increment(name, value=1, **labels):
+    """ adds value to the counter with the given name and labels
+    """
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """ records a duration in the histogram with the given name and labels
+    """
+    key = _key(name, labels)
+    if key not in _histograms:
+        _histograms[key] = {"buckets": [0] * len(histogram_buckets), "sum": 0.0, "count": 0}
+    histogram = _histograms[key]
+
+    for i, upper_bound in enumerate(histogram_buckets):
+        if seconds <= upper_bound:
+            histogram["buckets"][i] += 1
+            break
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    """ times the enclosed block, recording the duration in a histogram
+    """
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        observe(name, time.time() - start_time, **labels)
+
+
+def get_counter(name, **labels):
+    """ returns the value of a counter, or 0 if it hasn't been incremented
+    """
+    return _counters.get(_key(name, labels), 0)
+
+
+def get_histogram(name, **labels):
+    """ returns a dict with the non-cumulative bucket counts, sum and count of a
+        histogram, or None if nothing has been observed
+    """
+    return _histograms.get(_key(name, labels))
+
+
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels) + "}"
+
+
+def to_prometheus():
+    """ returns the metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for name in sorted(set(k[0] for k in _counters)):
+        lines.append("# TYPE {0}{1} counter".format(_prefix, name))
+        for (key_name, labels), value in sorted(_counters.items()):
+            if key_name == name:
+                lines.append("{0}{1}{2} {3}".format(_prefix, name, _format_labels(labels), value))
+
+    for name in sorted(set(k[0] for k in _histograms)):
+        lines.append("# TYPE {0}{1} histogram".format(_prefix, name))
+        for (key_name, labels), histogram in sorted(_histograms.items()):
+            if key_name != name:
+                continue
+            cumulative = 0
+            for upper_bound, count in zip(histogram_buckets, histogram["buckets"]):
+                cumulative += count
+                lines.append("{0}{1}_bucket{2} {3}".format(
+                    _prefix, name, _format_labels(labels, [("le", upper_bound)]), cumulative))
+            lines.append("{0}{1}_bucket{2} {3}".format(
+                _prefix, name, _format_labels(labels, [("le", "+Inf")]), histogram["count"]))
+            lines.append("{0}{1}_sum{2} {3}".format(_prefix, name, _format_labels(labels), histogram["sum"]))
+            lines.append("{0}{1}_count{2} {3}".format(_prefix, name, _format_labels(labels), histogram["count"]))
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(filename):
+    """ writes the metrics to a Prometheus text file. The file is replaced in a single step
+        so a collector never reads a partly written file
+    """
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "w") as f:
+        f.write(to_prometheus())
+    os.rename(tmp_filename, filename)
+
+
+def to_json():
+    """ returns the metrics as a JSON string, with label values joined onto the metric name
+    """
+    def _name(name, labels):
+        return ".".join([name] + [str(v) for _, v in labels])
+
+    data = {"counters": dict((_name(name, labels), value)
+                             for (name, labels), value in _counters.items()),
+            "timers": dict((_name(name, labels), {"count": h["count"], "sum": round(h["sum"], 6)})
+                           for (name, labels), h in _histograms.items())}
+    return json.dumps(data, sort_keys=True)
+
+
+def flush(force=False):
+    """ writes the configured outputs, if the interval has passed or force is True
+    """
+    if not force and time.time() - _settings["last_flush_time"] < _settings["interval"]:
+        return
+    _settings["last_flush_time"] = time.time()
+
+    if _settings["log_json"]:
+        logging.info("Metrics {0}".format(to_json()))
+    if _settings["prometheus_filename"] is not None:
+        write_prometheus(_settings["prometheus_filename"])
@@ -0,0 +1,165 @@
+"""
+near_dup.py:
+    Finds near duplicate tweets, such as manual retweets and copy-paste spam, with
+    MinHash signatures of character shingles and locality sensitive hashing (LSH).
+    Tweets whose signatures share a band are compared, so each new tweet is only
+    compared with a few others rather than every tweet in the database
+
+    The signatures use one permutation hashing: each shingle is hashed once and
+    the hash picks the signature value it competes for, rather than computing a
+    separate hash function for every value
+"""
+import operator
+import re
+import struct
+import zlib
+
+from lib import database as db
+
+shingle_size = 5
+bands = 16
+rows_per_band = 4
+# must be a power of two
+num_hashes = bands * rows_per_band
+
+# the fraction of matching signature values for tweets to be in the same cluster
+default_threshold = 0.6
+
+# the crc32 of each shingle is mixed with a multiplicative hash. The top bits choose
+# the signature value and the rest are the value. crc32 is used rather than hash()
+# so signatures stored in the database are the same for every python process
+_mix = 2654435761
+_bin_bits = num_hashes.bit_length() - 1
+_value_bits = 32 - _bin_bits
+_value_mask = (1 << _value_bits) - 1
+
+_retweet_prefix_re = re.compile(r"^(rt\s+@\w+:?\s*)+")
+_url_re = re.compile(r"https?://\S+")
+_whitespace_re = re.compile(r"\s+")
+
+_signature_format = "<{0}I".format(num_hashes)
+
+
+def normalize(text):
+    """ lower cases the text, and removes retweet prefixes, links and extra whitespace,
+        since these differ between copies of the same tweet
+    """
+    text = text.lower()
+    text = _url_re.sub(" ", text)
+    text = _whitespace_re.sub(" ", text).strip()
+    return _retweet_prefix_re.sub("", text)
+
+
+def shingles(text):
+    """ returns the set of hashed character shingles of the normalized text
+    """
+    text = normalize(text).encode("utf-8")
+    if not text:
+        return set()
+    if len(text) <= shingle_size:
+        return set([zlib.crc32(text) & 0xffffffff])
+    return set(zlib.crc32(text[i:i + shingle_size]) & 0xffffffff
+               for i in range(len(text) - shingle_size + 1))
+
+
+def signature(text):
+    """ returns the MinHash signature of the text as a list of num_hashes ints,
+        or None if there is no text left after normalizing it
+    """
+    hashed_shingles = shingles(text)
+    if not hashed_shingles:
+        return None
+
+    bins = [None] * num_hashes
+    for x in hashed_shingles:
+        h = (x * _mix) & 0xffffffff
+        index, value = h >> _value_bits, h & _value_mask
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+
+    # short texts leave some values empty. These take the value of the next
+    # non-empty one, offset by the distance to it, so they still match between
+    # similar texts
+    sig = []
+    for index in range(num_hashes):
+        distance = 0
+        while bins[(index + distance) % num_hashes] is None:
+            distance += 1
+        sig.append(bins[(index + distance) % num_hashes] + (distance << _value_bits))
+    return sig
+
+
+def band_keys(sig):
+    """ returns a key for each band of the signature. Tweets which share a key are
+        candidate near duplicates
+    """
+    keys = []
+    for band in range(bands):
+        values = sig[band * rows_per_band:(band + 1) * rows_per_band]
+        band_hash = zlib.crc32(struct.pack("<{0}I".format(rows_per_band), *values)) & 0xffffffff
+        keys.append(band << 32 | band_hash)
+    return keys
+
+
+def similarity(sig1, sig2):
+    """ estimates the Jaccard similarity of two signatures
+    """
+    return sum(map(operator.eq, sig1, sig2)) / float(num_hashes)
+
+
+def pack_signature(sig):
+    return struct.pack(_signature_format, *sig)
+
+
+def unpack_signature(data):
+    return list(struct.unpack(_signature_format, bytes(data)))
+
+
+def cluster_tweet(db_con, id_str, text, threshold=default_threshold):
+    """ adds a tweet to the cluster of its most similar candidate, if that is at least
+        threshold similar, or starts a new cluster
+
+        returns the tweet's cluster id, which is the id_str of the first tweet in the cluster
+    """
+    sig = signature(text or "")
+    if sig is None:
+        db.store_tweet_cluster(db_con, id_str, id_str, None, [])
+        return id_str
+
+    keys = band_keys(sig)
+    best_cluster, best_similarity = None, threshold
+    for cluster_id, cluster_signature in db.get_cluster_candidates(db_con, keys):
+        cluster_similarity = similarity(sig, unpack_signature(cluster_signature))
+        if cluster_similarity >= best_similarity:
+            best_cluster, best_similarity = cluster_id, cluster_similarity
+
+    # only the first tweet of each cluster keeps its signature, as new tweets are
+    # compared with it. The bands of every tweet in the cluster lead to it
+    if best_cluster is None:
+        db.store_tweet_cluster(db_con, id_str, id_str, pack_signature(sig), keys)
+        return id_str
+    db.store_tweet_cluster(db_con, id_str, best_cluster, None, keys)
+    return best_cluster
+
+
+def cluster_new_tweets(db_con, threshold=default_threshold, batch_size=1000):
+    """ clusters the tweets which haven't been clustered yet, committing after each batch
+
+        returns the number of tweets clustered and the number which joined an existing cluster
+    """
+    n_clustered, n_duplicates = 0, 0
+    last_rowid = db.get_last_clustered_rowid(db_con)
+    while True:
+        tweets = db.get_tweets_to_cluster(db_con, last_rowid, batch_size)
+        if not tweets:
+            break
+        for rowid, id_str, text in tweets:
+            if db.is_clustered(db_con, id_str):
+                # the same tweet stored in another group
+                continue
+            if cluster_tweet(db_con, id_str, text, threshold) != id_str:
+                n_duplicates += 1
+            n_clustered += 1
+        last_rowid = tweets[-1][0]
+        db.complete_clustering(db_con, last_rowid)
+    return n_clustered, n_duplicates
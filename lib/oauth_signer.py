@@ -0,0 +1,117 @@
+"""
+oauth_signer.py:
+    Signs API requests with OAuth 1.0a HMAC-SHA1 and builds the Authorization header.
+    The signing key, the HMAC state and the parameters which are the same for every
+    request are computed once for each set of credentials
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import time
+
+try:
+    from urllib import quote
+    from urlparse import urlparse, parse_qsl
+except ImportError:
+    from urllib.parse import quote, urlparse, parse_qsl
+
+# the oauth2 library adds a hash of the request body to requests which aren't form
+# encoded. Requests made by twerpy either have no body, so this is always the same,
+# or a form encoded body, whose parameters are signed instead
+_empty_body_hash = base64.b64encode(hashlib.sha1(b"").digest()).decode("ascii")
+
+_default_ports = {"http": 80, "https": 443}
+
+
+def escape(value):
+    """ percent encodes a value as required by the OAuth spec, leaving only
+        letters, digits and -._~ unencoded
+    """
+    if not isinstance(value, bytes):
+        value = value.encode("utf-8")
+    return quote(value, safe="~")
+
+
+def _normalized_url(scheme, netloc, path):
+    # the host is lower case, and default ports are left out
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    if ":" in netloc:
+        host, port = netloc.rsplit(":", 1)
+        if port.isdigit() and int(port) == _default_ports.get(scheme):
+            netloc = host
+    return "{0}://{1}{2}".format(scheme, netloc, path)
+
+
+def generate_nonce():
+    return binascii.hexlify(os.urandom(16)).decode("ascii")
+
+
+class Signer(object):
+    """ signs requests for one set of credentials
+
+        If body_hash is True, an oauth_body_hash parameter is included in requests
+        without body parameters so they are signed exactly as the oauth2 library
+        signs them
+    """
+    def __init__(self, consumer_key, consumer_secret, token_key, token_secret, body_hash=True):
+        key = "{0}&{1}".format(escape(consumer_secret), escape(token_secret)).encode("ascii")
+        # the HMAC with the key already processed is copied for each signature
+        self._hmac = hmac.new(key, digestmod=hashlib.sha1)
+
+        static_params = [("oauth_consumer_key", escape(consumer_key)),
+                         ("oauth_signature_method", "HMAC-SHA1"),
+                         ("oauth_token", escape(token_key)),
+                         ("oauth_version", "1.0")]
+        self._static_params = static_params
+        self._header_prefix = "OAuth " + ", ".join('{0}="{1}"'.format(k, v) for k, v in static_params)
+        self._body_hash_params = [("oauth_body_hash", escape(_empty_body_hash))] if body_hash else []
+
+        # maps (method, url without the query) to the start of the signature base string
+        self._base_cache = {}
+
+    def _base_prefix(self, method, scheme, netloc, path):
+        key = (method, scheme, netloc, path)
+        if key not in self._base_cache:
+            self._base_cache[key] = "{0}&{1}&".format(escape(method.upper()),
+                                                      escape(_normalized_url(scheme, netloc, path)))
+        return self._base_cache[key]
+
+    def sign(self, method, url, params=(), timestamp=None, nonce=None):
+        """ returns the signature of a request, along with the timestamp and nonce used.
+            params are the form encoded body parameters of a POST request, parameters
+            in the query string of the url are included automatically
+        """
+        if timestamp is None:
+            timestamp = str(int(time.time()))
+        if nonce is None:
+            nonce = generate_nonce()
+
+        url = urlparse(url)
+        request_params = [(escape(k), escape(v)) for k, v in parse_qsl(url.query, keep_blank_values=True)]
+        request_params += [(escape(k), escape(v)) for k, v in params]
+        request_params += self._static_params
+        if not params:
+            request_params += self._body_hash_params
+        request_params += [("oauth_nonce", escape(nonce)), ("oauth_timestamp", escape(str(timestamp)))]
+        request_params.sort()
+
+        normalized_params = "&".join("{0}={1}".format(k, v) for k, v in request_params)
+        base_string = self._base_prefix(method, url.scheme, url.netloc, url.path) + escape(normalized_params)
+
+        hashed = self._hmac.copy()
+        hashed.update(base_string.encode("ascii"))
+        signature = base64.b64encode(hashed.digest()).decode("ascii")
+        return signature, timestamp, nonce
+
+    def authorization_header(self, method, url, params=(), timestamp=None, nonce=None):
+        """ returns the value of the Authorization header for a request
+        """
+        signature, timestamp, nonce = self.sign(method, url, params, timestamp, nonce)
+        header_prefix = self._header_prefix
+        if not params:
+            header_prefix += "".join(', {0}="{1}"'.format(k, v) for k, v in self._body_hash_params)
+        return '{0}, oauth_nonce="{1}", oauth_timestamp="{2}", oauth_signature="{3}"'.format(
+            header_prefix, escape(nonce), timestamp, escape(signature))
@@ -0,0 +1,144 @@
+"""
+retention.py:
+    Deletes tweets which are older than their group's retention period, writing
+    them to a gzipped JSON lines archive first. Tweets are deleted in chunks, each
+    in its own transaction, so searches writing to the database at the same time
+    only wait for one chunk. Afterwards the free space is given back to the file
+    system and the query planner statistics are updated
+"""
+import gzip
+import json
+import logging
+import os
+import time
+
+from lib import database as db
+from data import twitter_settings
+
+_day = 86400
+
+
+def parse_policy(text):
+    """ parses a <group>=<days> retention policy
+
+        returns a (group, days) tuple
+    """
+    group, _, days = text.rpartition("=")
+    try:
+        days = float(days)
+    except ValueError:
+        group = ""
+    if not group or days < 0:
+        raise ValueError("Retention policies must be given as <group>=<days>, not {0}".format(text))
+    return group, days
+
+
+def cutoffs(groups, policies, default_days, now):
+    """ returns a dict mapping each group to the time before which its tweets expire.
+        Groups without a policy use default_days, and are kept forever if it is None
+    """
+    group_cutoffs = {}
+    for group in groups:
+        days = policies.get(group, default_days)
+        if days is not None:
+            group_cutoffs[group] = int(now - days * _day)
+    return group_cutoffs
+
+
+class Archive(object):
+    """ a gzipped file of tweets, one JSON object per line. The file is only
+        created when the first tweets are written
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def write(self, tweets):
+        if self._file is None:
+            dir_path = os.path.dirname(self.filename)
+            if dir_path and not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+            self._file = gzip.open(self.filename, "wb")
+        for tweet in tweets:
+            tweet = dict((key, value) for key, value in tweet.items() if key != "rowid")
+            self._file.write((json.dumps(tweet, sort_keys=True) + "\n").encode("utf-8"))
+        # the tweets must be in the file before they are deleted
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def delete_expired(db_con, group_cutoffs, archive=None, chunk_size=None):
+    """ deletes the tweets older than their group's cutoff, writing them to the archive
+        first if one is given
+
+        returns the number of tweets deleted
+    """
+    if chunk_size is None:
+        chunk_size = twitter_settings.retention_chunk_size
+    db.set_retention_cutoffs(db_con, group_cutoffs)
+
+    n_deleted = 0
+    last_rowid = 0
+    while True:
+        tweets = db.get_expired_tweets(db_con, last_rowid, chunk_size)
+        if not tweets:
+            break
+        if archive is not None:
+            archive.write(tweets)
+        db.delete_tweets(db_con, tweets)
+        n_deleted += len(tweets)
+        last_rowid = tweets[-1]["rowid"]
+        logging.debug("Deleted {0} tweets".format(n_deleted))
+    return n_deleted
+
+
+def reclaim_space(db_con, full_vacuum=False, pages=None):
+    """ gives the space of deleted rows back to the file system and updates the query
+        planner statistics. Databases made before auto_vacuum was set need full_vacuum
+        once, which rewrites the whole file and switches them to incremental vacuuming
+    """
+    if pages is None:
+        pages = twitter_settings.incremental_vacuum_pages
+    if full_vacuum:
+        logging.info("Vacuuming the database")
+        db.vacuum(db_con)
+    elif db.get_auto_vacuum(db_con) != 2:
+        logging.info("The database doesn't use incremental vacuuming, run retain with --vacuum once to switch it")
+    else:
+        # freeing a few pages at a time keeps each write transaction short
+        free_pages = None
+        while free_pages != 0:
+            last_free_pages, free_pages = free_pages, db.incremental_vacuum(db_con, pages)
+            if free_pages == last_free_pages:
+                break
+    db.analyze(db_con)
+
+
+def retain(db_con, policies, default_days=None, archive_dir_path=None, full_vacuum=False,
+           chunk_size=None, now=None):
+    """ applies the retention policies, a dict mapping group to the number of days its
+        tweets are kept. Expired tweets are archived in archive_dir_path, unless it is None
+
+        returns the number of tweets deleted
+    """
+    if now is None:
+        now = time.time()
+    group_cutoffs = cutoffs(db.get_tweet_groups(db_con), policies, default_days, now)
+
+    archive = None
+    if archive_dir_path is not None:
+        archive = Archive(os.path.join(archive_dir_path, "tweets_{0}.jsonl.gz".format(
+            time.strftime("%Y%m%d_%H%M%S", time.gmtime(now)))))
+    try:
+        n_deleted = delete_expired(db_con, group_cutoffs, archive, chunk_size)
+    finally:
+        if archive is not None:
+            archive.close()
+    if n_deleted and archive is not None:
+        logging.info("Archived {0} tweets to {1}".format(n_deleted, archive.filename))
+
+    reclaim_space(db_con, full_vacuum)
+    return n_deleted
@@ -0,0 +1,163 @@
+"""
+scheduler.py:
+    Runs the searches in the search queue which are due, highest priority first.
+    Each search is scheduled to run again after an interval which adapts to the
+    number of new tweets it finds, so busy terms are searched more often than
+    quiet ones
+"""
+import logging
+import time
+
+from lib import database as db
+from lib import filters
+from lib import metrics
+from lib import search_file
+from data import twitter_settings
+
+
+def _newest_id(tweets, since_id):
+    """ returns the id_str of the newest tweet, or since_id if there are no newer tweets
+    """
+    ids = [tweet["id_str"] for tweet in tweets if "id_str" in tweet]
+    if since_id:
+        ids.append(since_id)
+    if not ids:
+        return None
+    return max(ids, key=int)
+
+
+def _search_tweets(search, db_con, no_RT):
+    from lib import tweet_handler
+    return tweet_handler.search_tweets(search["term"], search["job_group"], db_con, no_RT,
+                                       since_id=search["since_id"],
+                                       tweet_filters=filters.parse_filters(search["filters"]))
+
+
+def _search_user_tweets(search, db_con, no_RT):
+    from lib import tweet_handler
+    return tweet_handler.search_user_tweets(search["term"], search["job_group"], db_con,
+                                            since_id=search["since_id"],
+                                            tweet_filters=filters.parse_filters(search["filters"]))
+
+
+# the function which runs a queued search, for each endpoint
+search_functions = {"search/tweets": _search_tweets,
+                    "statuses/user_timeline": _search_user_tweets}
+
+# the most tweets each endpoint returns in one request
+page_sizes = {"search/tweets": twitter_settings.max_search_tweets_count,
+              "statuses/user_timeline": twitter_settings.max_user_timeline_count}
+
+
+def next_interval(search, n_tweets, now):
+    """ returns the time until the search should run again and its estimated rate of
+        new tweets per second, given the number of tweets it just found
+
+        The interval is set so the search is expected to find search_target_yield of a
+        full page of tweets. A full page means tweets may have been missed, so the
+        interval is halved, and if no tweets have been seen the interval is doubled
+    """
+    interval = search["revisit_interval"] or twitter_settings.search_interval
+    page_size = page_sizes.get(search["endpoint"], twitter_settings.max_search_tweets_count)
+
+    tweet_rate = search["tweet_rate"]
+    if search["last_run"] is not None and now > search["last_run"]:
+        observed_rate = float(n_tweets) / (now - search["last_run"])
+        if tweet_rate is None:
+            tweet_rate = observed_rate
+        else:
+            smoothing = twitter_settings.search_rate_smoothing
+            tweet_rate = smoothing * observed_rate + (1 - smoothing) * tweet_rate
+
+    if n_tweets >= page_size:
+        interval /= 2.0
+    elif tweet_rate:
+        interval = twitter_settings.search_target_yield * page_size / tweet_rate
+    else:
+        interval *= 2
+
+    interval = max(twitter_settings.min_search_interval,
+                   min(twitter_settings.max_search_interval, int(interval)))
+    return interval, tweet_rate
+
+
+def run_search(db_con, search, no_RT=False, now=None):
+    """ runs a queued search, only fetching tweets newer than the ones already found,
+        and schedules it to run again
+
+        returns the list of tweets found, or None if a shutdown was requested before the
+        search was made, in which case it stays due
+    """
+    if search["endpoint"] not in search_functions:
+        raise Exception("Can't schedule searches of {0}".format(search["endpoint"]))
+
+    tweets = search_functions[search["endpoint"]](search, db_con, no_RT)
+    if tweets is None:
+        return None
+    if now is None:
+        now = int(time.time())
+    interval, tweet_rate = next_interval(search, len(tweets), now)
+    db.update_search(db_con, search, now + interval, _newest_id(tweets, search["since_id"]),
+                     interval, now, tweet_rate)
+
+    metrics.increment("scheduled_searches_total", endpoint=search["endpoint"])
+    metrics.increment("scheduled_search_tweets_total", len(tweets), endpoint=search["endpoint"])
+    logging.info("Found {0} new tweets for {1}, searching again in {2} seconds".format(
+        len(tweets), search["term"], interval))
+    return tweets
+
+
+def run_due_searches(db_con, max_searches, no_RT=False, now=None):
+    """ runs up to max_searches of the searches which are due, highest priority first.
+        Limiting the number of searches bounds how long each call takes
+
+        returns the number of searches run
+    """
+    if now is None:
+        now = int(time.time())
+    db.delete_expired_searches(db_con, now)
+    searches = db.get_due_searches(db_con, now, max_searches)
+    for n_run, search in enumerate(searches):
+        if run_search(db_con, search, no_RT, now) is None:
+            return n_run
+    return len(searches)
+
+
+def add_file(db_con, filename, endpoint="search/tweets", priority=0):
+    """ queues a search for each <term>:<group> line of a file, due now, with the
+        filters given on the line. Searches which are already queued take the new filters
+
+        returns the number of searches which weren't already queued
+    """
+    now = int(time.time())
+    added = 0
+    for term, group, tweet_filters in search_file.read_search_file(filename):
+        if db.enqueue_search(db_con, term, group, endpoint, priority, now,
+                             filters=filters.format_filters(tweet_filters)):
+            added += 1
+    return added
+
+
+def run(db_con, max_searches=10, no_RT=False, once=False):
+    """ runs the searches in the queue as they become due, until ctrl-c is pressed.
+        If once is True, the searches which are due now are run and then it returns
+    """
+    from lib import tweet_handler
+
+    tweet_handler.install_ctrl_c_handler()
+    while not tweet_handler.shutdown_requested:
+        if run_due_searches(db_con, max_searches, no_RT) > 0:
+            continue
+        if once:
+            break
+
+        next_due = db.get_next_due(db_con, int(time.time()))
+        if next_due is None:
+            logging.info("The search queue is empty")
+            break
+        logging.info("Waiting {0:.0f} seconds for the next search".format(max(0, next_due - time.time())))
+        while not tweet_handler.shutdown_requested and time.time() < next_due:
+            time.sleep(min(1, next_due - time.time()))
+            metrics.flush()
+
+    logging.info("Stopping scheduler")
@@ -0,0 +1,30 @@
+"""
+search_file.py:
+    Reads the files of <term>:<group> lines used by the search commands
+"""
+from lib import filters
+
+
+def read_search_file(filename):
+    """ reads a file with one <term>:<group> pair per line. A line can have a third
+        field with filters for the tweets stored, e.g. #fun:good_times:lang=en;min_retweets=5
+
+        returns a list of (term, group, filters) tuples, where filters is a dict
+        which is empty if the line has none
+    """
+    searches = []
+    with open(filename) as f:
+        for line in f.readlines():
+            # split the line into a query, group and filters
+            # check the line to see if it's formatted correctly
+            fields = line.rstrip("\n").split(":")
+            if len(fields) not in (2, 3):
+                raise Exception("Error in search term \n {0} \n Line must be formatted as <term>:<group> "
+                                "or <term>:<group>:<filters>".format(line))
+            term, group = fields[:2]
+            try:
+                tweet_filters = filters.parse_filters(fields[2] if len(fields) == 3 else "")
+            except ValueError as e:
+                raise Exception("Error in search term \n {0} \n {1}".format(line, e))
+            searches.append((term, group, tweet_filters))
+    return searches
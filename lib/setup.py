@@ -2,8 +2,6 @@ import argparse
 import logging
 import os
 
-import database as db
-
 
 def gen_parser():
     parser = argparse.ArgumentParser(add_help=False)
@@ -12,6 +10,12 @@ def gen_parser():
     common = argparse.ArgumentParser(add_help=False)
     common.add_argument("--debug", action="store_true", help="Show debug information")
     common.add_argument("-d", "--database")
+    common.add_argument("--profile", action="store_true",
+            help="Profile the run with cProfile and write the stats to the 'reports' directory")
+    common.add_argument("--metrics", metavar="FILENAME",
+            help="Write ingestion metrics to a Prometheus text file")
+    common.add_argument("--metrics-log", action="store_true",
+            help="Periodically log ingestion metrics as a line of JSON")
 
     subparsers = parser.add_subparsers()
     # set up arguments for the setup command
@@ -26,6 +30,8 @@ def gen_parser():
     search_tweets_p.add_argument("filename")
     search_tweets_p.add_argument("--no_RT",
             help="do not include retweets in the search", action="store_true")
+    search_tweets_p.add_argument("--resume",
+            help="skip terms completed by a previous run with the same file", action="store_true")
     search_tweets_p.set_defaults(which="search-tweets")
 
     # set up arguments for the search-users command
@@ -53,11 +59,15 @@ def gen_parser():
     search_user_tweets_p = subparsers.add_parser("search-user-tweets", parents=[common],
             help="Search for tweets from specific users")
     search_user_tweets_p.add_argument("filename")
+    search_user_tweets_p.add_argument("--resume",
+            help="skip users completed by a previous run with the same file", action="store_true")
     search_user_tweets_p.set_defaults(which="search-user-tweets")
 
     # set up arguments for the search-suggested-users command
     search_suggested_users_p = subparsers.add_parser("search-suggested-users", parents=[common],
             help="Search for suggested users. Outputs the user and category")
+    search_suggested_users_p.add_argument("--resume",
+            help="skip categories completed by a previous run", action="store_true")
     search_suggested_users_p.set_defaults(which="search-suggested-users")
 
     # set up arguments for the search-trends command
@@ -68,6 +78,53 @@ def gen_parser():
             help="Specify a group")
     search_trends_p.set_defaults(which="search-trends")
 
+    # set up arguments for the enrich-users command
+    enrich_users_p = subparsers.add_parser("enrich-users", parents=[common],
+            help="Look up the profiles of tweet authors who aren't in the users table")
+    enrich_users_p.add_argument("-g", "--group", default="tweet_authors",
+            help="Group new users are added to, tweet_authors by default")
+    enrich_users_p.add_argument("--ttl", type=int,
+            help="Seconds before a profile is looked up again")
+    enrich_users_p.set_defaults(which="enrich-users")
+
+    # set up arguments for the schedule command, which has its own subcommands
+    schedule_p = subparsers.add_parser("schedule",
+            help="Queue searches and run them as they become due, revisiting busy terms more often")
+    schedule_subparsers = schedule_p.add_subparsers()
+    schedule_add_p = schedule_subparsers.add_parser("add", parents=[common],
+            help="Queue a search for each <term>:<group> line of a file")
+    schedule_add_p.add_argument("filename")
+    schedule_add_p.add_argument("--users", action="store_true",
+            help="the file contains screen names, and their timelines are searched")
+    schedule_add_p.add_argument("--priority", type=int, default=0,
+            help="Searches with a higher priority are run first")
+    schedule_add_p.set_defaults(which="schedule", schedule_command="add")
+    schedule_run_p = schedule_subparsers.add_parser("run", parents=[common],
+            help="Run the queued searches as they become due")
+    schedule_run_p.add_argument("--max-searches", type=int, default=10,
+            help="Maximum number of searches run before checking the queue again")
+    schedule_run_p.add_argument("--no_RT",
+            help="do not include retweets in the search", action="store_true")
+    schedule_run_p.add_argument("--once", action="store_true",
+            help="run the searches which are due now, then exit")
+    schedule_run_p.set_defaults(which="schedule", schedule_command="run")
+
+    # set up arguments for the trend-monitor command
+    trend_monitor_p = subparsers.add_parser("trend-monitor", parents=[common],
+            help="Poll the trends for the given WOEIDs and search each new trend until it expires")
+    trend_monitor_p.add_argument("WOEID", nargs="+")
+    trend_monitor_p.add_argument("--interval", type=float,
+            help="Seconds between polls of the trends")
+    trend_monitor_p.add_argument("--expiry", type=int,
+            help="Seconds a trend is searched after it was last seen")
+    trend_monitor_p.add_argument("--priority", type=int,
+            help="Priority of the trend searches in the search queue")
+    trend_monitor_p.add_argument("--max-searches", type=int, default=10,
+            help="Maximum number of searches run between polls of the trends")
+    trend_monitor_p.add_argument("--no_RT",
+            help="do not include retweets in the search", action="store_true")
+    trend_monitor_p.set_defaults(which="trend-monitor")
+
     # set up arguments for the dump-tweets command
     dump_tweets_p = subparsers.add_parser("dump-tweets", parents=[common],
             help="Dumps all the tweet data to tweets.csv in the 'reports' directory, or in a location specified by the -o option")
@@ -75,9 +132,66 @@ def gen_parser():
             help="Specify a group")
     dump_tweets_p.add_argument("-o", "--output",
             help="Output filename")
-    dump_tweets_p.add_argument("--json", help="Report data in JSON format")
+    dump_tweets_p.add_argument("--json", action="store_true", help="Report data in JSON format")
+    dump_tweets_p.add_argument("--dedupe", action="store_true",
+            help="Only include one tweet from each cluster of near duplicates found by cluster-tweets")
     dump_tweets_p.set_defaults(which="dump-tweets")
 
+    # set up arguments for the cluster-tweets command
+    cluster_tweets_p = subparsers.add_parser("cluster-tweets", parents=[common],
+            help="Find near duplicate tweets, such as manual retweets and spam, among the tweets which haven't been clustered yet")
+    cluster_tweets_p.add_argument("--threshold", type=float, default=None,
+            help="Estimated similarity, from 0 to 1, for tweets to be near duplicates")
+    cluster_tweets_p.set_defaults(which="cluster-tweets")
+
+    # set up arguments for the timeseries command
+    timeseries_p = subparsers.add_parser("timeseries", parents=[common],
+            help="Dumps the number of tweets, retweets and favourites over time for each group to "
+                 "timeseries_<resolution>.csv in the 'reports' directory, or in a location specified by the -o option")
+    timeseries_p.add_argument("-g", "--group",
+            help="Specify a group")
+    timeseries_p.add_argument("-r", "--resolution", choices=["minute", "hour", "day"], default="hour",
+            help="Length of each time bucket")
+    timeseries_p.add_argument("--start", help="Start time, as YYYY-MM-DD or YYYY-MM-DD HH:MM in UTC")
+    timeseries_p.add_argument("--end", help="End time, as YYYY-MM-DD or YYYY-MM-DD HH:MM in UTC")
+    timeseries_p.add_argument("-o", "--output",
+            help="Output filename, or - to print the rows")
+    timeseries_p.add_argument("--json", action="store_true", help="Report data in JSON format")
+    timeseries_p.add_argument("--rebuild", action="store_true",
+            help="Recalculate the rollups from every tweet, for databases made by older versions")
+    timeseries_p.set_defaults(which="timeseries")
+
+    # set up arguments for the graph command, which has its own subcommands
+    graph_p = subparsers.add_parser("graph",
+            help="Build the graph of users mentioning, replying to and retweeting each other, and rank the users")
+    graph_subparsers = graph_p.add_subparsers()
+    graph_build_p = graph_subparsers.add_parser("build", parents=[common],
+            help="Build the graph from the stored tweets and save it next to the database")
+    graph_build_p.add_argument("--types", nargs="+", choices=["mention", "reply", "retweet"],
+            default=["mention", "reply", "retweet"], help="The kinds of edges to include")
+    graph_build_p.set_defaults(which="graph", graph_command="build")
+    for graph_command, graph_help in [("pagerank", "List the users with the highest PageRank"),
+                                      ("degree", "List the users mentioned, replied to and retweeted the most")]:
+        graph_rank_p = graph_subparsers.add_parser(graph_command, parents=[common], help=graph_help)
+        graph_rank_p.add_argument("--top", type=int, default=20,
+                help="Number of users to list")
+        graph_rank_p.set_defaults(which="graph", graph_command=graph_command)
+
+    # set up arguments for the retain command
+    retain_p = subparsers.add_parser("retain", parents=[common],
+            help="Archive and delete tweets older than their group's retention period, then reclaim the free space")
+    retain_p.add_argument("--keep", metavar="GROUP=DAYS", action="append", default=[],
+            help="Days to keep the tweets in a group, can be given for several groups")
+    retain_p.add_argument("--days", type=float,
+            help="Days to keep the tweets in groups without a policy, by default they are kept forever")
+    retain_p.add_argument("--archive-dir",
+            help="Directory the deleted tweets are archived in, by default <database>_archive next to the database")
+    retain_p.add_argument("--no-archive", action="store_true",
+            help="Delete expired tweets without archiving them")
+    retain_p.add_argument("--vacuum", action="store_true",
+            help="Rebuild the whole database file, needed once for databases made by older versions")
+    retain_p.set_defaults(which="retain")
+
     # set up arguments for the dump-users command
     dump_users_p = subparsers.add_parser("dump-users", parents=[common],
             help="Dumps all the user data to users.csv in the 'reports' directory, or in a location specified by the -o option")
@@ -85,18 +199,21 @@ def gen_parser():
             help="Specify a group")
     dump_users_p.add_argument("-o", "--output",
             help="Output filename")
-    dump_users_p.add_argument("--json", help="Report data in JSON format")
+    dump_users_p.add_argument("--json", action="store_true", help="Report data in JSON format")
     dump_users_p.set_defaults(which="dump-users")
 
     return parser
 
 
 def setup_db(db_filename):
+    from lib import database as db
     logging.info("Creating new database file {0} in data directory".format(db_filename))
     db.reset(db_filename)
 
 
 def setup_all():
+    from lib import database as db
+
     def _join_to_data_dir(filename):
         # this file is  twerpy/lib/setup.py, so navigate to twerpy/
         # the join with data/ to get twerpy/data/
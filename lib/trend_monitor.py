@@ -0,0 +1,84 @@
+"""
+trend_monitor.py:
+    Polls the trends of a list of WOEIDs and schedules a search for each trend
+    when it first appears. Searches of a trend stop once it hasn't been seen for
+    the expiry time
+"""
+import logging
+import time
+
+from lib import database as db
+from lib import credentials
+from lib import metrics
+from lib import scheduler
+from data import twitter_settings
+
+
+def min_poll_interval(n_woeids, n_credentials):
+    """ returns the shortest time between polls of each WOEID which keeps
+        within the trends/place rate limit
+    """
+    limit = credentials.endpoint_rate_limit("trends/place") * n_credentials
+    return float(twitter_settings.rate_limit_window) * n_woeids / limit
+
+
+def trend_group(woeid, name):
+    """ returns the group tweets about a trend are stored in
+    """
+    return "{0}_{1}".format(woeid, name)
+
+
+def schedule_trends(db_con, woeid, names, now, expiry, priority):
+    """ records the current trends of a WOEID and schedules a search of each one, due now
+        for new trends. Trends which are still active have their expiry extended
+
+        returns the names of the new trends
+    """
+    new_names = db.update_trends(db_con, woeid, names, now, expiry)
+    for name in names:
+        db.enqueue_search(db_con, name, trend_group(woeid, name), priority=priority,
+                          next_due=now, expires_at=now + expiry)
+    return new_names
+
+
+def _sleep_until(end_time, tweet_handler):
+    while not tweet_handler.shutdown_requested and time.time() < end_time:
+        time.sleep(min(1, end_time - time.time()))
+        metrics.flush()
+
+
+def run(db_con, woeids, interval=None, expiry=None, priority=None, max_searches=10, no_RT=False):
+    """ polls the trends of each WOEID every interval seconds, and between polls
+        runs up to max_searches of the scheduled searches. Runs until ctrl-c is pressed
+    """
+    from lib import tweet_handler
+
+    if interval is None:
+        interval = twitter_settings.trend_poll_interval
+    if expiry is None:
+        expiry = twitter_settings.trend_expiry
+    if priority is None:
+        priority = twitter_settings.trend_search_priority
+
+    min_interval = min_poll_interval(len(woeids), tweet_handler.credential_count())
+    if interval < min_interval:
+        logging.info("Polling trends every {0:.0f} seconds to stay within the rate limit".format(min_interval))
+        interval = min_interval
+
+    tweet_handler.install_ctrl_c_handler()
+    while not tweet_handler.shutdown_requested:
+        cycle_start = time.time()
+        for woeid in woeids:
+            names = tweet_handler.get_trends(woeid)
+            if names is None:
+                break
+            new_names = schedule_trends(db_con, woeid, names, int(time.time()), expiry, priority)
+            logging.info("{0} trends for WOEID {1}, {2} new".format(len(names), woeid, len(new_names)))
+            if tweet_handler.shutdown_requested:
+                break
+
+        if not tweet_handler.shutdown_requested:
+            scheduler.run_due_searches(db_con, max_searches, no_RT)
+        _sleep_until(cycle_start + interval, tweet_handler)
+
+    logging.info("Stopping trend monitor")
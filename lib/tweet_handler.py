@@ -1,79 +1,240 @@
-import oauth2 as oauth
 import urllib2 as urllib
-import json
+from urllib import urlencode
 import logging
 import signal
-import csv
 import os
 import time
+import urlparse
 
+import credentials
 import database as db
-from data import user_settings
+import decoder
+import filters
+import metrics
+import oauth_signer
+import search_file
 from data import twitter_settings
 
-oauth_token = oauth.Token(key=user_settings.access_token_key, secret=user_settings.access_token_secret)
-oauth_consumer = oauth.Consumer(key=user_settings.consumer_key, secret=user_settings.consumer_secret)
+# the user's credentials are only loaded when the first request is made,
+# so importing this module stays cheap
+_oauth = {}
+
+
+def _get_credential_pool():
+    """ returns the pool of credentials from the user settings
+    """
+    if "pool" not in _oauth:
+        from data import user_settings
+        _oauth["pool"] = credentials.CredentialPool(credentials.load_credentials(user_settings))
+    return _oauth["pool"]
+
+
+def _get_signer(index):
+    """ returns the request signer for a credential in the pool
+    """
+    if index not in _oauth:
+        credential = _get_credential_pool().credentials[index]
+        _oauth[index] = oauth_signer.Signer(credential["consumer_key"], credential["consumer_secret"],
+                                            credential["access_token_key"], credential["access_token_secret"])
+    return _oauth[index]
+
+
+# set when ctrl-c is pressed. Long running searches check this between requests,
+# so the current unit of work is finished and recorded before exiting
+shutdown_requested = False
 
 
 # set up a handler to catch ctrl-c events
 def ctrl_c_handler(signum, frame):
-    print("Exiting")
-    exit(0)
+    global shutdown_requested
+    if shutdown_requested:
+        print("Exiting")
+        exit(0)
+    print("Finishing the current request before exiting. Press ctrl-c again to exit immediately")
+    shutdown_requested = True
+
+
+def install_ctrl_c_handler():
+    """ makes ctrl-c finish the current request before exiting. This is installed by
+        the long running searches rather than on import
+    """
+    signal.signal(signal.SIGINT, ctrl_c_handler)
 
 
-signal.signal(signal.SIGINT, ctrl_c_handler)
+def _rate_limit_sleep(seconds):
+    """ sleeps to wait for the next rate limit window, returning early if
+        a shutdown is requested
+    """
+    logging.info("Sleeping for {0:.0f} seconds to avoid rate limiting".format(seconds))
+    end_time = time.time() + seconds
+    while not shutdown_requested and time.time() < end_time:
+        sleep_start_time = time.time()
+        time.sleep(min(1, end_time - sleep_start_time))
+        # the metrics are updated and written as the time passes, since no requests
+        # are made to flush them while waiting
+        metrics.increment("rate_limit_sleep_seconds_total", time.time() - sleep_start_time)
+        metrics.flush()
+
+
+def _job_id(command, filename):
+    """ identifies a job in the database ledger by the command and absolute filename
+    """
+    return "{0}:{1}".format(command, os.path.abspath(filename))
+
 
+def _start_job(db_con, job_id, resume):
+    """ returns the units of work already completed for the job. If the job isn't
+        being resumed, any previous progress is cleared
+    """
+    if not resume:
+        db.reset_job(db_con, job_id)
+        return set()
+
+    completed = db.get_completed_job_units(db_con, job_id)
+    logging.info("Resuming job, skipping {0} completed searches".format(len(completed)))
+    return completed
 
-def twitterreq(url, http_method="GET", parameters=()):
-    """ Constructs, signs and opens a twitter request
 
-        returns the data as a json encoded variable
+def _endpoint(url):
+    """ returns the API endpoint of a url for labelling metrics,
+        e.g. search/tweets for https://api.twitter.com/1.1/search/tweets.json?q=fun
     """
-    # convert the parameters to a list. The default argument is a tuple,
-    # since it is good practice to have non-mutable default arguments
-    req = oauth.Request.from_consumer_and_token(oauth_consumer,
-                                                token=oauth_token,
-                                                http_method=http_method,
-                                                http_url=url,
-                                                parameters=parameters)
+    path = urlparse.urlparse(url).path
+    endpoint = path.split("/1.1/", 1)[-1]
+    if endpoint.endswith(".json"):
+        endpoint = endpoint[:-len(".json")]
+    # suggested user categories have the slug in the path
+    if endpoint.startswith("users/suggestions/"):
+        endpoint = "users/suggestions/:slug"
+    return endpoint
 
-    req.sign_request(oauth.SignatureMethod_HMAC_SHA1(), oauth_consumer, oauth_token)
 
-    if http_method == "POST":
-        encoded_post_data = req.to_postdata()
-    else:
-        encoded_post_data = None
-        url = req.to_url()
+def _acquire_credential(pool, endpoint):
+    """ returns the index of a credential with requests remaining for the endpoint,
+        sleeping until one is available if they have all been used
+
+        returns None if a shutdown is requested while waiting
+    """
+    while True:
+        index = pool.acquire(endpoint)
+        if index is not None:
+            return index
+        if shutdown_requested:
+            return None
+        _rate_limit_sleep(pool.wait_time(endpoint))
+
+
+def _update_rate_limit(pool, index, endpoint, response):
+    """ updates the credential's rate limit from the response headers
+    """
+    headers = response.info()
+    remaining = headers.get("x-rate-limit-remaining")
+    reset = headers.get("x-rate-limit-reset")
+    reset = int(reset) if reset else None
+
+    if response.code == 429:
+        pool.exhausted(index, endpoint, reset)
+    elif remaining:
+        pool.update(index, endpoint, int(remaining), reset)
+
+
+def twitterreq(url, http_method="GET", parameters=(), statuses=False):
+    """ Constructs, signs and opens a twitter request, using whichever credential
+        has requests remaining for the endpoint
+
+        returns the data as a json encoded variable. If statuses is True, the response
+        contains tweets, and only the stored fields are decoded if
+        twitter_settings.decode_stored_fields_only is set
+
+        returns None without making the request if a shutdown is requested while
+        waiting for the rate limit, so the caller can stop the same way it does
+        between requests
+    """
+    endpoint = _endpoint(url)
+    pool = _get_credential_pool()
 
     opener = urllib.OpenerDirector()
     opener.add_handler(urllib.HTTPHandler())
     opener.add_handler(urllib.HTTPSHandler())
-    response = opener.open(url, encoded_post_data)
+
+    # the parameters can be given as a dict or a sequence of pairs. The default argument
+    # is a tuple, since it is good practice to have non-mutable default arguments
+    if hasattr(parameters, "items"):
+        parameters = list(parameters.items())
+    else:
+        parameters = list(parameters)
+
+    if http_method == "POST":
+        encoded_post_data = urlencode(parameters)
+        signed_parameters = parameters
+    else:
+        encoded_post_data = None
+        signed_parameters = ()
+        if parameters:
+            url += ("&" if "?" in url else "?") + urlencode(parameters)
+
+    while True:
+        index = _acquire_credential(pool, endpoint)
+        if index is None:
+            logging.info("Shutdown requested while waiting for the rate limit")
+            return None
+        authorization = _get_signer(index).authorization_header(http_method, url, signed_parameters)
+        request = urllib.Request(url, encoded_post_data, {"Authorization": authorization})
+
+        metrics.increment("api_requests_total", endpoint=endpoint)
+        with metrics.timer("api_request_seconds", endpoint=endpoint):
+            response = opener.open(request)
+            response_data = response.read()
+        _update_rate_limit(pool, index, endpoint, response)
+
+        # try again with another credential, or wait, if this one was rate limited
+        if response.code != 429:
+            break
+        metrics.increment("api_rate_limited_total", endpoint=endpoint)
+        logging.info("Credential {0} is rate limited for {1}".format(index, endpoint))
+
     try:
-        json_response = json.load(response)
+        with metrics.timer("json_parse_seconds", endpoint=endpoint):
+            if statuses and twitter_settings.decode_stored_fields_only:
+                json_response = decoder.loads_statuses(response_data)
+            else:
+                json_response = decoder.loads(response_data)
     except ValueError:
-        logging.error("Received invalid twitter API response: {0}".format(response))
+        metrics.increment("api_errors_total", endpoint=endpoint)
+        logging.error("Received invalid twitter API response: {0}".format(response_data))
         raise
+
+    metrics.flush()
     return json_response
 
 
 def search_tweets(term, tweet_group, db_con, no_RT=False,
-                  search_count=twitter_settings.max_search_tweets_count):
-    """ searches for tweets containing the given term and stores them in the database
-
-        returns the list of tweet objects
+                  search_count=twitter_settings.max_search_tweets_count, since_id=None, tweet_filters=None,
+                  commit=True):
+    """ searches for tweets containing the given term and stores them in the database.
+        If since_id is given, only tweets newer than that id are returned. If tweet_filters
+        are given, only the tweets which pass them are stored. If commit is False the
+        caller commits the tweets, e.g. with the job ledger entry
+
+        returns the list of tweet objects found, including any which were filtered out,
+        or None if a shutdown was requested before the search was made
     """
-    query_params = "?q={0}&count={1}".format(urllib.quote(term), search_count)
+    query = term
     if no_RT:
-        query_params += urllib.quote(" exclude:retweets")
+        query += " exclude:retweets"
+    query_params = "?q={0}&count={1}".format(urllib.quote(query), search_count)
+    if since_id:
+        query_params += "&since_id={0}".format(since_id)
 
     logging.info("Searching tweets about {0}".format(term))
 
     # encode the query for use in a url
-    query_url = "https://api.twitter.com/1.1/search/tweets.json{0}".format(query_params)
+    query_url = "{0}/search/tweets.json{1}".format(twitter_settings.api_url, query_params)
 
     logging.debug("Twitter API call: {0}".format(query_url))
-    json_data = twitterreq(query_url, "GET")
+    json_data = twitterreq(query_url, "GET", statuses=True)
+    if json_data is None:
+        return None
     logging.info("Searching for {0} completed".format(term))
 
     if not "statuses" in json_data:
@@ -81,8 +242,7 @@ def search_tweets(term, tweet_group, db_con, no_RT=False,
 
     # save the results
     tweets = json_data["statuses"]
-    for tweet in tweets:
-        db.insert_tweet(db_con, tweet, tweet_group)
+    db.insert_tweets(db_con, filters.filter_tweets(tweets, tweet_filters), tweet_group, commit)
 
     logging.info("Results written to database")
     return tweets
@@ -93,7 +253,8 @@ def search_users(term, user_group, db_con,
     """ searches for users who have recently posted tweets with containing the term and
         stores them in the database
 
-        returns the list of user objects
+        returns the list of user objects, or None if a shutdown was requested before
+        the search was made
     """
     query_params = "?q={0}&count={1}".format(urllib.quote(term), search_count)
     # don't include retweets when searching for users
@@ -102,10 +263,12 @@ def search_users(term, user_group, db_con,
     logging.info("Searching for users who tweeted about {0}".format(term))
 
     # encode the query for use in a url
-    query_url = "https://api.twitter.com/1.1/search/tweets.json{0}".format(query_params)
+    query_url = "{0}/search/tweets.json{1}".format(twitter_settings.api_url, query_params)
 
     logging.debug("Twitter API call: {0}".format(query_url))
-    json_data = twitterreq(query_url, "GET")
+    json_data = twitterreq(query_url, "GET", statuses=True)
+    if json_data is None:
+        return None
     logging.info("Searching for {0} completed".format(term))
 
     if not "statuses" in json_data:
@@ -115,9 +278,7 @@ def search_users(term, user_group, db_con,
     tweets = json_data["statuses"]
     # extract the user object from the tweet object
     users = [tweet["user"] for tweet in tweets]
-
-    for user in users:
-        db.insert_user(db_con, user, user_group)
+    db.insert_users(db_con, users, user_group)
 
     logging.info("Results written to database")
     return users
@@ -129,24 +290,27 @@ def search_top_users(term, user_group, db_con,
         them in the database. Use search_users for users currently tweeting
         about a specific topic
 
-        returns a list of user objects
+        returns a list of user objects, or None if a shutdown was requested before
+        the search was made
     """
     query_params = "?q={0}&count={1}".format(urllib.quote(term), search_count)
 
     logging.info("Searching for top users for {0}".format(term))
 
     # encode the query for use in a url
-    query_url = "https://api.twitter.com/1.1/users/search.json{0}".format(query_params)
+    query_url = "{0}/users/search.json{1}".format(twitter_settings.api_url, query_params)
 
     logging.debug("Twitter API call: {0}".format(query_url))
     json_data = twitterreq(query_url, "GET")
+    if json_data is None:
+        return None
     logging.info("Searching for {0} completed".format(term))
 
     # save the results
     users = json_data
+    db.insert_users(db_con, users, user_group)
 
     for user in users:
-        db.insert_user(db_con, user, user_group)
         if "screen_name" in user and user["screen_name"]:
             print("{0}:{1}".format(user["screen_name"], user_group))
 
@@ -155,28 +319,33 @@ def search_top_users(term, user_group, db_con,
 
 
 def search_user_tweets(screen_name, tweet_group, db_con,
-                       search_count=twitter_settings.max_user_timeline_count):
-    """ Searches for the top users matching a specific term, and stores
-        them in the database. Use search_users for users currently tweeting
-        about a specific topic
-
-        returns a list of user objects
+                       search_count=twitter_settings.max_user_timeline_count, since_id=None, tweet_filters=None,
+                       commit=True):
+    """ Searches for the tweets posted by a user, and stores them in the database.
+        If since_id is given, only tweets newer than that id are returned. If tweet_filters
+        are given, only the tweets which pass them are stored. If commit is False the
+        caller commits the tweets, e.g. with the job ledger entry
+
+        returns a list of the tweet objects found, including any which were filtered out,
+        or None if a shutdown was requested before the search was made
     """
     query_params = "?screen_name={0}&count={1}".format(screen_name, search_count)
+    if since_id:
+        query_params += "&since_id={0}".format(since_id)
 
     logging.info("Searching for tweets by {0}".format(screen_name))
 
     # encode the query for use in a url
-    query_url = "https://api.twitter.com/1.1/statuses/user_timeline.json{0}".format(query_params)
+    query_url = "{0}/statuses/user_timeline.json{1}".format(twitter_settings.api_url, query_params)
 
     logging.debug("Twitter API call: {0}".format(query_url))
-    json_data = twitterreq(query_url, "GET")
+    json_data = twitterreq(query_url, "GET", statuses=True)
+    if json_data is None:
+        return None
 
     # save the results
     tweets = json_data
-
-    for tweet in tweets:
-        db.insert_tweet(db_con, tweet, tweet_group)
+    db.insert_tweets(db_con, filters.filter_tweets(tweets, tweet_filters), tweet_group, commit)
 
     logging.info("Results written to database")
     return tweets
@@ -186,184 +355,212 @@ def search_home_timeline(tweet_group, db_con,
                          search_count=twitter_settings.max_home_timeline_count):
     """ Gets all the tweets posted by the authenticating user
     """
-    query_params = "?count={1}".format(search_count)
+    query_params = "?count={0}".format(search_count)
     logging.info("Searching for your home timeline")
 
     # encode the query for use in a url
-    query_url = "https://api.twitter.com/1.1/statuses/home_timeline.json{0}".format(query_params)
+    query_url = "{0}/statuses/home_timeline.json{1}".format(twitter_settings.api_url, query_params)
 
     logging.debug("Twitter API call: {0}".format(query_url))
-    json_data = twitterreq(query_url, "GET")
+    json_data = twitterreq(query_url, "GET", statuses=True)
+    if json_data is None:
+        return None
 
     # save the results
     tweets = json_data
-
-    for tweet in tweets:
-        db.insert_tweet(db_con, tweet, tweet_group)
+    db.insert_tweets(db_con, tweets, tweet_group)
 
     logging.info("Results written to database")
     return tweets
 
 
-def search_multiple_terms(filename, db_con, no_RT=False,
-                          rate_limit=twitter_settings.multiple_search_limit):
+# the error code users/lookup returns when none of the users were found
+_no_user_matches_code = 17
+
+
+def _no_user_matches(json_data):
+    """ returns True if the response is the error returned when none of the users were found
+    """
+    return isinstance(json_data, dict) and \
+        any(error.get("code") == _no_user_matches_code for error in json_data.get("errors", []))
+
+
+def lookup_users(user_ids):
+    """ gets the profiles of up to max_users_lookup_count users in one request.
+        Users which are suspended or deleted are left out
+
+        returns a list of user objects, or None if a shutdown was requested before
+        the lookup was made. Raises an exception if the API returns any other error
+    """
+    query_url = "{0}/users/lookup.json".format(twitter_settings.api_url)
+    logging.debug("Twitter API call: {0} for {1} users".format(query_url, len(user_ids)))
+    json_data = twitterreq(query_url, "POST", {"user_id": ",".join(user_ids)})
+    if json_data is None:
+        return None
+
+    if isinstance(json_data, list):
+        return json_data
+    if _no_user_matches(json_data):
+        logging.debug("No users found: {0}".format(json_data))
+        return []
+    metrics.increment("api_errors_total", endpoint="users/lookup")
+    raise Exception("Error looking up users: {0}".format(json_data))
+
+
+def enrich_users(db_con, user_group="tweet_authors", ttl=None):
+    """ looks up the profiles of tweet authors who aren't in the users table, and
+        refreshes profiles which were looked up more than ttl seconds ago. Users are
+        looked up in batches, so each request gets up to max_users_lookup_count profiles
+
+        new users are stored in the user_group. returns the number of users looked up
+    """
+    install_ctrl_c_handler()
+    if ttl is None:
+        ttl = twitter_settings.user_refresh_ttl
+    user_ids = db.get_users_to_look_up(db_con, int(time.time()) - ttl)
+    logging.info("Looking up {0} users".format(len(user_ids)))
+
+    batch_size = twitter_settings.max_users_lookup_count
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        users = None if shutdown_requested else lookup_users(batch)
+        if users is None:
+            logging.info("Stopping lookups, run enrich-users again to continue")
+            return start
+        db.store_user_lookups(db_con, batch, users, user_group, int(time.time()))
+
+    logging.info("Results written to database")
+    return len(user_ids)
+
+
+def search_multiple_terms(filename, db_con, no_RT=False, resume=False):
     """ opens a file, which contains one search term per line,
-        and runs a search for each term
+        and runs a search for each term. Searches only wait for the rate limit
+        when every credential has used up its requests
 
-        rate limit sets the number of terms what will be searched before waiting
-        15 mins for the next window
+        progress is recorded in the database, so if resume is True, terms which were
+        searched by a previous run with the same file are skipped
     """
-    with open(filename) as f:
-        # number of terms we've searched for
-        n_requests = 0
-        for line in f.readlines():
-            # split the line into a query and group
-            # check the line to see if it's formatted correctly
-            if len(line.split(":")) != 2:
-                raise Exception("Error in search term \n {0} \n Line must be formatted as <term>:<group>")
-            [term, group] = line.split(":")
-            if group.endswith("\n"):
-                group = group[:-1]
-
-            search_tweets(term, group, db_con, no_RT)
-
-            n_requests += 1
-            if n_requests >= rate_limit:
-                logging.info("Sleeping for 15 mins to avoid rate limiting")
-                time.sleep(900)
-                n_requests = 0
-
-
-def search_multiple_users(filename, db_con,
-                          rate_limit=twitter_settings.multiple_search_limit):
+    install_ctrl_c_handler()
+    job_id = _job_id("search-tweets", filename)
+    completed = _start_job(db_con, job_id, resume)
+
+    for term, group, tweet_filters in search_file.read_search_file(filename):
+        if shutdown_requested:
+            logging.info("Stopping search, use --resume to continue")
+            return
+        if (term, group) in completed:
+            continue
+
+        # the tweets are committed with the ledger entry, so a unit is never recorded
+        # without its tweets or stored twice
+        tweets = search_tweets(term, group, db_con, no_RT, tweet_filters=tweet_filters, commit=False)
+        if tweets is None:
+            logging.info("Stopping search, use --resume to continue")
+            return
+        db.complete_job_unit(db_con, job_id, term, group)
+
+
+def search_multiple_users(filename, db_con, resume=False):
     """ opens a file, which contains one search term per line,
-        and runs a search for each term
+        and runs a search for each term. Searches only wait for the rate limit
+        when every credential has used up its requests
 
-        rate limit sets the number of terms what will be searched before waiting
-        15 mins for the next window
+        progress is recorded in the database, so if resume is True, users which were
+        searched by a previous run with the same file are skipped
     """
-    with open(filename) as f:
-        # number of users we've searched for
-        n_requests = 0
-        for line in f.readlines():
-            # split the line into a query and group
-            # check the line to see if it's formatted correctly
-            if len(line.split(":")) != 2:
-                raise Exception("Error in search term \n {0} \n Line must be formatted as <term>:<group>")
-            [term, group] = line.split(":")
-            if group.endswith("\n"):
-                group = group[:-1]
-
-            search_user_tweets(term, group, db_con)
-            n_requests += 1
-
-            if n_requests >= rate_limit:
-                logging.info("Sleeping for 15 mins to avoid rate limiting")
-                time.sleep(900)
-                n_requests = 0
-
-
-def search_suggested_users(db_con, rate_limit=twitter_settings.multiple_user_sugg_limit):
+    install_ctrl_c_handler()
+    job_id = _job_id("search-user-tweets", filename)
+    completed = _start_job(db_con, job_id, resume)
+
+    for term, group, tweet_filters in search_file.read_search_file(filename):
+        if shutdown_requested:
+            logging.info("Stopping search, use --resume to continue")
+            return
+        if (term, group) in completed:
+            continue
+
+        tweets = search_user_tweets(term, group, db_con, tweet_filters=tweet_filters, commit=False)
+        if tweets is None:
+            logging.info("Stopping search, use --resume to continue")
+            return
+        db.complete_job_unit(db_con, job_id, term, group)
+
+
+def search_suggested_users(db_con, resume=False):
     logging.info("Getting suggested users")
+    install_ctrl_c_handler()
+    job_id = "search-suggested-users"
+    completed = _start_job(db_con, job_id, resume)
 
     # define the query url to get the suggestion categories
-    query_url = "https://api.twitter.com/1.1/users/suggestions.json"
+    query_url = "{0}/users/suggestions.json".format(twitter_settings.api_url)
     logging.debug("Twitter API call: {0}".format(query_url))
     json_data = twitterreq(query_url, "GET")
+    if json_data is None:
+        return []
 
     # get the suggestion slugs (i.e. suggested categories)
     slugs = [d["slug"] for d in json_data]
 
     # get the users for each slug
-    n_requests = 0
     for slug in slugs:
+        if shutdown_requested:
+            logging.info("Stopping search, use --resume to continue")
+            break
+        if (slug, slug) in completed:
+            continue
+
         # define the query url to get the users
-        query_url = "https://api.twitter.com/1.1/users/suggestions/{0}.json".format(slug)
+        query_url = "{0}/users/suggestions/{1}.json".format(twitter_settings.api_url, slug)
         logging.debug("Twitter API call: {0}".format(query_url))
         json_data = twitterreq(query_url, "GET")
+        if json_data is None:
+            logging.info("Stopping search, use --resume to continue")
+            break
 
         if "users" not in json_data:
             raise Exception("JSON data has no users: {0}".format(json_data))
         users = json_data["users"]
+        db.insert_users(db_con, users, slug, commit=False)
+        db.complete_job_unit(db_con, job_id, slug, slug)
 
         for user in users:
-            db.insert_user(db_con, user, slug)
             if "screen_name" in user and user["screen_name"]:
                 print("{0}:{1}".format(user["screen_name"], slug))
 
-        n_requests += 1
-        if n_requests >= rate_limit:
-                logging.info("Sleeping for 15 mins to avoid rate limiting")
-                time.sleep(900)
-                n_requests = 0
-
     logging.info("Results written to database")
     return slugs
 
 
-def search_trends(WOEID, trend_group):
-    """ finds all the hashtags for the given WOEID then runs a search on
-        each of them
+def credential_count():
+    """ returns the number of credentials requests are spread over
     """
+    return len(_get_credential_pool().credentials)
+
 
+def get_trends(WOEID):
+    """ returns the names of the current trends for the given WOEID, or None if a
+        shutdown was requested before the trends were fetched
+    """
     logging.info("Getting trends for WOEID {0}".format(WOEID))
 
     # encode the query for use in a url
-    query_url = "https://api.twitter.com/1.1/trends/place.json?id={0}".format(WOEID)
+    query_url = "{0}/trends/place.json?id={1}".format(twitter_settings.api_url, WOEID)
 
     logging.debug("Twitter API call: {0}".format(query_url))
     json_data = twitterreq(query_url, "GET")
+    if json_data is None:
+        return None
 
-    # For each trend, output a line in the format <search_query>:<WOEID>_<trend name>
     # the data returned is in a single-element list for some reason
-    for trend in json_data[0]["trends"]:
-        if "name" in trend and trend["name"]:
-            print("{0}:{1}".format(trend["name"], trend_group))
+    return [trend["name"] for trend in json_data[0]["trends"]
+            if "name" in trend and trend["name"]]
 
 
-def dump_tweets(db_con, group=None, filename=None, report_format="csv"):
-    """ writes the tweets to the reports folder.
-        format must be one of csv or json
-    """
-    tweets, header = db.get_tweets(db_con, group)
-
-    # set a default filename in the reports directory if none is provided
-    if filename is None:
-        filename = os.path.join("reports", "tweets.{0}".format(report_format))
-
-    with open(filename, "wb") as f:
-        if report_format == "json":
-            f.write(json.dumps(tweets))
-
-        elif report_format == "csv":
-            writer = csv.writer(f, delimiter=",")
-
-            writer.writerow(["screen_name"] + header)
-            for tweet in tweets:
-                writer.writerow([tweet["user"]["screen_name"]] + [tweet[k].encode("utf-8") for k in header])
-        else:
-            raise Exception("Format must be csv or json")
-
-
-def dump_users(db_con, group=None, filename=None, report_format="csv"):
-    """ writes the tweets to the reports folder.
-        format must be one of csv or json
+def search_trends(WOEID, trend_group):
+    """ finds all the hashtags for the given WOEID and outputs them in the
+        <term>:<group> format used by search-tweets
     """
-    users, header = db.get_users(db_con, group)
-
-    # set a default filename in the reports directory if none is provided
-    if filename is None:
-        filename = os.path.join("reports", "tweets.{0}".format(report_format))
-
-    with open(filename, "wb") as f:
-        if report_format == "json":
-            f.write(json.dumps(users))
-
-        elif report_format == "csv":
-            writer = csv.writer(f, delimiter=",")
-
-            writer.writerow(header)
-            for user in users:
-                writer.writerow([user[k].encode("utf-8") for k in header])
-        else:
-            raise Exception("Format must be csv or json")
+    for name in get_trends(WOEID) or []:
+        print("{0}:{1}".format(name, trend_group))
@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+import unittest
+from lib import database as db
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """ gives each test its own new database in a temporary directory, which is
+        closed and removed after the test
+    """
+    def setUp(self):
+        self.tmp_dir_path = tempfile.mkdtemp()
+        self.db_filename = os.path.join(self.tmp_dir_path, "test.db")
+        db.reset(self.db_filename, lambda x: "yes")
+        self.con = db.open_db_connection(self.db_filename)
+
+    def tearDown(self):
+        self.con.close()
+        shutil.rmtree(self.tmp_dir_path)
+
+    def reopen(self):
+        """ closes the database and opens it again
+        """
+        db.close_db_connection(self.con)
+        self.con = db.open_db_connection(self.db_filename)
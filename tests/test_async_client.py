@@ -0,0 +1,105 @@
+import sys
+import unittest
+from lib import database as db
+from lib import metrics
+from benchmarks import fake_api
+from tests.database_case import DatabaseTestCase
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    from lib import async_client
+else:
+    async_client = None
+
+_credential = {"access_token_key": "token", "access_token_secret": "token_secret",
+               "consumer_key": "consumer", "consumer_secret": "consumer_secret"}
+
+
+@unittest.skipIf(async_client is None, "the async client needs python 3.7")
+class TestAsyncClient(DatabaseTestCase):
+    def test_search_terms(self):
+        """ check that concurrent searches are batched into the database
+        """
+        with fake_api.FakeTwitterAPI() as api:
+            client = async_client.AsyncClient([_credential], api.url, max_connections=3)
+            sink = async_client.DatabaseSink(self.con, batch_size=50)
+            searches = [("#fun", "good_times"), ("#winning", "good_times"), ("boring", "bad_times")]
+            n_tweets = asyncio.run(async_client.search_terms(client, searches, sink, pages=2))
+
+        self.assertEqual(n_tweets, 3 * 2 * 100)
+        self.assertEqual(len(api.requests), 6)
+        tweets, _ = db.get_tweets(self.con, "bad_times")
+        self.assertEqual(len(tweets), 200)
+        self.assertTrue(all(tweet["tweet_text"].startswith("boring") for tweet in tweets))
+
+    def test_sinks(self):
+        """ check the queue and callback sinks, and requests signed with a body
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        queue = asyncio.Queue()
+        callback_items = []
+        try:
+            with fake_api.FakeTwitterAPI() as api:
+                client = async_client.AsyncClient([_credential], api.url)
+                loop.run_until_complete(async_client.collect(client.lookup_users(["12", "34", "56"]),
+                                                             async_client.QueueSink(queue), "looked_up"))
+                sink = async_client.CallbackSink(lambda group, items: callback_items.extend(
+                    (group, item["id_str"]) for item in items))
+                loop.run_until_complete(async_client.collect(client.search_user_tweets("me", count=5),
+                                                             sink, "mine"))
+                trends = loop.run_until_complete(client.get_trends(1))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        queue_items = [queue.get_nowait() for _ in range(queue.qsize())]
+        self.assertEqual([(group, user["id_str"]) for group, user in queue_items],
+                         [("looked_up", "12"), ("looked_up", "34"), ("looked_up", "56")])
+        self.assertEqual(len(callback_items), 5)
+        self.assertTrue("#python" in trends)
+
+    def test_lookup_errors(self):
+        """ check that finding none of the users is an empty result, but other errors are raised
+        """
+        sink = async_client.CallbackSink(lambda group, items: None)
+        with fake_api.FakeTwitterAPI() as api:
+            client = async_client.AsyncClient([_credential], api.url)
+            self.assertEqual(asyncio.run(async_client.collect(client.lookup_users(["deleted"]), sink, "users")), 0)
+
+            client = async_client.AsyncClient([_credential], api.url + "/missing")
+            with self.assertRaises(Exception) as context:
+                asyncio.run(async_client.collect(client.lookup_users(["12"]), sink, "users"))
+        self.assertTrue("Sorry, that page does not exist" in str(context.exception))
+
+    def test_timeout(self):
+        """ check that searches which time out are counted as errors and skipped
+        """
+        errors = metrics.get_counter("api_errors_total", endpoint="search/tweets")
+        with fake_api.FakeTwitterAPI(latency=0.5) as api:
+            client = async_client.AsyncClient([_credential], api.url, timeout=0.1)
+            sink = async_client.CallbackSink(lambda group, items: None)
+            n_tweets = asyncio.run(async_client.search_terms(client, [("#slow", "group"), ("#slower", "group")],
+                                                             sink))
+
+        self.assertEqual(n_tweets, 0)
+        self.assertEqual(metrics.get_counter("api_errors_total", endpoint="search/tweets"), errors + 2)
+
+    def test_rate_limit(self):
+        """ check that requests are spread over the credentials, within their rate limits
+        """
+        credentials = [dict(_credential, consumer_key="consumer_{0}".format(i)) for i in range(2)]
+        with fake_api.FakeTwitterAPI(rate_limit=2) as api:
+            client = async_client.AsyncClient(credentials, api.url)
+            sink = async_client.CallbackSink(lambda group, items: None)
+            searches = [("term_{0}".format(i), "group") for i in range(4)]
+            n_tweets = asyncio.run(async_client.search_terms(client, searches, sink))
+
+        self.assertEqual(n_tweets, 400)
+        self.assertEqual(len(api.requests), 4)
+        self.assertEqual(client.pool.remaining(0, "search/tweets"), 0)
+        self.assertEqual(client.pool.remaining(1, "search/tweets"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
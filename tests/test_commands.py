@@ -0,0 +1,52 @@
+import sys
+import unittest
+import twerpy
+from lib import database as db
+from benchmarks import fake_api
+from benchmarks import run
+from data import twitter_settings
+from tests.database_case import DatabaseTestCase
+
+
+@unittest.skipIf(sys.version_info[0] > 2, "tweet_handler needs python 2")
+class TestCommands(DatabaseTestCase):
+    def run_command(self, argv, api_path=""):
+        """ runs a twerpy command on the test database against a fake API. Requests
+            are made to api_path under the API url
+        """
+        run._import_tweet_handler()
+        with fake_api.FakeTwitterAPI() as api:
+            api_url = twitter_settings.api_url
+            twitter_settings.api_url = api.url + api_path
+            try:
+                twerpy.main(argv + ["-d", self.db_filename])
+            finally:
+                twitter_settings.api_url = api_url
+        return api.requests
+
+    def test_home_timeline(self):
+        """ check that get-home-timeline stores the tweets in the given group
+        """
+        requests = self.run_command(["get-home-timeline", "-g", "home"])
+
+        self.assertEqual(requests, ["/1.1/statuses/home_timeline.json?count={0}".format(
+            twitter_settings.max_home_timeline_count)])
+        tweets, _ = db.get_tweets(self.con, "home")
+        self.assertEqual(len(tweets), twitter_settings.max_home_timeline_count)
+
+    def test_enrich_users(self):
+        """ check that looked up users are stored, and nothing is recorded when the lookup fails
+        """
+        db.insert_tweets(self.con, [{"id_str": "1", "user": {"id_str": "10"}},
+                                    {"id_str": "2", "user": {"id_str": "11"}}], "fun")
+        with self.assertRaises(Exception):
+            self.run_command(["enrich-users"], api_path="/missing")
+        self.assertEqual(sorted(db.get_users_to_look_up(self.con, 0)), ["10", "11"])
+
+        self.run_command(["enrich-users"])
+        self.assertEqual(db.get_users_to_look_up(self.con, 0), [])
+        self.assertEqual(sorted(db.get_screen_names(self.con)), ["10", "11"])
+
+
+if __name__ == "__main__":
+    unittest.main()
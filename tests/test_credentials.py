@@ -0,0 +1,80 @@
+import types
+import unittest
+from lib import credentials
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCredentialPool(unittest.TestCase):
+    def setup(self, n_credentials=2):
+        self.clock = FakeClock()
+        self.credentials = [{"access_token_key": "token_{0}".format(i),
+                             "access_token_secret": "token_secret_{0}".format(i),
+                             "consumer_key": "consumer_{0}".format(i),
+                             "consumer_secret": "consumer_secret_{0}".format(i)}
+                            for i in range(n_credentials)]
+        self.pool = credentials.CredentialPool(self.credentials, window=900, clock=self.clock)
+
+    def test_spread(self):
+        """ check that requests are spread over the credentials until they have all been used
+        """
+        self.setup()
+
+        limit = credentials.endpoint_rate_limit("trends/place")
+        used = [self.pool.acquire("trends/place") for _ in range(2 * limit)]
+        self.assertEqual(used.count(0), limit)
+        self.assertEqual(used.count(1), limit)
+
+        self.assertEqual(self.pool.acquire("trends/place"), None)
+        self.assertEqual(self.pool.wait_time("trends/place"), 900)
+        # other endpoints have their own limits
+        self.assertTrue(self.pool.acquire("search/tweets") is not None)
+
+        # both credentials can be used again in the next window
+        self.clock.now += 900
+        self.assertEqual(self.pool.wait_time("trends/place"), 0)
+        self.assertTrue(self.pool.acquire("trends/place") is not None)
+
+    def test_headers(self):
+        """ check the rate limit can be set from the response headers
+        """
+        self.setup()
+
+        self.pool.update(0, "search/tweets", 0, 1300)
+        self.pool.exhausted(1, "search/tweets", 1100)
+        self.assertEqual(self.pool.acquire("search/tweets"), None)
+        self.assertEqual(self.pool.wait_time("search/tweets"), 100)
+
+        self.clock.now = 1100
+        self.assertEqual(self.pool.acquire("search/tweets"), 1)
+        self.assertEqual(self.pool.remaining(0, "search/tweets"), 0)
+
+    def test_load_credentials(self):
+        """ check credentials are read from either form of the user settings
+        """
+        self.setup()
+
+        user_settings = types.ModuleType("user_settings")
+        user_settings.access_token_key = "token"
+        user_settings.access_token_secret = "token_secret"
+        user_settings.consumer_key = "consumer"
+        user_settings.consumer_secret = "consumer_secret"
+        self.assertEqual(credentials.load_credentials(user_settings),
+                         [{"access_token_key": "token", "access_token_secret": "token_secret",
+                           "consumer_key": "consumer", "consumer_secret": "consumer_secret"}])
+
+        user_settings.credentials = self.credentials
+        self.assertEqual(credentials.load_credentials(user_settings), self.credentials)
+
+        user_settings.credentials = [{"consumer_key": "consumer"}]
+        self.assertRaises(Exception, credentials.load_credentials, user_settings)
+
+
+if __name__ == "__main__":
+    unittest.main()
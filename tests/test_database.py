@@ -1,25 +1,21 @@
 import unittest
 from lib import database as db
+from tests.database_case import DatabaseTestCase
 
 
-class TestDatabaseInit(unittest.TestCase):
-    def setup(self):
-        db.reset("test.db", lambda x: "yes")
-        self.con = db.open_db_connection("test.db")
-
+class TestDatabaseInit(DatabaseTestCase):
     def test_reset(self):
         """ check that the database has the correct tables after initialisation,
             and that they are empty
         """
-        self.setup()
-
         # test that the tables are created correctly
         tweets, tweets_header = db.get_tweets(self.con)
         users, users_header = db.get_users(self.con)
 
         self.assertEqual(tweets_header,
                          ["id_str", "tweet_text", "created_at", "favourite_count",
-                          "retweet_count", "user_id_str", "tweet_group"])
+                          "retweet_count", "user_id_str", "tweet_group", "created_ts",
+                          "lang", "longitude", "latitude", "place_country"])
         self.assertEqual(users_header,
                          ["id_str", "name", "screen_name", "created_at", "description",
                           "followers_count", "friends_count", "statuses_count", "user_group"])
@@ -29,10 +25,9 @@ class TestDatabaseInit(unittest.TestCase):
         self.assertEqual(len(users), 0)
 
 
-class TestDatabaseInsert(unittest.TestCase):
-    def setup(self):
-        db.reset("test.db", lambda x: "yes")
-        self.con = db.open_db_connection("test.db")
+class TestDatabaseInsert(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
 
         self.example_tweets = [{"id_str": "tweet_id_101",
                                 "user": {"id_str": "usr_id_111"},
@@ -67,23 +62,21 @@ class TestDatabaseInsert(unittest.TestCase):
     def test_tweet_insert(self):
         """ tests that multiple tweets can be written and read back
         """
-        self.setup()
-
         # insert and read back a tweet, checking if it is what we expect
         # the tweet_group should be added, and some of the field names have changed
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[0], "group_1"))
 
         check_tweet = {"id_str": "tweet_id_101", "user_id_str": "usr_id_111",
                        "tweet_text": "I'm a tweet!", "created_at": "Mon Sep 24 03:35:21 +0000 2012",
-                       "tweet_group": "group_1", "retweet_count": None, "favourite_count": None}
+                       "tweet_group": "group_1", "retweet_count": None, "favourite_count": None,
+                       "created_ts": 1348457721, "lang": None, "longitude": None, "latitude": None,
+                       "place_country": None}
         tweets, _ = db.get_tweets(self.con)
         self.assertEqual(check_tweet, tweets[0])
 
     def test_user_insert(self):
         """ tests that multiple tweets can be written and read back
         """
-        self.setup()
-
         # insert and read back a user, checking if it is what we expect
         # the user_group should be added
         self.assertTrue(db.insert_user(self.con, self.example_users[0], "group_1"))
@@ -106,24 +99,22 @@ class TestDatabaseInsert(unittest.TestCase):
     def test_persistence(self):
         """ check that a tweet exists after the database is closed then opened
         """
-        self.setup()
         self.test_tweet_insert()
 
         # close then open
-        db.close_db_connection(self.con)
-        self.con = db.open_db_connection("test.db")
+        self.reopen()
 
         check_tweet = {"id_str": u"tweet_id_101", "user_id_str": u"usr_id_111",
                        "tweet_text": u"I'm a tweet!", "created_at": u"Mon Sep 24 03:35:21 +0000 2012",
-                       "tweet_group": u"group_1", "retweet_count": None, "favourite_count": None}
+                       "tweet_group": u"group_1", "retweet_count": None, "favourite_count": None,
+                       "created_ts": 1348457721, "lang": None, "longitude": None, "latitude": None,
+                       "place_country": None}
         tweets, _ = db.get_tweets(self.con)
         self.assertEqual(check_tweet, tweets[0])
 
     def test_multiple_insert(self):
         """ test that multiple tweets and users can be added
         """
-        self.setup()
-
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[0], "group_1"))
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[1], "group_2"))
         tweets, _ = db.get_tweets(self.con)
@@ -137,8 +128,6 @@ class TestDatabaseInsert(unittest.TestCase):
     def test_uniqueness(self):
         """ check that integrity constraints are enforced
         """
-        self.setup()
-
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[1], "group"))
         # this one should not be inserted, since it's a duplicate of the previous one
         self.assertFalse(db.insert_tweet(self.con, self.example_tweets[1], "group"))
@@ -148,10 +137,9 @@ class TestDatabaseInsert(unittest.TestCase):
         self.assertFalse(db.insert_user(self.con, self.example_users[1], "group"))
 
 
-class TestTweetGroups(unittest.TestCase):
-    def setup(self):
-        db.reset("test.db", lambda x: "yes")
-        self.con = db.open_db_connection("test.db")
+class TestTweetGroups(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
 
         self.example_tweets = [{"id_str": "tweet_id_101",
                                 "user": {"id_str": "usr_id_111"},
@@ -184,14 +172,11 @@ class TestTweetGroups(unittest.TestCase):
                                "created_at": "Wed May 23 06:01:13 +0000 2007"}]
 
     def test_no_groups(self):
-        self.setup()
         # there should be no search groups
         self.assertEqual(len(db.get_tweet_groups(self.con)), 0)
         self.assertEqual(len(db.get_user_groups(self.con)), 0)
 
     def test_multiple_groups(self):
-        self.setup()
-
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[0], "tweet_group_1"))
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[0], "tweet_group_2"))
         self.assertTrue(db.insert_tweet(self.con, self.example_tweets[1], "tweet_group_2"))
@@ -214,5 +199,257 @@ class TestTweetGroups(unittest.TestCase):
         self.assertTrue("user_group_2" in user_groups)
 
 
+class TestBatchInsert(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.example_tweets = [{"id_str": "tweet_id_101",
+                                "user": {"id_str": "usr_id_111"},
+                                "text": "I'm a tweet!",
+                                "created_at": "Mon Sep 24 03:35:21 +0000 2012"},
+                               {"id_str": "tweet_id_102",
+                                "user": {"id_str": "usr_id_111"},
+                                "text": "I'm another tweet!",
+                                "created_at": "Mon Sep 24 03:35:22 +0000 2012"}]
+
+    def test_batch_insert(self):
+        """ check that a batch of tweets is inserted and duplicates are skipped
+        """
+        self.assertEqual(db.insert_tweets(self.con, self.example_tweets, "group"), 2)
+        # both tweets are duplicates now
+        self.assertEqual(db.insert_tweets(self.con, self.example_tweets, "group"), 0)
+        self.assertEqual(db.insert_tweets(self.con, self.example_tweets[:1], "other_group"), 1)
+
+        tweets, _ = db.get_tweets(self.con)
+        self.assertEqual(len(tweets), 3)
+
+
+class TestJobLedger(DatabaseTestCase):
+    def test_complete_units(self):
+        """ check that completed units are recorded and survive reopening the database
+        """
+        self.assertEqual(db.get_completed_job_units(self.con, "job"), set())
+        db.complete_job_unit(self.con, "job", "#fun", "good_times")
+        db.complete_job_unit(self.con, "job", "boring", "bad_times")
+        db.complete_job_unit(self.con, "other_job", "#sad", "bad_times")
+
+        self.reopen()
+
+        self.assertEqual(db.get_completed_job_units(self.con, "job"),
+                         set([("#fun", "good_times"), ("boring", "bad_times")]))
+
+    def test_commit_with_unit(self):
+        """ check that tweets stored without committing are committed with the unit,
+            and are lost with it if the unit isn't completed
+        """
+        db.insert_tweets(self.con, [{"id_str": "1"}], "good_times", commit=False)
+        self.con.rollback()
+        db.insert_tweets(self.con, [{"id_str": "2"}], "good_times", commit=False)
+        db.complete_job_unit(self.con, "job", "#fun", "good_times")
+        self.con.rollback()
+
+        tweets, _ = db.get_tweets(self.con)
+        self.assertEqual([t["id_str"] for t in tweets], ["2"])
+        self.assertEqual(db.get_completed_job_units(self.con, "job"), set([("#fun", "good_times")]))
+
+    def test_reset_job(self):
+        """ check that resetting a job only clears that job's progress
+        """
+        db.complete_job_unit(self.con, "job", "#fun", "good_times")
+        db.complete_job_unit(self.con, "other_job", "#sad", "bad_times")
+        db.reset_job(self.con, "job")
+
+        self.assertEqual(db.get_completed_job_units(self.con, "job"), set())
+        self.assertEqual(len(db.get_completed_job_units(self.con, "other_job")), 1)
+
+
+class TestSearchQueue(DatabaseTestCase):
+    def test_due_searches(self):
+        """ check that due searches are returned highest priority first, and that
+            expired searches are left out
+        """
+        self.assertTrue(db.enqueue_search(self.con, "#fun", "good_times", next_due=100))
+        db.enqueue_search(self.con, "#sad", "bad_times", priority=5, next_due=50)
+        db.enqueue_search(self.con, "#later", "good_times", priority=10, next_due=500)
+        db.enqueue_search(self.con, "#old", "good_times", priority=10, expires_at=150)
+
+        searches = db.get_due_searches(self.con, 200, 10)
+        self.assertEqual([s["term"] for s in searches], ["#sad", "#fun"])
+        self.assertEqual(searches[0]["since_id"], None)
+
+        db.update_search(self.con, searches[0], 300, "250075927172759552")
+        self.assertEqual([s["term"] for s in db.get_due_searches(self.con, 200, 10)], ["#fun"])
+        self.assertEqual(db.get_due_searches(self.con, 300, 1)[0]["since_id"], "250075927172759552")
+
+        self.assertEqual(db.delete_expired_searches(self.con, 200), 1)
+
+    def test_requeue(self):
+        """ check that queueing a search again keeps the higher priority and later expiry
+        """
+        db.enqueue_search(self.con, "#fun", "good_times", priority=5, expires_at=100)
+        self.assertFalse(db.enqueue_search(self.con, "#fun", "good_times", priority=1, expires_at=200))
+
+        search = db.get_due_searches(self.con, 0, 10)[0]
+        self.assertEqual(search["priority"], 5)
+        self.assertEqual(search["expires_at"], 200)
+
+    def test_add_tweet_columns(self):
+        """ check that tweets stored before the language and location columns were
+            added are kept, and new tweets fill them in
+        """
+        self.con.execute("DROP TABLE tweets")
+        self.con.execute("CREATE TABLE tweets (id_str TEXT, tweet_text TEXT, created_at TEXT, "
+                         "favourite_count INTEGER, retweet_count INTEGER, user_id_str TEXT, "
+                         "tweet_group TEXT, created_ts INTEGER, PRIMARY KEY (id_str, tweet_group))")
+        self.con.execute("INSERT INTO tweets VALUES ('1', 'old', NULL, NULL, NULL, NULL, 'fun', NULL)")
+        self.reopen()
+
+        db.insert_tweets(self.con, [{"id_str": "2", "lang": "fr",
+                                     "place": {"country_code": "FR",
+                                               "bounding_box": {"coordinates": [[[2.0, 48.0], [2.0, 49.0],
+                                                                                 [3.0, 49.0], [3.0, 48.0]]]}}}],
+                         "fun")
+        tweets, _ = db.get_tweets(self.con, "fun")
+        self.assertEqual([(t["id_str"], t["lang"], t["longitude"], t["latitude"], t["place_country"])
+                          for t in tweets],
+                         [("1", None, None, None, None), ("2", "fr", 2.5, 48.5, "FR")])
+        indexes = [row[1] for row in self.con.execute("PRAGMA index_list(tweets)")]
+        self.assertTrue("tweets_lang" in indexes and "tweets_location" in indexes)
+
+    def test_update_trends(self):
+        """ check that only trends which aren't active are returned as new
+        """
+        self.assertEqual(db.update_trends(self.con, "1", ["#a", "#b"], 100, 50), ["#a", "#b"])
+        self.assertEqual(db.update_trends(self.con, "1", ["#b", "#c"], 120, 50), ["#c"])
+        self.assertEqual(db.update_trends(self.con, "2", ["#b"], 120, 50), ["#b"])
+        # #a was last seen too long ago to still be active
+        self.assertEqual(db.update_trends(self.con, "1", ["#a", "#b"], 160, 50), ["#a"])
+
+
+class TestUserLookups(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        db.insert_tweets(self.con, [{"id_str": "1", "user": {"id_str": "10"}},
+                                    {"id_str": "2", "user": {"id_str": "11"}},
+                                    {"id_str": "3", "user": {"id_str": "11"}},
+                                    {"id_str": "4", "user": {"id_str": "12"}}], "fun")
+        db.insert_users(self.con, [{"id_str": "12", "screen_name": "known"}], "top_users")
+
+    def test_users_to_look_up(self):
+        """ check that authors missing from the users table are looked up once,
+            until their lookup is older than the refresh time
+        """
+        self.assertEqual(sorted(db.get_users_to_look_up(self.con, 0)), ["10", "11"])
+
+        # user 11 wasn't returned by the lookup, but isn't looked up again
+        added = db.store_user_lookups(self.con, ["10", "11"], [{"id_str": "10", "screen_name": "ten"}],
+                                      "tweet_authors", 100)
+        self.assertEqual(added, 1)
+        self.assertEqual(db.get_users_to_look_up(self.con, 99), [])
+        self.assertEqual(sorted(db.get_users_to_look_up(self.con, 100)), ["10", "11"])
+        self.assertEqual(db.get_screen_names(self.con), {"10": "ten", "12": "known"})
+
+    def test_refresh(self):
+        """ check that a refreshed profile updates the user in every group
+        """
+        db.insert_users(self.con, [{"id_str": "12", "screen_name": "known"}], "other_users")
+        added = db.store_user_lookups(self.con, ["12"], [{"id_str": "12", "screen_name": "renamed",
+                                                          "followers_count": 5}], "tweet_authors", 100)
+        self.assertEqual(added, 0)
+
+        users, _ = db.get_users(self.con)
+        self.assertEqual(sorted((u["user_group"], u["screen_name"], u["followers_count"]) for u in users),
+                         [("other_users", "renamed", 5), ("top_users", "renamed", 5)])
+
+
+class TestRollups(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.example_tweets = [{"id_str": "1", "created_at": "Mon Sep 24 03:35:21 +0000 2012",
+                                "retweet_count": 2, "favorite_count": 1},
+                               {"id_str": "2", "created_at": "Mon Sep 24 03:35:59 +0000 2012",
+                                "retweet_count": 3},
+                               {"id_str": "3", "created_at": "Mon Sep 24 04:01:00 +0000 2012",
+                                "favorite_count": 5},
+                               {"id_str": "4", "created_at": "not a time"}]
+
+    def test_parse_created_at(self):
+        self.assertEqual(db.parse_created_at("Mon Sep 24 03:35:21 +0000 2012"), 1348457721)
+        self.assertEqual(db.parse_created_at("Mon Sep 24 05:35:21 +0200 2012"), 1348457721)
+        self.assertEqual(db.parse_created_at("yesterday"), None)
+        self.assertEqual(db.parse_created_at(None), None)
+
+    def test_rollups(self):
+        """ check that inserted tweets are counted in their buckets, and duplicates aren't
+        """
+        db.insert_tweets(self.con, self.example_tweets, "fun")
+        db.insert_tweets(self.con, self.example_tweets, "fun")
+        db.insert_tweet(self.con, self.example_tweets[0], "sad")
+
+        hours = [(r["tweet_group"], r["bucket"], r["tweet_count"], r["retweet_count"], r["favourite_count"])
+                 for r in db.get_rollups(self.con, "hour", 0, 2 ** 40)]
+        self.assertEqual(hours, [("fun", 1348455600, 2, 5, 1),
+                                 ("fun", 1348459200, 1, 0, 5),
+                                 ("sad", 1348455600, 1, 2, 1)])
+
+        minutes = db.get_rollups(self.con, "minute", 1348457700, 1348459200, "fun")
+        self.assertEqual([(r["bucket"], r["tweet_count"]) for r in minutes], [(1348457700, 2)])
+        self.assertRaises(ValueError, db.get_rollups, self.con, "week", 0, 1)
+
+    def test_rebuild(self):
+        """ check that rebuilding fills in created_ts for old rows and gives the same rollups
+        """
+        db.insert_tweets(self.con, self.example_tweets, "fun")
+        expected = [db.get_rollups(self.con, name, 0, 2 ** 40) for name, _ in db.rollup_resolutions]
+
+        self.con.execute("UPDATE tweets SET created_ts=NULL")
+        self.assertEqual(db.rebuild_rollups(self.con), 4)
+        self.assertEqual([db.get_rollups(self.con, name, 0, 2 ** 40) for name, _ in db.rollup_resolutions],
+                         expected)
+
+
+class TestGraphEdges(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.example_tweets = [{"id_str": "1", "user": {"id_str": "10"},
+                                "entities": {"user_mentions": [{"id_str": "20"}, {"id_str": "30"}]}},
+                               {"id_str": "2", "user": {"id_str": "20"}, "in_reply_to_user_id_str": "10",
+                                "entities": {"user_mentions": [{"id_str": "10"}]}},
+                               {"id_str": "3", "user": {"id_str": "30"},
+                                "retweeted_status": {"user": {"id_str": "10"}},
+                                "entities": {"user_mentions": [{"id_str": "10"}, {"id_str": "30"}]}},
+                               {"id_str": "4", "user": {"id_str": "40"}}]
+
+    def test_edge_rows(self):
+        self.assertEqual(db._edge_rows(self.example_tweets[1]),
+                         [("2", "20", "10", "mention"), ("2", "20", "10", "reply")])
+        self.assertEqual(db._edge_rows(self.example_tweets[3]), [])
+        self.assertEqual(db._edge_rows({"id_str": "5"}), [])
+
+    def test_graph_edges(self):
+        """ check that edges are stored once per tweet, and counted between numbered users
+        """
+        db.insert_tweets(self.con, self.example_tweets, "fun")
+        db.insert_tweet(self.con, self.example_tweets[0], "sad")
+        self.assertEqual(db.update_graph_nodes(self.con), 3)
+        node_ids = db.get_graph_node_ids(self.con)
+        self.assertEqual(sorted(node_ids.values()), ["10", "20", "30"])
+
+        edges = [(node_ids[s], node_ids[t], n) for s, t, n in db.get_graph_edges(self.con, ["mention", "reply"])]
+        self.assertEqual(sorted(edges), [("10", "20", 1), ("10", "30", 1), ("20", "10", 2), ("30", "10", 1)])
+        edges = [(node_ids[s], node_ids[t], n) for s, t, n in db.get_graph_edges(self.con, ["retweet"])]
+        self.assertEqual(edges, [("30", "10", 1)])
+
+        # node numbers stay the same as users are added
+        db.insert_tweet(self.con, {"id_str": "6", "user": {"id_str": "50"},
+                                   "in_reply_to_user_id_str": "10"}, "fun")
+        self.assertEqual(db.update_graph_nodes(self.con), 4)
+        node_ids[3] = "50"
+        self.assertEqual(db.get_graph_node_ids(self.con), node_ids)
+
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import unittest
+from lib import decoder
+
+
+class TestDecoder(unittest.TestCase):
+    def setup(self):
+        self.tweet = {"id_str": "250075927172759552",
+                      "text": "I'm a tweet!",
+                      "created_at": "Mon Sep 24 03:35:21 +0000 2012",
+                      "retweet_count": 2,
+                      "in_reply_to_status_id_str": None,
+                      "lang": "en",
+                      "place": {"id": "3b77caf94bfc81fe", "full_name": "Los Angeles, CA", "country_code": "US",
+                                "bounding_box": {"type": "Polygon", "coordinates": [[[-118.7, 33.7]]]}},
+                      "entities": {"hashtags": [], "urls": [],
+                                   "user_mentions": [{"id_str": "783214", "screen_name": "twitter"}]},
+                      "user": {"id_str": "6253282",
+                               "screen_name": "twitterapi",
+                               "followers_count": 665829,
+                               "profile_image_url": "http://example.com/image.png"}}
+        self.data = json.dumps({"statuses": [self.tweet],
+                                "search_metadata": {"count": 1}}).encode("utf-8")
+
+    def test_decoders(self):
+        """ check that every installed decoder gives the same result as the standard library
+        """
+        self.setup()
+        name = decoder.decoder_name()
+        try:
+            for decoder_name in decoder.available_decoders():
+                self.assertEqual(decoder.set_decoder(decoder_name), decoder_name)
+                self.assertEqual(decoder.loads(self.data), json.loads(self.data.decode("utf-8")))
+        finally:
+            decoder.set_decoder(name)
+
+    def test_unknown_decoder(self):
+        self.assertRaises(ValueError, decoder.set_decoder, "yaml")
+        self.assertTrue("json" in decoder.available_decoders())
+
+    def test_stored_fields(self):
+        """ check that only the stored fields are kept, for search results and lists of tweets
+        """
+        self.setup()
+
+        check_tweet = {"id_str": "250075927172759552",
+                       "text": "I'm a tweet!",
+                       "created_at": "Mon Sep 24 03:35:21 +0000 2012",
+                       "retweet_count": 2,
+                       "lang": "en",
+                       "place": {"country_code": "US",
+                                 "bounding_box": {"type": "Polygon", "coordinates": [[[-118.7, 33.7]]]}},
+                       "entities": {"user_mentions": [{"id_str": "783214"}]},
+                       "user": {"id_str": "6253282",
+                                "screen_name": "twitterapi",
+                                "followers_count": 665829}}
+        self.assertEqual(decoder.loads_statuses(self.data), {"statuses": [check_tweet]})
+        self.assertEqual(decoder.loads_statuses(json.dumps([self.tweet])), [check_tweet])
+
+        # error responses are returned in full
+        error = {"errors": [{"code": 88, "message": "Rate limit exceeded"}]}
+        self.assertEqual(decoder.loads_statuses(json.dumps(error)), error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import json
+import os
+import unittest
+from lib import database as db
+from lib import dump
+from tests.database_case import DatabaseTestCase
+
+
+class TestDump(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        db.insert_tweets(self.con, [{"id_str": "1", "text": "#fun", "user": {"id_str": "10"}},
+                                    {"id_str": "2", "text": "#sad", "user": {"id_str": "11"}}], "fun")
+        db.insert_users(self.con, [{"id_str": "10", "screen_name": "ten"}], "tweet_authors")
+
+    def test_screen_names(self):
+        """ check that tweets are dumped with the screen names of authors in the users table
+        """
+        try:
+            dump.dump_tweets(self.con, filename="test_tweets.json", report_format="json")
+            with open("test_tweets.json") as f:
+                tweets = json.load(f)
+        finally:
+            os.remove("test_tweets.json")
+
+        self.assertEqual(sorted((t["id_str"], t["screen_name"]) for t in tweets),
+                         [("1", "ten"), ("2", None)])
+
+    def test_timeseries(self):
+        """ check the times of the buckets and the range given
+        """
+        db.insert_tweets(self.con, [{"id_str": "3", "created_at": "Mon Sep 24 03:35:21 +0000 2012"},
+                                    {"id_str": "4", "created_at": "Tue Sep 25 03:35:21 +0000 2012"}], "fun")
+        try:
+            dump.dump_timeseries(self.con, "day", dump.parse_time("2012-09-24"), dump.parse_time("2012-09-25"),
+                                 filename="test_timeseries.json", report_format="json")
+            with open("test_timeseries.json") as f:
+                rollups = json.load(f)
+        finally:
+            os.remove("test_timeseries.json")
+
+        self.assertEqual(rollups, [{"tweet_group": "fun", "time": "2012-09-24 00:00:00", "tweet_count": 1,
+                                    "retweet_count": 0, "favourite_count": 0}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+try:
+    from urllib2 import urlopen, HTTPError
+except ImportError:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+
+from benchmarks import fake_api
+from benchmarks import run
+
+
+class TestFakeAPI(unittest.TestCase):
+    def test_payloads(self):
+        """ check the responses have the fields twerpy uses
+        """
+        with fake_api.FakeTwitterAPI() as api:
+            response = urlopen(api.url + "/search/tweets.json?q=%23fun&count=7")
+            search = json.loads(response.read().decode("utf-8"))
+            timeline = json.loads(urlopen(api.url + "/statuses/user_timeline.json?screen_name=me&count=3")
+                                  .read().decode("utf-8"))
+            users = json.loads(urlopen(api.url + "/users/search.json?q=fun&count=4").read().decode("utf-8"))
+            trends = json.loads(urlopen(api.url + "/trends/place.json?id=1").read().decode("utf-8"))
+            slugs = json.loads(urlopen(api.url + "/users/suggestions.json").read().decode("utf-8"))
+            suggested = json.loads(urlopen(api.url + "/users/suggestions/{0}.json".format(slugs[0]["slug"]))
+                                   .read().decode("utf-8"))
+            looked_up = json.loads(urlopen(api.url + "/users/lookup.json", b"user_id=12%2C34")
+                                   .read().decode("utf-8"))
+
+        self.assertEqual(len(search["statuses"]), 7)
+        self.assertTrue(search["statuses"][0]["text"].startswith("#fun"))
+        self.assertEqual(len(set(tweet["id_str"] for tweet in search["statuses"] + timeline)), 10)
+        self.assertTrue("screen_name" in search["statuses"][0]["user"])
+        self.assertEqual(len(users), 4)
+        self.assertTrue(len(trends[0]["trends"]) > 0)
+        self.assertTrue("users" in suggested)
+        self.assertEqual([user["id_str"] for user in looked_up], ["12", "34"])
+
+    def test_rate_limit(self):
+        """ check the rate limit headers, and that requests are refused once the limit is reached
+        """
+        with fake_api.FakeTwitterAPI(rate_limit=2) as api:
+            first = urlopen(api.url + "/search/tweets.json?q=fun")
+            second = urlopen(api.url + "/search/tweets.json?q=fun")
+            # other endpoints have their own limit
+            other = urlopen(api.url + "/users/search.json?q=fun")
+            try:
+                urlopen(api.url + "/search/tweets.json?q=fun")
+                status = 200
+            except HTTPError as e:
+                status = e.code
+
+        self.assertEqual(first.info().get("x-rate-limit-limit"), "2")
+        self.assertEqual(first.info().get("x-rate-limit-remaining"), "1")
+        self.assertEqual(second.info().get("x-rate-limit-remaining"), "0")
+        self.assertEqual(other.info().get("x-rate-limit-remaining"), "1")
+        self.assertEqual(status, 429)
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_ingest(self):
+        """ check the ingest benchmark runs and reports throughput
+        """
+        tmp_dir_path = tempfile.mkdtemp()
+        try:
+            result = run.bench_ingest(300, tmp_dir_path)
+        finally:
+            shutil.rmtree(tmp_dir_path)
+
+        self.assertEqual(result["rows"], 300)
+        self.assertTrue(result["rows_per_sec"] > 0)
+        self.assertTrue(result["peak_memory_bytes"] > 0)
+
+    def test_compare(self):
+        """ check that the change since the previous run is reported
+        """
+        previous_run = {"commit": "abc1234", "results": {"ingest": {"rows_per_sec": 100.0}}}
+        this_run = {"commit": "def5678", "results": {"ingest": {"rows_per_sec": 90.0},
+                                                     "dump": {"error": "KeyError"}}}
+        lines = run.compare(this_run, previous_run)
+
+        self.assertTrue("(-10.0% vs abc1234)" in lines[1])
+        self.assertTrue("failed" in lines[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from lib import filters
+
+
+class TestFilters(unittest.TestCase):
+    def setup(self):
+        self.tweets = [{"id_str": "1", "lang": "en", "retweet_count": 10,
+                        "user": {"followers_count": 500},
+                        "coordinates": {"type": "Point", "coordinates": [-0.1, 51.5]},
+                        "place": {"country_code": "GB"}},
+                       {"id_str": "2", "lang": "fr", "retweet_count": 0,
+                        "user": {"followers_count": 50},
+                        "place": {"country_code": "FR",
+                                  "bounding_box": {"type": "Polygon",
+                                                   "coordinates": [[[2.2, 48.8], [2.2, 48.9],
+                                                                    [2.4, 48.9], [2.4, 48.8]]]}}},
+                       {"id_str": "3", "lang": "ja", "user": {}}]
+
+    def test_parse(self):
+        parsed = filters.parse_filters("lang=en, fr;min_followers=100;bbox=-10.5,49.8,1.8,60.9;country=gb")
+        self.assertEqual(parsed, {"lang": ["en", "fr"], "min_followers": 100,
+                                  "bbox": [-10.5, 49.8, 1.8, 60.9], "country": ["GB"]})
+        self.assertEqual(filters.parse_filters(filters.format_filters(parsed)), parsed)
+        self.assertEqual(filters.parse_filters(""), {})
+        self.assertEqual(filters.format_filters({}), None)
+
+        self.assertRaises(ValueError, filters.parse_filters, "language=en")
+        self.assertRaises(ValueError, filters.parse_filters, "min_retweets=lots")
+        self.assertRaises(ValueError, filters.parse_filters, "bbox=1,2,3")
+
+    def test_filter_tweets(self):
+        """ check each filter, and that tweets missing a field don't pass its filter
+        """
+        self.setup()
+
+        def kept(text):
+            return [tweet["id_str"] for tweet in filters.filter_tweets(self.tweets, filters.parse_filters(text))]
+
+        self.assertEqual(kept(""), ["1", "2", "3"])
+        self.assertEqual(kept("lang=en,ja"), ["1", "3"])
+        self.assertEqual(kept("country=fr"), ["2"])
+        # western Europe, which the place of tweet 2 is in
+        self.assertEqual(kept("bbox=-10,35,20,60"), ["1", "2"])
+        self.assertEqual(kept("bbox=0,35,20,60"), ["2"])
+        self.assertEqual(kept("min_followers=100"), ["1"])
+        self.assertEqual(kept("min_retweets=0"), ["1", "2", "3"])
+        self.assertEqual(kept("lang=en,fr;min_retweets=1"), ["1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import unittest
+from lib import database as db
+from lib import graph
+from tests.database_case import DatabaseTestCase
+
+
+@unittest.skipIf(graph.np is None, "numpy is not installed")
+class TestGraph(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        # 10 and 20 mention each other, 30 mentions and retweets 10, and 40 replies to 30
+        db.insert_tweets(self.con, [{"id_str": "1", "user": {"id_str": "10"},
+                                     "entities": {"user_mentions": [{"id_str": "20"}]}},
+                                    {"id_str": "2", "user": {"id_str": "20"},
+                                     "entities": {"user_mentions": [{"id_str": "10"}]}},
+                                    {"id_str": "3", "user": {"id_str": "30"},
+                                     "retweeted_status": {"user": {"id_str": "10"}},
+                                     "entities": {"user_mentions": [{"id_str": "10"}]}},
+                                    {"id_str": "4", "user": {"id_str": "40"},
+                                     "in_reply_to_user_id_str": "30"}], "fun")
+        db.insert_users(self.con, [{"id_str": "10", "screen_name": "popular"}], "fun")
+
+    def test_build(self):
+        """ check the CSR arrays, and that a saved graph loads the same
+        """
+        user_graph = graph.build(self.con, types=["mention", "retweet"])
+        node_ids = db.get_graph_node_ids(self.con)
+        edges = sorted((node_ids[source], node_ids[user_graph.indices[i]], user_graph.weights[i])
+                       for source in range(user_graph.n_nodes)
+                       for i in range(user_graph.indptr[source], user_graph.indptr[source + 1]))
+        self.assertEqual(user_graph.n_nodes, 4)
+        self.assertEqual(edges, [("10", "20", 1), ("20", "10", 1), ("30", "10", 2)])
+
+        dir_path = os.path.join(self.tmp_dir_path, "graph")
+        graph.build(self.con, dir_path)
+        loaded = graph.Graph.load(dir_path)
+        self.assertEqual(len(loaded.indices), 4)
+        self.assertEqual(list(loaded.indptr), list(graph.build(self.con).indptr))
+
+        self.assertRaises(ValueError, graph.build, self.con, None, ["follow"])
+
+    def test_rank(self):
+        user_graph = graph.build(self.con)
+        in_degree, out_degree = graph.degree(user_graph)
+        self.assertEqual(in_degree.sum(), 5)
+        self.assertEqual(out_degree.sum(), 5)
+
+        rank = graph.pagerank(user_graph)
+        self.assertAlmostEqual(rank.sum(), 1)
+        top = graph.top_users(self.con, rank, 2)
+        self.assertEqual([(id_str, screen_name) for id_str, screen_name, _ in top],
+                         [("10", "popular"), ("20", None)])
+        self.assertEqual(graph.top_users(self.con, in_degree, 1)[0][:2], ("10", "popular"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from lib import database as db
+from lib import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setup(self):
+        metrics.reset()
+
+    def test_counters(self):
+        """ check that counters are kept separately for each set of labels
+        """
+        self.setup()
+
+        metrics.increment("api_requests_total", endpoint="search/tweets")
+        metrics.increment("api_requests_total", endpoint="search/tweets")
+        metrics.increment("api_requests_total", 5, endpoint="users/search")
+
+        self.assertEqual(metrics.get_counter("api_requests_total", endpoint="search/tweets"), 2)
+        self.assertEqual(metrics.get_counter("api_requests_total", endpoint="users/search"), 5)
+        self.assertEqual(metrics.get_counter("api_requests_total", endpoint="trends/place"), 0)
+
+    def test_histogram(self):
+        """ check that durations are placed in the correct buckets
+        """
+        self.setup()
+
+        metrics.observe("api_request_seconds", 0.03, endpoint="search/tweets")
+        metrics.observe("api_request_seconds", 0.04, endpoint="search/tweets")
+        metrics.observe("api_request_seconds", 20, endpoint="search/tweets")
+        with metrics.timer("api_request_seconds", endpoint="search/tweets"):
+            pass
+
+        histogram = metrics.get_histogram("api_request_seconds", endpoint="search/tweets")
+        self.assertEqual(histogram["count"], 4)
+        self.assertEqual(sum(histogram["buckets"]), 3)
+        self.assertEqual(histogram["buckets"][metrics.histogram_buckets.index(0.05)], 2)
+
+    def test_prometheus(self):
+        """ check the Prometheus text output
+        """
+        self.setup()
+
+        metrics.increment("rows_inserted_total", 3, table="tweets")
+        metrics.observe("json_parse_seconds", 0.2, endpoint="search/tweets")
+        lines = metrics.to_prometheus().splitlines()
+
+        self.assertTrue("# TYPE twerpy_rows_inserted_total counter" in lines)
+        self.assertTrue('twerpy_rows_inserted_total{table="tweets"} 3' in lines)
+        self.assertTrue("# TYPE twerpy_json_parse_seconds histogram" in lines)
+        self.assertTrue('twerpy_json_parse_seconds_bucket{endpoint="search/tweets",le="0.1"} 0' in lines)
+        self.assertTrue('twerpy_json_parse_seconds_bucket{endpoint="search/tweets",le="0.25"} 1' in lines)
+        self.assertTrue('twerpy_json_parse_seconds_bucket{endpoint="search/tweets",le="+Inf"} 1' in lines)
+        self.assertTrue('twerpy_json_parse_seconds_count{endpoint="search/tweets"} 1' in lines)
+
+        metrics.write_prometheus("test.prom")
+        with open("test.prom") as f:
+            self.assertEqual(f.read(), metrics.to_prometheus())
+        os.remove("test.prom")
+
+    def test_json(self):
+        """ check the JSON output
+        """
+        self.setup()
+
+        metrics.increment("api_requests_total", endpoint="search/tweets")
+        metrics.observe("insert_batch_seconds", 0.5, table="tweets")
+        data = json.loads(metrics.to_json())
+
+        self.assertEqual(data["counters"], {"api_requests_total.search/tweets": 1})
+        self.assertEqual(data["timers"], {"insert_batch_seconds.tweets": {"count": 1, "sum": 0.5}})
+
+    def test_insert_metrics(self):
+        """ check that batch inserts count inserted and duplicate rows
+        """
+        self.setup()
+        tmp_dir_path = tempfile.mkdtemp()
+        try:
+            db_filename = os.path.join(tmp_dir_path, "test.db")
+            db.reset(db_filename, lambda x: "yes")
+            con = db.open_db_connection(db_filename)
+
+            tweets = [{"id_str": "tweet_id_101", "text": "I'm a tweet!"},
+                      {"id_str": "tweet_id_101", "text": "I'm a tweet!"}]
+            db.insert_tweets(con, tweets, "group")
+            db.close_db_connection(con)
+        finally:
+            shutil.rmtree(tmp_dir_path)
+
+        self.assertEqual(metrics.get_counter("rows_inserted_total", table="tweets"), 1)
+        self.assertEqual(metrics.get_counter("rows_deduped_total", table="tweets"), 1)
+        self.assertEqual(metrics.get_histogram("insert_batch_seconds", table="tweets")["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
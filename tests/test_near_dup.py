@@ -0,0 +1,59 @@
+import unittest
+from lib import database as db
+from lib import near_dup
+from tests.database_case import DatabaseTestCase
+
+
+class TestNearDup(DatabaseTestCase):
+    def test_signature(self):
+        """ check that copies of a tweet have similar signatures, and different tweets don't
+        """
+        text = "Huge sale on running shoes today only, everything must go #deals"
+        sig = near_dup.signature(text)
+        self.assertEqual(len(sig), near_dup.num_hashes)
+        self.assertEqual(near_dup.signature("RT @shop: " + text + " http://t.co/abc123"), sig)
+        self.assertTrue(near_dup.similarity(sig, near_dup.signature(text + "!!")) > 0.7)
+        self.assertTrue(near_dup.similarity(sig, near_dup.signature("Off to the beach with friends")) < 0.2)
+        self.assertEqual(near_dup.signature("http://t.co/abc123"), None)
+
+        sig2 = near_dup.unpack_signature(near_dup.pack_signature(sig))
+        self.assertEqual(sig2, sig)
+
+    def test_cluster(self):
+        """ check that near duplicates are clustered with the first copy, incrementally
+        """
+        text = "Huge sale on running shoes today only, everything must go #deals"
+        db.insert_tweets(self.con, [{"id_str": "1", "text": text},
+                                    {"id_str": "2", "text": "Off to the beach with friends"},
+                                    {"id_str": "3", "text": "RT @shop: " + text}], "fun")
+        db.insert_tweets(self.con, [{"id_str": "3", "text": "RT @shop: " + text}], "other")
+        self.assertEqual(near_dup.cluster_new_tweets(self.con, batch_size=2), (3, 1))
+
+        db.insert_tweets(self.con, [{"id_str": "4", "text": text + " Don't miss it!"},
+                                    {"id_str": "5", "text": ""}], "fun")
+        self.assertEqual(near_dup.cluster_new_tweets(self.con), (2, 1))
+        self.assertEqual(near_dup.cluster_new_tweets(self.con), (0, 0))
+        self.assertEqual(db.get_last_clustered_rowid(self.con), 6)
+
+        clusters = dict(self.con.execute("SELECT id_str, cluster_id FROM tweet_clusters").fetchall())
+        self.assertEqual(clusters, {"1": "1", "2": "2", "3": "1", "4": "1", "5": "5"})
+
+        tweets, _ = db.get_tweets(self.con, "fun", dedupe=True)
+        self.assertEqual(sorted(tweet["id_str"] for tweet in tweets), ["1", "2", "5"])
+        self.assertEqual(len(db.get_tweets(self.con, dedupe=True)[0]), 4)
+
+    def test_shared_band(self):
+        """ check that a cluster is found through a band which an earlier cluster also has
+        """
+        text = "Huge sale on running shoes today only, everything must go #deals"
+        sig = near_dup.signature(text)
+        other_sig = near_dup.signature("Off to the beach with friends")
+        # the earlier cluster is in every bucket of the later one
+        db.store_tweet_cluster(self.con, "1", "1", near_dup.pack_signature(other_sig), near_dup.band_keys(sig))
+        near_dup.cluster_tweet(self.con, "2", text)
+
+        self.assertEqual(near_dup.cluster_tweet(self.con, "3", "RT @shop: " + text), "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
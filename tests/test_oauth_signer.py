@@ -0,0 +1,126 @@
+import unittest
+from lib import oauth_signer
+
+try:
+    import oauth2
+except ImportError:
+    oauth2 = None
+
+# the example request from Twitter's documentation on creating a signature
+consumer_key = "xvz1evFS4wEEPTGEFPHBog"
+consumer_secret = "kAcSOqF21Fu85e7zjz7ZN2U4ZRhfV3WpwPAoE3Z7kBw"
+token_key = "370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb"
+token_secret = "LswwdoUaIvS8ltyTt5jkRh4J50vUPVVHtR2YPi5kE"
+timestamp = "1318622958"
+nonce = "kYjzVBB8Y0ZFabxSWbWovY3uYSQ2pTgmZeNu2VS4cg"
+update_url = "https://api.twitter.com/1/statuses/update.json?include_entities=true"
+status = "Hello Ladies + Gentlemen, a signed OAuth request!"
+
+
+class TestSigner(unittest.TestCase):
+    def setup(self, body_hash=True):
+        self.signer = oauth_signer.Signer(consumer_key, consumer_secret, token_key, token_secret,
+                                          body_hash=body_hash)
+
+    def test_escape(self):
+        self.assertEqual(oauth_signer.escape("Ladies + Gentlemen"), "Ladies%20%2B%20Gentlemen")
+        self.assertEqual(oauth_signer.escape("An encoded string!"), "An%20encoded%20string%21")
+        self.assertEqual(oauth_signer.escape("Dogs, Cats & Mice"), "Dogs%2C%20Cats%20%26%20Mice")
+        self.assertEqual(oauth_signer.escape(u"\u2603"), "%E2%98%83")
+        self.assertEqual(oauth_signer.escape("-._~"), "-._~")
+
+    def test_twitter_example(self):
+        """ check the signature against the example in Twitter's documentation
+        """
+        self.setup(body_hash=False)
+
+        signature, _, _ = self.signer.sign("POST", update_url, [("status", status)], timestamp, nonce)
+        self.assertEqual(signature, "tnnArxj06cWHq44gCs1OSKk/jLY=")
+
+        # signing again reuses the cached HMAC state and base url
+        signature, _, _ = self.signer.sign("POST", update_url, [("status", status)], timestamp, nonce)
+        self.assertEqual(signature, "tnnArxj06cWHq44gCs1OSKk/jLY=")
+
+    def test_header(self):
+        """ check the Authorization header contains the signed parameters
+        """
+        self.setup(body_hash=False)
+
+        header = self.signer.authorization_header("POST", update_url, [("status", status)], timestamp, nonce)
+        self.assertEqual(header,
+                         'OAuth oauth_consumer_key="xvz1evFS4wEEPTGEFPHBog", '
+                         'oauth_signature_method="HMAC-SHA1", '
+                         'oauth_token="370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb", '
+                         'oauth_version="1.0", '
+                         'oauth_nonce="kYjzVBB8Y0ZFabxSWbWovY3uYSQ2pTgmZeNu2VS4cg", '
+                         'oauth_timestamp="1318622958", '
+                         'oauth_signature="tnnArxj06cWHq44gCs1OSKk%2FjLY%3D"')
+
+    def test_default_port(self):
+        """ check that default ports are left out of the signed url
+        """
+        self.setup()
+
+        self.assertEqual(self.signer.sign("GET", "https://API.twitter.com:443/1.1/search/tweets.json?q=fun",
+                                          timestamp=timestamp, nonce=nonce),
+                         self.signer.sign("GET", "https://api.twitter.com/1.1/search/tweets.json?q=fun",
+                                          timestamp=timestamp, nonce=nonce))
+
+    @unittest.skipIf(oauth2 is None, "the oauth2 library is not installed")
+    def test_oauth2(self):
+        """ check the signature and header parameters are the same as the ones made by the oauth2 library
+        """
+        self.setup()
+        consumer = oauth2.Consumer(key=consumer_key, secret=consumer_secret)
+        token = oauth2.Token(key=token_key, secret=token_secret)
+
+        for url in ["https://api.twitter.com/1.1/search/tweets.json?q=%23fun&count=100",
+                    "https://api.twitter.com/1.1/search/tweets.json?q=%23sad&count=100%20exclude%3Aretweets",
+                    "https://api.twitter.com/1.1/users/suggestions.json",
+                    "https://api.twitter.com/1.1/trends/place.json?id=2487956"]:
+            request = oauth2.Request.from_consumer_and_token(consumer, token=token, http_method="GET", http_url=url,
+                                                             parameters={"oauth_timestamp": timestamp,
+                                                                         "oauth_nonce": nonce})
+            request.sign_request(oauth2.SignatureMethod_HMAC_SHA1(), consumer, token)
+
+            # oauth2 gives the signature as bytes on python 3
+            oauth2_signature = request["oauth_signature"]
+            if isinstance(oauth2_signature, bytes):
+                oauth2_signature = oauth2_signature.decode("ascii")
+            signature, _, _ = self.signer.sign("GET", url, timestamp=timestamp, nonce=nonce)
+            self.assertEqual(signature, oauth2_signature)
+
+            header = self.signer.authorization_header("GET", url, timestamp=timestamp, nonce=nonce)
+            oauth2_header = request.to_header()["Authorization"]
+            self.assertEqual(sorted(header[len("OAuth "):].split(", ")),
+                             sorted(p for p in oauth2_header[len("OAuth "):].split(", ") if p != 'realm=""'))
+
+    @unittest.skipIf(oauth2 is None, "the oauth2 library is not installed")
+    def test_oauth2_post(self):
+        """ check that form encoded POST requests are signed without a body hash, as the
+            oauth2 library signs them
+        """
+        self.setup()
+        consumer = oauth2.Consumer(key=consumer_key, secret=consumer_secret)
+        token = oauth2.Token(key=token_key, secret=token_secret)
+
+        url = "https://api.twitter.com/1.1/users/lookup.json"
+        params = [("user_id", "783214,6253282")]
+        request = oauth2.Request.from_consumer_and_token(consumer, token=token, http_method="POST", http_url=url,
+                                                         parameters=dict(params, oauth_timestamp=timestamp,
+                                                                         oauth_nonce=nonce),
+                                                         body="user_id=783214%2C6253282", is_form_encoded=True)
+        request.sign_request(oauth2.SignatureMethod_HMAC_SHA1(), consumer, token)
+
+        oauth2_signature = request["oauth_signature"]
+        if isinstance(oauth2_signature, bytes):
+            oauth2_signature = oauth2_signature.decode("ascii")
+        signature, _, _ = self.signer.sign("POST", url, params, timestamp=timestamp, nonce=nonce)
+        self.assertEqual(signature, oauth2_signature)
+
+        header = self.signer.authorization_header("POST", url, params, timestamp=timestamp, nonce=nonce)
+        self.assertNotIn("oauth_body_hash", header)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+import time
+import unittest
+from lib import database as db
+from lib import near_dup
+from lib import retention
+from tests.database_case import DatabaseTestCase
+
+# Mon Sep 24 03:35:21 2012
+_now = 1348457721
+
+
+def _created_at(days_ago):
+    return time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(_now - days_ago * 86400))
+
+
+class TestRetention(DatabaseTestCase):
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+        self.archive_dir_path = os.path.join(self.tmp_dir_path, "archive")
+
+        # tweet 1 is old in both groups, and mentions user 20
+        db.insert_tweets(self.con, [{"id_str": "1", "created_at": _created_at(40), "user": {"id_str": "10"},
+                                     "entities": {"user_mentions": [{"id_str": "20"}]}},
+                                    {"id_str": "2", "created_at": _created_at(10)},
+                                    {"id_str": "3", "created_at": _created_at(1)},
+                                    {"id_str": "4"}], "fun")
+        db.insert_tweets(self.con, [{"id_str": "1", "created_at": _created_at(40), "user": {"id_str": "10"},
+                                     "entities": {"user_mentions": [{"id_str": "20"}]}},
+                                    {"id_str": "5", "created_at": _created_at(100)}], "sad")
+
+    def test_parse_policy(self):
+        self.assertEqual(retention.parse_policy("good_times=30"), ("good_times", 30))
+        self.assertEqual(retention.parse_policy("a=b=0.5"), ("a=b", 0.5))
+        self.assertRaises(ValueError, retention.parse_policy, "good_times")
+        self.assertRaises(ValueError, retention.parse_policy, "=30")
+        self.assertRaises(ValueError, retention.parse_policy, "good_times=-1")
+
+    def test_retain(self):
+        """ check that each group keeps its tweets for its own period, and that deleted
+            tweets are archived
+        """
+        n_deleted = retention.retain(self.con, {"sad": 50}, 7, self.archive_dir_path, chunk_size=1, now=_now)
+        archive_names = os.listdir(self.archive_dir_path)
+        with gzip.open(os.path.join(self.archive_dir_path, archive_names[0])) as f:
+            archived = [json.loads(line.decode("utf-8")) for line in f]
+
+        self.assertEqual(n_deleted, 3)
+        tweets, _ = db.get_tweets(self.con)
+        self.assertEqual(sorted((t["tweet_group"], t["id_str"]) for t in tweets),
+                         [("fun", "3"), ("fun", "4"), ("sad", "1")])
+        self.assertEqual(len(archive_names), 1)
+        self.assertEqual(sorted((t["tweet_group"], t["id_str"]) for t in archived),
+                         [("fun", "1"), ("fun", "2"), ("sad", "5")])
+        self.assertTrue("rowid" not in archived[0])
+
+        # tweet 1 is still in the sad group, so its edges are kept, and the rollups still count every tweet
+        self.assertEqual(self.con.execute("SELECT COUNT(*) FROM tweet_edges").fetchone()[0], 1)
+        days = db.get_rollups(self.con, "day", 0, 2 ** 40, "fun")
+        self.assertEqual(sum(r["tweet_count"] for r in days), 3)
+
+        # tweets without a time are never deleted
+        self.assertEqual(retention.retain(self.con, {}, 0, None, now=_now), 2)
+        self.assertEqual(self.con.execute("SELECT COUNT(*) FROM tweet_edges").fetchone()[0], 0)
+        tweets, _ = db.get_tweets(self.con)
+        self.assertEqual([t["id_str"] for t in tweets], ["4"])
+
+    def test_reclaim_space(self):
+        """ check that the pages freed by deleting tweets are given back
+        """
+        db.insert_tweets(self.con, [{"id_str": str(i), "text": "x" * 200, "created_at": _created_at(30)}
+                                    for i in range(100, 2100)], "big")
+        page_count = self.con.execute("PRAGMA page_count").fetchone()[0]
+        self.assertEqual(db.get_auto_vacuum(self.con), 2)
+        self.assertEqual(retention.retain(self.con, {"big": 7}, None, None, now=_now), 2000)
+
+        self.assertEqual(self.con.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        self.assertTrue(self.con.execute("PRAGMA page_count").fetchone()[0] < page_count)
+
+    def test_cluster_after_retain(self):
+        """ check that tweets inserted after the newest tweets were deleted, which can
+            reuse their rowids, are still clustered
+        """
+        db.insert_tweets(self.con, [{"id_str": str(i), "text": "live tweet {0}".format(i),
+                                     "created_at": _created_at(1)} for i in range(100, 110)], "live")
+        db.insert_tweets(self.con, [{"id_str": str(i), "text": "backfill tweet {0}".format(i),
+                                     "created_at": _created_at(40)} for i in range(200, 250)], "backfill")
+        near_dup.cluster_new_tweets(self.con)
+        self.assertEqual(retention.retain(self.con, {"backfill": 30}, None, None, now=_now), 50)
+
+        db.insert_tweets(self.con, [{"id_str": str(i), "text": "new tweet {0}".format(i),
+                                     "created_at": _created_at(0)} for i in range(300, 330)], "new")
+        n_clustered, _ = near_dup.cluster_new_tweets(self.con)
+
+        self.assertEqual(n_clustered, 30)
+        self.assertEqual(near_dup.cluster_new_tweets(self.con), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import unittest
+from lib import database as db
+from lib import scheduler
+from data import twitter_settings
+from tests.database_case import DatabaseTestCase
+
+
+class TestScheduler(DatabaseTestCase):
+    def search(self, revisit_interval=600, last_run=None, tweet_rate=None):
+        return {"endpoint": "search/tweets", "revisit_interval": revisit_interval,
+                "last_run": last_run, "tweet_rate": tweet_rate}
+
+    def test_next_interval(self):
+        """ check that the revisit interval adapts to the number of new tweets found
+        """
+        # a full page means tweets may have been missed
+        self.assertEqual(scheduler.next_interval(self.search(), 100, 1000), (300, None))
+        # nothing found
+        self.assertEqual(scheduler.next_interval(self.search(), 0, 1000), (1200, None))
+
+        # 10 tweets in 100 seconds, so half a page is expected in 500 seconds
+        interval, rate = scheduler.next_interval(self.search(last_run=900), 10, 1000)
+        self.assertEqual((interval, rate), (500, 0.1))
+
+        # the rate is smoothed with the previous estimate
+        interval, rate = scheduler.next_interval(self.search(last_run=900, tweet_rate=0.3), 10, 1000)
+        self.assertAlmostEqual(rate, 0.2)
+
+        # the interval stays in the configured range
+        interval, rate = scheduler.next_interval(self.search(last_run=999), 90, 1000)
+        self.assertEqual(interval, twitter_settings.min_search_interval)
+        interval, rate = scheduler.next_interval(self.search(revisit_interval=80000), 0, 1000)
+        self.assertEqual(interval, twitter_settings.max_search_interval)
+
+    def test_yield_order(self):
+        """ check that due searches with the same priority are ordered by the number
+            of new tweets expected, with searches that haven't run first
+        """
+        for term in ["#quiet", "#busy", "#new"]:
+            db.enqueue_search(self.con, term, "group")
+        searches = dict((s["term"], s) for s in db.get_due_searches(self.con, 0, 10))
+        db.update_search(self.con, searches["#quiet"], 100, None, 100, 0, 0.01)
+        db.update_search(self.con, searches["#busy"], 100, None, 100, 50, 1.0)
+
+        self.assertEqual([s["term"] for s in db.get_due_searches(self.con, 200, 10)],
+                         ["#new", "#busy", "#quiet"])
+
+    def test_stopped_search(self):
+        """ check that a search stopped by ctrl-c before it was made stays due
+        """
+        db.enqueue_search(self.con, "#fun", "good_times")
+        search_function = scheduler.search_functions["search/tweets"]
+        scheduler.search_functions["search/tweets"] = lambda search, db_con, no_RT: None
+        try:
+            self.assertEqual(scheduler.run_due_searches(self.con, 10, now=100), 0)
+        finally:
+            scheduler.search_functions["search/tweets"] = search_function
+
+        searches = db.get_due_searches(self.con, 100, 10)
+        self.assertEqual([(s["term"], s["last_run"]) for s in searches], [("#fun", None)])
+
+    def test_add_file(self):
+        """ check that each line of a terms file is queued once
+        """
+        with open("test_terms.txt", "w") as f:
+            f.write("#fun:good_times\n#sad:bad_times:lang=en,fr;min_retweets=5\n")
+        try:
+            self.assertEqual(scheduler.add_file(self.con, "test_terms.txt", priority=2), 2)
+            self.assertEqual(scheduler.add_file(self.con, "test_terms.txt"), 0)
+        finally:
+            os.remove("test_terms.txt")
+
+        searches = db.get_due_searches(self.con, 2 ** 40, 10)
+        self.assertEqual(sorted((s["term"], s["job_group"], s["priority"], s["filters"]) for s in searches),
+                         [("#fun", "good_times", 2, None), ("#sad", "bad_times", 2, "lang=en,fr;min_retweets=5")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from benchmarks import run
+from lib import database as db
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "python -X importtime needs python 3.7")
+class TestStartup(unittest.TestCase):
+    def test_dump_imports(self):
+        """ check that dumping the database doesn't import the modules needed for searching
+        """
+        tmp_dir_path = tempfile.mkdtemp()
+        try:
+            db_filename = os.path.join(tmp_dir_path, "test.db")
+            output_filename = os.path.join(tmp_dir_path, "tweets.json")
+            db.reset(db_filename, lambda x: "yes")
+
+            times, total = run.import_times(["dump-tweets", "-d", db_filename,
+                                             "-o", output_filename, "--json"])
+            self.assertTrue(os.path.exists(output_filename))
+        finally:
+            shutil.rmtree(tmp_dir_path)
+
+        self.assertTrue("lib.dump" in times)
+        self.assertTrue(total > 0)
+        for module in ["lib.tweet_handler", "oauth2", "urllib.request", "data.user_settings"]:
+            self.assertFalse(module in times, "{0} was imported".format(module))
+
+
+if __name__ == "__main__":
+    unittest.main()
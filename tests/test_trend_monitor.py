@@ -0,0 +1,67 @@
+import os
+import time
+import unittest
+from lib import database as db
+from lib import metrics
+from lib import scheduler
+from lib import trend_monitor
+from tests.database_case import DatabaseTestCase
+
+
+class TestTrendMonitor(DatabaseTestCase):
+    def test_min_poll_interval(self):
+        """ check that the polls of every WOEID fit in the trends rate limit
+        """
+        # 15 requests per 900 seconds for each credential
+        self.assertEqual(trend_monitor.min_poll_interval(3, 1), 180)
+        self.assertEqual(trend_monitor.min_poll_interval(3, 2), 90)
+
+    def test_schedule_trends(self):
+        """ check that new trends are searched straight away, and searches stop
+            once a trend has expired
+        """
+        searched = []
+
+        def fake_search(search, db_con, no_RT):
+            searched.append((search["term"], search["job_group"], search["since_id"]))
+            return [{"id_str": "10"}, {"id_str": "9"}]
+
+        scheduler.search_functions["fake"] = fake_search
+        try:
+            new = trend_monitor.schedule_trends(self.con, "1", ["#a"], 100, 300, 10)
+            self.assertEqual(new, ["#a"])
+            self.con.execute("UPDATE search_queue SET endpoint='fake'")
+
+            self.con.execute("UPDATE search_queue SET revisit_interval=60")
+            self.assertEqual(scheduler.run_due_searches(self.con, 5, now=100), 1)
+            self.assertEqual(searched, [("#a", "1_#a", None)])
+
+            # the search is due again after the interval, and only fetches newer tweets
+            self.assertEqual(scheduler.run_due_searches(self.con, 5, now=110), 0)
+            # few tweets were found, so the interval is doubled
+            self.assertEqual(db.get_next_due(self.con, 110), 220)
+            scheduler.run_due_searches(self.con, 5, now=220)
+            self.assertEqual(searched[-1], ("#a", "1_#a", "10"))
+
+            # the trend stops being searched once it hasn't been seen for the expiry time
+            self.assertEqual(scheduler.run_due_searches(self.con, 5, now=1000), 0)
+        finally:
+            del scheduler.search_functions["fake"]
+
+    def test_sleep_metrics(self):
+        """ check that the metrics are written while waiting between polls
+        """
+        class FakeTweetHandler(object):
+            shutdown_requested = False
+
+        prometheus_filename = os.path.join(self.tmp_dir_path, "twerpy.prom")
+        metrics.configure(prometheus_filename, interval=0)
+        try:
+            trend_monitor._sleep_until(time.time() + 0.1, FakeTweetHandler())
+        finally:
+            metrics.configure()
+        self.assertTrue(os.path.exists(prometheus_filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
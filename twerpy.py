@@ -1,63 +1,57 @@
 import logging
 import os
 import sys
+import time
 
 from lib import setup
 
-# set up the arguments
-args = setup.gen_parser().parse_args()
-
-# set up logging
-if args.debug:
-    level = logging.DEBUG
-else:
-    level = logging.INFO
-logging.basicConfig(level=level, format='%(asctime)s %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S')
-
-# if we're doing a setup, run that then quit
-if args.which == "setup" and args.database is None:
-    setup.setup_all()
-    sys.exit(0)
-
-# if we're not running a basic setup, we need to import other files
-from data import user_settings
-from lib import database as db
-from lib import tweet_handler
-
-# find the absolute path of the database file
+# find the absolute path of the data and reports directories
 data_dir_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-
-if args.database:
-    db_filename = os.path.join(data_dir_path, args.database)
-else:
-    db_filename = os.path.join(data_dir_path, user_settings.default_db_filename)
+reports_dir_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
 
 
-if args.which == "setup":
+# each command imports only the modules it needs, so commands which just read the
+# database don't load the oauth and http libraries needed to search
+def setup_database(args, db_filename):
     setup.setup_db(db_filename)
 
-elif args.which == "search-tweets":
+
+def search_tweets(args, db_filename):
+    from lib import database as db
+    from lib import tweet_handler
+
     db_con = db.open_db_connection(db_filename)
-    tweet_handler.search_multiple_terms(args.filename, db_con, args.no_RT)
+    tweet_handler.search_multiple_terms(args.filename, db_con, args.no_RT, resume=args.resume)
     db.close_db_connection(db_con)
 
-elif args.which == "search-home-timeline":
+
+def search_home_timeline(args, db_filename):
+    from lib import database as db
+    from lib import tweet_handler
+
     if args.group:
         group = args.group
     else:
         group = "home_timeline"
     db_con = db.open_db_connection(db_filename)
     tweet_handler.search_home_timeline(group, db_con)
+    db.close_db_connection(db_con)
+
+
+def search_trends(args, db_filename):
+    from lib import tweet_handler
 
-elif args.which == "search-trends":
     if args.group:
         group = args.group
     else:
         group = args.WOEID
     tweet_handler.search_trends(args.WOEID, group)
 
-elif args.which == "search-top-users":
+
+def search_top_users(args, db_filename):
+    from lib import database as db
+    from lib import tweet_handler
+
     db_con = db.open_db_connection(db_filename)
     if args.group:
         group = args.group
@@ -66,31 +60,234 @@ elif args.which == "search-top-users":
     tweet_handler.search_top_users(args.term, group, db_con)
     db.close_db_connection(db_con)
 
-elif args.which == "search-user-tweets":
+
+def search_user_tweets(args, db_filename):
+    from lib import database as db
+    from lib import tweet_handler
+
     db_con = db.open_db_connection(db_filename)
-    tweet_handler.search_multiple_users(args.filename, db_con)
+    tweet_handler.search_multiple_users(args.filename, db_con, resume=args.resume)
     db.close_db_connection(db_con)
 
-elif args.which == "search-suggested-users":
+
+def search_suggested_users(args, db_filename):
+    from lib import database as db
+    from lib import tweet_handler
+
     db_con = db.open_db_connection(db_filename)
-    tweet_handler.search_suggested_users(db_con)
+    tweet_handler.search_suggested_users(db_con, resume=args.resume)
+    db.close_db_connection(db_con)
+
+
+def enrich_users(args, db_filename):
+    from lib import database as db
+    from lib import tweet_handler
+
+    db_con = db.open_db_connection(db_filename)
+    tweet_handler.enrich_users(db_con, args.group, args.ttl)
+    db.close_db_connection(db_con)
+
+
+def schedule(args, db_filename):
+    from lib import database as db
+    from lib import scheduler
+
+    db_con = db.open_db_connection(db_filename)
+    if args.schedule_command == "add":
+        if args.users:
+            endpoint = "statuses/user_timeline"
+        else:
+            endpoint = "search/tweets"
+        added = scheduler.add_file(db_con, args.filename, endpoint, args.priority)
+        logging.info("Added {0} searches to the queue".format(added))
+    else:
+        scheduler.run(db_con, args.max_searches, args.no_RT, args.once)
+    db.close_db_connection(db_con)
+
+
+def trend_monitor(args, db_filename):
+    from lib import database as db
+    from lib import trend_monitor
+
+    db_con = db.open_db_connection(db_filename)
+    trend_monitor.run(db_con, args.WOEID, args.interval, args.expiry, args.priority,
+                      args.max_searches, args.no_RT)
+    db.close_db_connection(db_con)
+
+
+def dump_tweets(args, db_filename):
+    from lib import database as db
+    from lib import dump
 
-elif args.which == "dump-tweets":
     if args.json:
         report_format = "json"
     else:
         report_format = "csv"
 
     db_con = db.open_db_connection(db_filename)
-    tweet_handler.dump_tweets(db_con, args.group, args.output, report_format)
+    dump.dump_tweets(db_con, args.group, args.output, report_format, args.dedupe)
+    db.close_db_connection(db_con)
+
+
+def cluster_tweets(args, db_filename):
+    from lib import database as db
+    from lib import near_dup
+
+    # the default is kept in near_dup, which is only imported when the command runs
+    threshold = near_dup.default_threshold if args.threshold is None else args.threshold
+    db_con = db.open_db_connection(db_filename)
+    n_clustered, n_duplicates = near_dup.cluster_new_tweets(db_con, threshold)
+    logging.info("Clustered {0} new tweets, {1} were near duplicates".format(n_clustered, n_duplicates))
     db.close_db_connection(db_con)
 
-elif args.which == "dump-users":
+
+def dump_users(args, db_filename):
+    from lib import database as db
+    from lib import dump
+
+    if args.json:
+        report_format = "json"
+    else:
+        report_format = "csv"
+
+    db_con = db.open_db_connection(db_filename)
+    dump.dump_users(db_con, args.group, args.output, report_format)
+    db.close_db_connection(db_con)
+
+
+def timeseries(args, db_filename):
+    from lib import database as db
+    from lib import dump
+
     if args.json:
         report_format = "json"
     else:
         report_format = "csv"
+    start = dump.parse_time(args.start) if args.start else 0
+    end = dump.parse_time(args.end) if args.end else 2 ** 40
+
+    db_con = db.open_db_connection(db_filename)
+    if args.rebuild:
+        logging.info("Rebuilding the rollups")
+        db.rebuild_rollups(db_con)
+    dump.dump_timeseries(db_con, args.resolution, start, end, args.group, args.output, report_format)
+    db.close_db_connection(db_con)
+
+
+def graph(args, db_filename):
+    from lib import database as db
+    from lib import graph
+
+    # the graph arrays are stored in a directory next to the database
+    graph_dir_path = os.path.splitext(db_filename)[0] + "_graph"
+    db_con = db.open_db_connection(db_filename)
+    if args.graph_command == "build":
+        user_graph = graph.build(db_con, graph_dir_path, args.types)
+        logging.info("Built a graph of {0} users and {1} edges in {2}".format(
+            user_graph.n_nodes, len(user_graph.indices), graph_dir_path))
+    elif not os.path.exists(graph_dir_path):
+        logging.error("There is no graph for this database, run graph build first")
+    else:
+        user_graph = graph.Graph.load(graph_dir_path)
+        if args.graph_command == "pagerank":
+            scores = graph.pagerank(user_graph)
+        else:
+            scores = graph.degree(user_graph)[0]
+        for rank, (id_str, screen_name, score) in enumerate(graph.top_users(db_con, scores, args.top)):
+            print("{0}\t{1}\t{2}\t{3:.6g}".format(rank + 1, id_str, screen_name or "", score))
+    db.close_db_connection(db_con)
+
+
+def retain(args, db_filename):
+    from lib import database as db
+    from lib import retention
+    from data import twitter_settings
+
+    policies = dict(twitter_settings.retention_days)
+    policies.update(retention.parse_policy(policy) for policy in args.keep)
+    default_days = args.days if args.days is not None else twitter_settings.default_retention_days
+    if args.no_archive:
+        archive_dir_path = None
+    elif args.archive_dir:
+        archive_dir_path = args.archive_dir
+    else:
+        archive_dir_path = os.path.splitext(db_filename)[0] + "_archive"
 
     db_con = db.open_db_connection(db_filename)
-    tweet_handler.dump_users(db_con, args.group, args.output, report_format)
-    db.close_db_connection(db_con)
\ No newline at end of file
+    n_deleted = retention.retain(db_con, policies, default_days, archive_dir_path, args.vacuum)
+    logging.info("Deleted {0} expired tweets".format(n_deleted))
+    db.close_db_connection(db_con)
+
+
+commands = {"setup": setup_database,
+            "search-tweets": search_tweets,
+            "get-home-timeline": search_home_timeline,
+            "search-trends": search_trends,
+            "search-top-users": search_top_users,
+            "search-user-tweets": search_user_tweets,
+            "search-suggested-users": search_suggested_users,
+            "enrich-users": enrich_users,
+            "schedule": schedule,
+            "trend-monitor": trend_monitor,
+            "dump-tweets": dump_tweets,
+            "dump-users": dump_users,
+            "cluster-tweets": cluster_tweets,
+            "timeseries": timeseries,
+            "graph": graph,
+            "retain": retain}
+
+
+def main(argv=None):
+    # set up the arguments
+    args = setup.gen_parser().parse_args(argv)
+
+    # set up logging
+    if args.debug:
+        level = logging.DEBUG
+    else:
+        level = logging.INFO
+    logging.basicConfig(level=level, format='%(asctime)s %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+    # if we're doing a setup, run that then quit
+    if args.which == "setup" and args.database is None:
+        setup.setup_all()
+        sys.exit(0)
+
+    # find the absolute path of the database file
+    if args.database:
+        db_filename = os.path.join(data_dir_path, args.database)
+    else:
+        from data import user_settings
+        db_filename = os.path.join(data_dir_path, user_settings.default_db_filename)
+
+    # set up where the ingestion metrics are written
+    from lib import metrics
+    metrics.configure(args.metrics, args.metrics_log)
+
+    if args.which not in commands:
+        logging.error("The {0} command is not implemented yet".format(args.which))
+        sys.exit(1)
+    command = commands[args.which]
+    if args.profile:
+        import cProfile
+        import pstats
+
+        profile_filename = os.path.join(reports_dir_path, "profile_{0}_{1}".format(
+            args.which, time.strftime("%Y%m%d_%H%M%S")))
+        profiler = cProfile.Profile()
+        profiler.runcall(command, args, db_filename)
+        profiler.dump_stats(profile_filename + ".prof")
+
+        # also write a readable summary, sorted by cumulative time
+        with open(profile_filename + ".txt", "w") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(50)
+        logging.info("Profile written to {0}.prof".format(profile_filename))
+    else:
+        command(args, db_filename)
+
+    metrics.flush(force=True)
+
+
+if __name__ == "__main__":
+    main()